@@ -1,41 +1,144 @@
 import pandas as pd
+import numpy as np
 import os
 import subprocess
 import time
 import concurrent.futures
+import argparse
+from array import array
+from collections import Counter
 from tqdm import tqdm
+from results_db import ResultsDB
+from merge_exports import EXPORT_EXTENSIONS, export_paths, merge_exports, read_export
+from run_metrics import METRICS, timed, run_profiled
+
+SEVERITIES = ('critical', 'high', 'medium', 'low', 'info')
+SEVERITY_INDEX = {severity: index for index, severity in enumerate(SEVERITIES)}
+COLOR_MAP = {
+    'critical': '#c9302c',
+    'high': '#d9534f',
+    'medium': '#f0ad4e',
+    'low': '#5bc0de',
+    'info': '#5bc0de'
+}
+
+# Summary mode: columns read from every export, and how much of it goes into the overview images
+SUMMARY_COLUMNS = ['Plugin ID', 'Risk', 'Host', 'Name']
+SUMMARY_ROWS_PER_PAGE = 50
+
+# Compact per-host record: finding IDs per severity in typed arrays, indexing the shared title table
+class HostRecord:
+    __slots__ = ('os_info', 'findings')
+
+    def __init__(self, os_info):
+        self.os_info = os_info
+        self.findings = tuple(array('I') for _ in SEVERITIES)
+
+    def add(self, severity, title_id):
+        self.findings[SEVERITY_INDEX[severity]].append(title_id)
+
+    def count(self, severity):
+        return len(self.findings[SEVERITY_INDEX[severity]])
+
+    def counts(self):
+        return {severity: len(ids) for severity, ids in zip(SEVERITIES, self.findings)}
+
+    def titles(self, severity, titles, limit=None):
+        ids = self.findings[SEVERITY_INDEX[severity]]
+        return [titles[title_id] for title_id in (ids[:limit] if limit is not None else ids)]
+
+# Interned store of host -> findings; each distinct plugin title is kept once
+class FindingStore:
+    def __init__(self):
+        self.titles = []
+        self.title_ids = {}
+        self.hosts = {}
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def intern(self, title):
+        title_id = self.title_ids.get(title)
+        if title_id is None:
+            title_id = len(self.titles)
+            self.title_ids[title] = title_id
+            self.titles.append(title)
+        return title_id
+
+    def add(self, ip, severity, title, os_info):
+        record = self.hosts.get(ip)
+        if record is None:
+            record = self.hosts[ip] = HostRecord(os_info)
+        if severity in SEVERITY_INDEX:
+            record.add(severity, self.intern(title))
+
+    def severity_totals(self):
+        totals = Counter()
+        for record in self.hosts.values():
+            totals.update(record.counts())
+        return {severity: totals[severity] for severity in SEVERITIES}
+
+    # Titles affecting the most hosts; a title listed on several ports of one host counts once for it
+    def top_titles(self, severity, n=5):
+        counts = Counter()
+        for record in self.hosts.values():
+            counts.update(set(record.findings[SEVERITY_INDEX[severity]]))
+        return [(self.titles[title_id], count) for title_id, count in counts.most_common(n)]
 
 # Function to parse the CSV file and extract vulnerabilities by severity for each IP
-def parse_nessus_csv(csv_file):
-    df = pd.read_csv(csv_file)
-    ips_vulns = {}
-
-    for _, row in df.iterrows():
-        ip = row['Host'].strip()
-        severity = row['Risk'].strip().lower() if pd.notna(row['Risk']) else 'info'
-        title = row['Name'].strip()
-        os_info = row.get('Operating System', 'Unknown').strip()  # Handle missing 'Operating System' column
-        
-        if ip not in ips_vulns:
-            ips_vulns[ip] = {'critical': [], 'high': [], 'medium': [], 'low': [], 'info': [], 'os_info': os_info}
-        
-        if severity in ['critical', 'high', 'medium', 'low', 'info']:
-            ips_vulns[ip][severity].append(title)
-    
-    return ips_vulns
+@timed("parse_csv")
+def parse_nessus_csv(csv_file, results_db=None):
+    return parse_findings(read_export(csv_file), results_db)
+
+# Function to merge every CSV in the folder into one deduplicated dataset (newest export wins) and parse it
+@timed("merge_exports")
+def parse_merged_exports(folder_path, results_db=None):
+    csv_files = export_paths([folder_path])
+    df, rows_read = merge_exports(csv_files)
+    print(f"Merged {len(csv_files)} exports: {rows_read} rows, {len(df)} unique findings, {rows_read - len(df)} duplicates dropped")
+    return parse_findings(df, results_db)
+
+# Function to extract vulnerabilities by severity for each IP from an export frame
+def parse_findings(df, results_db=None):
+    store = FindingStore()
+
+    if results_db:
+        results_db.add_findings(zip(
+            df['Host'].astype(str).str.strip(),
+            pd.to_numeric(df.get('Plugin ID', pd.Series(index=df.index, dtype=float)), errors='coerce').fillna(0).astype(int),
+            df['Name'].astype(str).str.strip(),
+            df['Risk'].fillna('None').astype(str),
+            pd.to_numeric(df.get('Port', pd.Series(index=df.index, dtype=float)), errors='coerce').fillna(0).astype(int),
+            df.get('Protocol', pd.Series('', index=df.index)).astype(str),
+        ))
+
+    hosts = df['Host'].astype(str).str.strip()
+    severities = df['Risk'].fillna('info').astype(str).str.strip().str.lower()
+    titles = df['Name'].astype(str).str.strip()
+    if 'Operating System' in df.columns:  # Handle missing 'Operating System' column
+        os_infos = df['Operating System'].fillna('Unknown').astype(str).str.strip()
+    else:
+        os_infos = ['Unknown'] * len(df)
+
+    for ip, severity, title, os_info in zip(hosts, severities, titles, os_infos):
+        store.add(ip, severity, title, os_info)
+
+    return store
+
+# Title table for worker processes, sent once per worker instead of once per host
+_worker_titles = []
+
+def init_worker(titles):
+    global _worker_titles
+    _worker_titles = titles
 
 # Function to create a simple HTML summary of the vulnerabilities with detailed information
-def create_html_summary(ip, vulnerabilities, scan_start_time, scan_end_time):
-    color_map = {
-        'critical': '#c9302c',
-        'high': '#d9534f',
-        'medium': '#f0ad4e',
-        'low': '#5bc0de',
-        'info': '#5bc0de'
-    }
-
-    severity_counts = {severity: len(vulns) for severity, vulns in vulnerabilities.items() if severity != 'os_info'}
-    os_info = vulnerabilities['os_info']
+@timed("create_html_summary", host_arg=0)
+def create_html_summary(ip, record, titles, scan_start_time, scan_end_time):
+    color_map = COLOR_MAP
+
+    severity_counts = record.counts()
+    os_info = record.os_info
 
     html_content = f"""
     <html>
@@ -114,11 +217,11 @@ def create_html_summary(ip, vulnerabilities, scan_start_time, scan_end_time):
     </table>
     """
 
-    for severity, vulns in vulnerabilities.items():
-        if severity in color_map and vulns:
+    for severity in SEVERITIES:
+        if record.count(severity):
             html_content += f'<div class="severity-title {severity}">{severity.capitalize()} Vulnerabilities:</div>'
             html_content += '<ul class="vuln-list">'
-            for vuln in vulns[:5]:  # Show first few items
+            for vuln in record.titles(severity, titles, limit=5):  # Show first few items
                 html_content += f'<li>{vuln}</li>'
             html_content += '</ul>'
     
@@ -132,14 +235,15 @@ def save_html_to_file(html_content, file_name):
         file.write(html_content)
 
 # Function to capture screenshot using wkhtmltoimage
+@timed("capture_screenshot")
 def capture_screenshot(html_file, screenshot_file):
     # We remove the --width and --height flags so that the content is captured fully without being cut off.
     command = ['wkhtmltoimage', '--disable-smart-width', html_file, screenshot_file]
     subprocess.run(command)
 
 # Function to process each IP and generate HTML and screenshot
-def process_ip(ip, vulnerabilities, output_folder, scan_start_time, scan_end_time):
-    html_summary = create_html_summary(ip, vulnerabilities, scan_start_time, scan_end_time)
+def process_ip(ip, record, output_folder, scan_start_time, scan_end_time):
+    html_summary = create_html_summary(ip, record, _worker_titles, scan_start_time, scan_end_time)
     html_file = os.path.join(output_folder, f"{ip}.html")
     screenshot_file = os.path.join(output_folder, f"{ip}.png")
     
@@ -147,39 +251,209 @@ def process_ip(ip, vulnerabilities, output_folder, scan_start_time, scan_end_tim
     capture_screenshot(html_file, screenshot_file)
     
     os.remove(html_file)
-    return ip
+    return ip, METRICS.drain()  # Spans recorded in this worker go back to the parent
+
+# Function to load the summary columns of every CSV and .nessus export in the folder into one frame, one row per (host, plugin)
+@timed("load_exports")
+def load_exports(folder_path):
+    frames = []
+    for export_file in sorted(os.listdir(folder_path)):
+        if export_file.endswith(EXPORT_EXTENSIONS):
+            df = read_export(os.path.join(folder_path, export_file), usecols=SUMMARY_COLUMNS)
+            if 'Plugin ID' not in df.columns:
+                df['Plugin ID'] = df['Name']
+            frames.append(df[[column for column in SUMMARY_COLUMNS if column in df.columns]])
+    if not frames:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS + ['severity'])
+
+    df = pd.concat(frames, ignore_index=True)
+    # Rows without a host or plugin would get category code -1 and land in the last row or column of the matrix
+    df = df.dropna(subset=['Host', 'Plugin ID'])
+    df['Host'] = df['Host'].astype(str).str.strip()
+    # CSV exports read Plugin ID as a number, .nessus exports as text
+    plugin_ids = pd.to_numeric(df['Plugin ID'], errors='coerce')
+    df['Plugin ID'] = plugin_ids.astype('Int64').astype(str).where(plugin_ids.notna(), df['Plugin ID'].astype(str).str.strip())
+    df['Name'] = df['Name'].fillna('').astype(str).str.strip()
+    df = df[(df['Host'] != '') & (df['Plugin ID'] != '')]
+    # Nessus exports informational findings with Risk "None"
+    df['severity'] = df['Risk'].fillna('None').astype(str).str.strip().str.lower().replace('none', 'info')
+    df = df[df['severity'].isin(SEVERITIES)]
+    # A plugin on several ports, or in several overlapping exports, counts once per host
+    return df.drop_duplicates(['Host', 'Plugin ID'])
+
+# Function to build the host x severity crosstab and the plugin x host matrix from the combined findings
+@timed("aggregate")
+def build_crosstabs(df):
+    severity = pd.Categorical(df['severity'], categories=SEVERITIES)
+    host_severity = pd.crosstab(df['Host'], severity).reindex(columns=SEVERITIES, fill_value=0)
+    host_severity.columns = [column.capitalize() for column in SEVERITIES]
+    host_severity['Total'] = host_severity.sum(axis=1)
+    host_severity = host_severity.sort_values([column.capitalize() for column in SEVERITIES], ascending=False)
+
+    # Plugin x host presence matrix filled in one scatter over the category codes
+    hosts = pd.Categorical(df['Host'], categories=host_severity.index)
+    plugins = pd.Categorical(df['Plugin ID'])
+    matrix = np.zeros((len(plugins.categories), len(hosts.categories)), dtype=np.uint8)
+    matrix[plugins.codes, hosts.codes] = 1
+
+    plugin_info = df.drop_duplicates('Plugin ID').set_index('Plugin ID').reindex(plugins.categories)
+    plugin_host = pd.DataFrame(matrix, index=plugins.categories, columns=hosts.categories)
+    plugin_host.insert(0, 'Hosts', matrix.sum(axis=1))
+    plugin_host.insert(0, 'Severity', plugin_info['severity'].str.capitalize().values)
+    plugin_host.insert(0, 'Name', plugin_info['Name'].values)
+    plugin_host.index.name = 'Plugin ID'
+    plugin_host['_rank'] = plugin_info['severity'].map(SEVERITY_INDEX).values
+    plugin_host = plugin_host.sort_values(['_rank', 'Hosts'], ascending=[True, False]).drop(columns='_rank')
+    return host_severity, plugin_host
+
+# Function to build one overview page: a table with the severity cells coloured like the per-host reports
+def build_summary_page(title, subtitle, columns, rows, page_number, page_total):
+    header = "".join(f"<th>{column}</th>" for column in columns)
+    body = ""
+    for row in rows:
+        cells = ""
+        for column, value in zip(columns, row):
+            severity = str(value).lower() if column == 'Severity' else column.lower()
+            style = f' style="background-color: {COLOR_MAP[severity]};"' if severity in COLOR_MAP and value not in (0, '0') else ''
+            cells += f"<td{style}>{value}</td>"
+        body += f"<tr>{cells}</tr>"
+    return f"""
+    <html>
+    <head><style>
+    body {{ font-family: 'Arial', sans-serif; background-color: white; color: black; margin: 20px; }}
+    h1 {{ color: black; text-align: center; font-size: 2em; margin-bottom: 0.2em; }}
+    p {{ text-align: center; margin-top: 0; }}
+    table {{ width: 100%; margin: 20px auto; border-collapse: collapse; }}
+    th, td {{ padding: 6px; text-align: center; border: 1px solid #ddd; }}
+    th {{ background-color: #f2f2f2; }}
+    </style></head>
+    <body>
+    <h1>{title} (page {page_number} of {page_total})</h1>
+    <p>{subtitle}</p>
+    <table><tr>{header}</tr>{body}</table>
+    </body></html>
+    """
+
+# Function to write the pages of one overview table and render them to PNG
+def render_summary_pages(output_folder, name, title, subtitle, columns, rows, executor):
+    pages = [rows[start:start + SUMMARY_ROWS_PER_PAGE] for start in range(0, len(rows), SUMMARY_ROWS_PER_PAGE)] or [[]]
+    futures = []
+    for page_number, page_rows in enumerate(pages, start=1):
+        html_file = os.path.join(output_folder, f"{name}_page{page_number}.html")
+        save_html_to_file(build_summary_page(title, subtitle, columns, page_rows, page_number, len(pages)), html_file)
+        futures.append(executor.submit(capture_screenshot, html_file, html_file.replace('.html', '.png')))
+    for future in futures:
+        future.result()
+    for page_number in range(1, len(pages) + 1):
+        os.remove(os.path.join(output_folder, f"{name}_page{page_number}.html"))
+    return len(pages)
+
+# Function for --summary: one aggregation over all exports, CSV matrices and a handful of overview images
+def summarize(folder_path, output_folder='nessus_summary', top=200):
+    start_time = time.time()
+    os.makedirs(output_folder, exist_ok=True)
+
+    df = load_exports(folder_path)
+    host_severity, plugin_host = build_crosstabs(df)
+    host_severity.to_csv(os.path.join(output_folder, 'host_severity.csv'), index_label='Host')
+    plugin_host.to_csv(os.path.join(output_folder, 'plugin_host_matrix.csv'))
+
+    totals = host_severity.sum()
+    subtitle = (f"{len(host_severity)} hosts, {len(plugin_host)} distinct plugins, "
+                + ", ".join(f"{severity}={totals[severity.capitalize()]}" for severity in SEVERITIES))
+    host_rows = [[host] + row for host, row in zip(host_severity.index[:top], host_severity.head(top).values.tolist())]
+    plugin_rows = [[plugin_id] + row for plugin_id, row in
+                   zip(plugin_host.index[:top], plugin_host.iloc[:top, :3].values.tolist())]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        page_count = render_summary_pages(output_folder, 'hosts', 'Hosts by Severity', subtitle,
+                                          ['Host'] + list(host_severity.columns), host_rows, executor)
+        page_count += render_summary_pages(output_folder, 'plugins', 'Findings by Plugin', subtitle,
+                                           ['Plugin ID', 'Name', 'Severity', 'Hosts'], plugin_rows, executor)
+
+    print("\nSummary Report:")
+    print(subtitle)
+    print(f"Overview images: {page_count} (top {top} hosts and plugins), instead of {len(host_severity)} per-host renders")
+    print(f"Matrices saved to {output_folder}/host_severity.csv and {output_folder}/plugin_host_matrix.csv")
+    print(f"Time taken: {time.time() - start_time:.2f} seconds")
 
 # Main script logic
-def main(folder_path):
+def main(folder_path, results_db=None, merge=False):
     start_time = time.time()
     scan_start_time = "Thu Aug 8 10:03:41 2024"  # Example, replace with actual
     scan_end_time = "Thu Aug 8 10:12:15 2024"    # Example, replace with actual
 
-    for csv_file in os.listdir(folder_path):
-        if csv_file.endswith('.csv'):
-            csv_file_path = os.path.join(folder_path, csv_file)
-            csv_name = os.path.splitext(csv_file)[0]
-            output_folder = os.path.join('nessus_screenshots', csv_name)
+    # With merge, overlapping exports become one dataset so shared hosts are parsed and rendered once
+    if merge:
+        exports = [('merged.csv', None)]
+    else:
+        exports = [(csv_file, os.path.join(folder_path, csv_file)) for csv_file in os.listdir(folder_path) if csv_file.endswith(EXPORT_EXTENSIONS)]
+
+    failed_ips = {}
+    for csv_file, csv_file_path in exports:
+        csv_name = os.path.splitext(csv_file)[0]
+        output_folder = os.path.join('nessus_screenshots', csv_name)
 
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
 
-            ips_vulns = parse_nessus_csv(csv_file_path)
-            total_ips = len(ips_vulns)
+        if csv_file_path:
+            store = parse_nessus_csv(csv_file_path, results_db)
+        else:
+            store = parse_merged_exports(folder_path, results_db)
+        total_ips = len(store)
 
-            with tqdm(total=total_ips, desc=f"Processing {csv_file}", ncols=100, bar_format="{{l_bar}}{{bar}}| {{n_fmt}}/{{total_fmt}} IPs Processed") as pbar:
-                with concurrent.futures.ProcessPoolExecutor() as executor:
-                    futures = {
-                        executor.submit(process_ip, ip, vulnerabilities, output_folder, scan_start_time, scan_end_time): ip
-                        for ip, vulnerabilities in ips_vulns.items()
-                    }
-                    for future in concurrent.futures.as_completed(futures):
-                        pbar.update(1)
+        with tqdm(total=total_ips, desc=f"Processing {csv_file}", ncols=100, bar_format="{{l_bar}}{{bar}}| {{n_fmt}}/{{total_fmt}} IPs Processed") as pbar:
+            with concurrent.futures.ProcessPoolExecutor(initializer=init_worker, initargs=(store.titles,)) as executor:
+                futures = {
+                    executor.submit(process_ip, ip, record, output_folder, scan_start_time, scan_end_time): ip
+                    for ip, record in store.hosts.items()
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        _, spans = future.result()
+                        METRICS.merge(spans)
+                    except Exception as e:
+                        failed_ips[futures[future]] = f"Exception: {e}"  # One failed host must not abort the export
+                    pbar.update(1)
+
+        totals = store.severity_totals()
+        print(f"{csv_file}: {total_ips} hosts, {len(store.titles)} distinct titles, " + ", ".join(f"{severity}={count}" for severity, count in totals.items()))
+        for title, host_count in store.top_titles('critical', 5):
+            print(f"  [critical] {title} ({host_count} hosts)")
 
     end_time = time.time()
     print(f"Time taken: {end_time - start_time:.2f} seconds")
     print(f"Screenshots saved in 'nessus_screenshots' folder")
+    if failed_ips:
+        print(f"\nIPs with errors or no screenshot: {len(failed_ips)}")
+        for ip, status in failed_ips.items():
+            print(f"IP: {ip} - Status: {status}")
 
 if __name__ == "__main__":
-    folder_path = input("Enter the path to the folder containing Nessus CSV reports: ")
-    main(folder_path)
+    parser = argparse.ArgumentParser(description="Render a vulnerability summary screenshot per host from Nessus CSV reports")
+    parser.add_argument("folder", nargs="?", help="Folder containing Nessus CSV reports (prompted for when omitted)")
+    parser.add_argument("--db", help="Also write the findings to this SQLite results database")
+    parser.add_argument("--merge", action="store_true", help="Merge overlapping CSVs (newest export wins per host/plugin/port/protocol) and render each host once")
+    parser.add_argument("--summary", action="store_true", help="Render an engagement-wide overview of all CSVs instead of one image per host")
+    parser.add_argument("--summary-top", type=int, default=200, help="Hosts and plugins shown in the overview images (all are in the CSVs)")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    parser.add_argument("--cprofile", help="Profile the run with cProfile and save the stats to this file")
+    args = parser.parse_args()
+
+    folder_path = args.folder or input("Enter the path to the folder containing Nessus CSV reports: ")
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("nessus")
+    if args.summary:
+        run, run_args = summarize, (folder_path, 'nessus_summary', args.summary_top)
+    else:
+        run, run_args = main, (folder_path, results_db, args.merge)
+    if args.cprofile:
+        run_profiled(args.cprofile, run, *run_args)
+    else:
+        run(*run_args)
+    if results_db:
+        results_db.close()
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "nessus")
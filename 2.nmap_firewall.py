@@ -2,18 +2,81 @@ import subprocess
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from evidence_store import EvidenceStore, host_workspace, save_raw_output
+from recorder import RunRecorder
+from run_metrics import METRICS, timed
+import launcher
+import scheduler
+from results_db import ResultsDB
+from stream_pipeline import stream_lines, stream_pages, render_pages
 import time
+import argparse
+from nmap_output import parse_port_states, parse_not_shown
+from nmap_timing import TimingController, is_timing_line
 
-def run_nmap(ip):
-    command = f"nmap -Pn --mtu 16 {ip}"
+@timed("run_nmap", host_arg=0)
+def run_nmap(ip, options="-Pn --mtu 16", timing=None):
+    if timing:
+        options = f"{options} {timing.options(ip)}"
+    command = f"nmap {options} {ip}"
+    started = time.time()
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-        return command, result.stdout
+        result = launcher.run(command, check=True)
+        output = result.stdout
     except subprocess.CalledProcessError as e:
-        return command, f"Error executing command: {e}\nOutput: {e.output}\nError Output: {e.stderr}"
+        output = f"Error executing command: {e}\nOutput: {e.output}\nError Output: {e.stderr}"
+    if timing:
+        timing.record(ip, output, time.time() - started)
+    return command, output
 
-def save_output_to_html(ip, command, output, folder):
-    filename = os.path.join(folder, f"{ip.replace('.', '_')}.html")
+# Function to pick the fragmented-scan port options from the baseline scan, or None when nothing is filtered
+def fragment_scan_ports(baseline_states, baseline_collapsed):
+    filtered = [port for port, state in baseline_states.items() if "filtered" in state]
+    if any(count and "filtered" in state for state, count in baseline_collapsed.items()):
+        # Filtered ports were collapsed into "Not shown", so rescan the default ports minus the ones that answered
+        answered = [port.split("/")[0] for port, state in baseline_states.items() if "filtered" not in state]
+        return f"--exclude-ports {','.join(answered)}" if answered else ""
+    if filtered:
+        return f"-p {','.join(port.split('/')[0] for port in filtered)}"
+    return None
+
+# Function to list the ports filtered in the baseline that the fragmented scan found open
+def fragmentation_diff(baseline_states, fragment_states):
+    return sorted(
+        (port for port, state in fragment_states.items()
+         if state == "open" and baseline_states.get(port, "filtered") != "open"),
+        key=lambda port: int(port.split("/")[0]),
+    )
+
+# Function to run a fast baseline scan, then a fragmented scan limited to what the baseline saw as filtered.
+# Also returns each phase's raw output and finish time, so the results database gets both scans in order
+def run_two_phase(ip, timing=None):
+    baseline_command, baseline_output = run_nmap(ip, "-Pn", timing)
+    phases = [(baseline_output, time.time())]
+    baseline_states = parse_port_states(baseline_output)
+    port_options = fragment_scan_ports(baseline_states, parse_not_shown(baseline_output))
+
+    if port_options is None:
+        output = f"{baseline_output}\nNo filtered ports in baseline scan, fragmented scan skipped."
+        return baseline_command, output, None, phases
+
+    fragment_command, fragment_output = run_nmap(ip, f"-Pn --mtu 16 {port_options}".strip(), timing)
+    phases.append((fragment_output, time.time()))
+    opened = fragmentation_diff(baseline_states, parse_port_states(fragment_output))
+    diff_lines = [f"{port}: filtered -> open" for port in opened] or ["No ports opened by fragmentation."]
+    output = (
+        f"Baseline: {baseline_command}\n{baseline_output}\n"
+        f"Fragmented: {fragment_command}\n{fragment_output}\n"
+        "Fragmentation bypass diff:\n" + "\n".join(diff_lines)
+    )
+    return fragment_command, output, opened, phases
+
+# Lines of scanner output per screenshot in --stream mode
+LINES_PER_PAGE = 60
+
+@timed("save_output_to_html", host_arg=0)
+def save_output_to_html(ip, command, output, folder, suffix=""):
+    filename = os.path.join(folder, f"{ip.replace('.', '_')}{suffix}.html")
     html_content = f"""
     <html>
     <head>
@@ -45,29 +108,113 @@ def save_output_to_html(ip, command, output, folder):
         file.write(html_content)
     return filename
 
+@timed("generate_screenshot")
 def generate_screenshot(html_file):
     image_file = html_file.replace(".html", ".png")
-    command = f"wkhtmltoimage {html_file} {image_file}"
+    command = ["wkhtmltoimage", html_file, image_file]
     try:
-        subprocess.run(command, shell=True, check=True)
+        launcher.run(command, capture_output=False, check=True)
     except subprocess.CalledProcessError as e:
         return f"Error generating screenshot: {e}"
     return image_file
 
-def process_ip(ip, folder, progress_data):
-    try:
-        command, output = run_nmap(ip)
-        html_file = save_output_to_html(ip, command, output, folder)
+# Function to render nmap output page by page while the scan is still running
+def process_ip_streaming(ip, folder, render_pool, timing=None, results_db=None):
+    options = "-Pn --mtu 16"
+    if timing:
+        options = f"{options} {timing.options(ip)}"
+    command = f"nmap {options} {ip}"
+    started = time.time()
+    status_lines = []
+    output_lines = []
+
+    def scan_lines():
+        for line in stream_lines(command):
+            if is_timing_line(line):
+                status_lines.append(line)
+            if results_db:
+                output_lines.append(line)
+            yield line
+
+    def render_page(page, number):
+        html_file = save_output_to_html(ip, command, "\n".join(page), folder, suffix=f"_part{number}")
         screenshot_result = generate_screenshot(html_file)
         if "Error" in screenshot_result:
-            progress_data[ip] = screenshot_result
-        else:
-            os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
-            progress_data[ip] = "Success"
-    except Exception as e:
-        progress_data[ip] = f"Error: {e}"
+            raise RuntimeError(screenshot_result)
+        os.remove(html_file)
+        return screenshot_result
+
+    image_files = render_pages(stream_pages(scan_lines(), LINES_PER_PAGE), render_pool, render_page)
+    if timing:
+        timing.record(ip, "\n".join(status_lines), time.time() - started)
+    if results_db:
+        results_db.add_nmap(ip, "\n".join(output_lines))
+    return image_files
+
+def process_ip(ip, folder, progress_data, two_phase=False, bypass_data=None, timing=None, render_pool=None, store=None, recorder=None, results_db=None):
+    with host_workspace(store, folder) as folder:
+        try:
+            if render_pool and not two_phase:
+                process_ip_streaming(ip, folder, render_pool, timing, results_db)
+                progress_data[ip] = "Success"
+                return
+            started = time.time()
+            if two_phase:
+                command, output, opened, phases = run_two_phase(ip, timing)
+                bypass_data[ip] = opened
+            else:
+                command, output = run_nmap(ip, timing=timing)
+                phases = [(output, time.time())]
+            if recorder:
+                recorder.record(ip, command, started, time.time(), stdout=output)
+            if results_db:
+                for phase_output, finished in phases:
+                    results_db.add_nmap(ip, phase_output, finished)
+            if store:
+                save_raw_output(folder, f"{ip.replace('.', '_')}.txt", f"{command}\n{output}")
+            html_file = save_output_to_html(ip, command, output, folder)
+            screenshot_result = generate_screenshot(html_file)
+            if "Error" in screenshot_result:
+                progress_data[ip] = screenshot_result
+            else:
+                os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
+                progress_data[ip] = "Success"
+        except Exception as e:
+            progress_data[ip] = f"Error: {e}"
+
+# Function to rebuild the screenshot of one recorded host (used by replay.py)
+def render_recording(record, folder, header):
+    html_file = save_output_to_html(record["ip"], record["command"], record["stdout"], folder)
+    screenshot_result = generate_screenshot(html_file)
+    if "Error" in screenshot_result:
+        raise RuntimeError(screenshot_result)
+    os.remove(html_file)
+    return screenshot_result
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fragmented (--mtu 16) nmap scan and screenshot per IP from ip.txt")
+    parser.add_argument("--two-phase", action="store_true",
+                        help="Run a fast baseline scan first and fragment-scan only hosts and ports it saw as filtered")
+    parser.add_argument("--adaptive-timing", action="store_true",
+                        help="Tune nmap rate, retries and RTT timeouts per /24 from observed RTT and response rate")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render output pages while nmap is still running (ignored with --two-phase)")
+    parser.add_argument("--store", help="Pack screenshots and raw output into this evidence store instead of loose files")
+    parser.add_argument("--no-record", action="store_true", help="Do not record raw output to recordings/ for replay.py")
+    parser.add_argument("--db", help="Also write structured results to this SQLite results database")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    launcher.add_arguments(parser)
+    scheduler.add_arguments(parser)
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    launcher.configure(args)
+    store = EvidenceStore(args.store) if args.store else None
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("nmap_firewall")
+
     with open("ip.txt", "r") as file:
         ips = [line.strip() for line in file]
 
@@ -77,14 +224,24 @@ def main():
 
     total_ips = len(ips)
     progress_data = {}
+    bypass_data = {}
+    recorder = None if args.no_record else RunRecorder("nmap_firewall", folder, {"two_phase": args.two_phase})
+    timing = TimingController(log=tqdm.write) if args.adaptive_timing else None
 
     start_time = time.time()
 
+    # Longest expected targets first, so a slow host does not start last and hold up the run
+    ips, schedule = scheduler.plan(ips, "nmap_firewall", args, workers=5)
+
     # Overall progress bar
     with tqdm(total=total_ips, desc="Overall Progress", unit="IP") as overall_pbar:
         # Use ThreadPoolExecutor to manage concurrent tasks
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(process_ip, ip, folder, progress_data): ip for ip in ips}
+        with ThreadPoolExecutor(max_workers=5) as executor, ThreadPoolExecutor(max_workers=5) as render_pool:
+            futures = {
+                executor.submit(process_ip, ip, folder, progress_data, args.two_phase, bypass_data, timing,
+                                render_pool if args.stream else None, store=store, recorder=recorder, results_db=results_db): ip
+                for ip in ips
+            }
 
             # Update progress bar as tasks complete
             for future in as_completed(futures):
@@ -109,6 +266,38 @@ def main():
     print(f"Screenshots taken: {screenshot_count}")
     print(f"Time taken for overall process: {elapsed_time:.2f} seconds")
 
+    scheduler.report(schedule, end_time)
+
+    if results_db:
+        results_db.close()
+
+    launcher.report()
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "nmap_firewall")
+
+    if recorder:
+        recorder.close()
+        print(f"Raw output recorded to {recorder.path}")
+
+    if store:
+        stats = store.stats()
+        store.close()
+        print(f"Evidence store: {stats['files']} files in {stats['packs']} pack(s) at {args.store}")
+
+    if timing:
+        print("Adaptive timing per subnet:")
+        for line in timing.report():
+            print(f"  {line}")
+
+    if args.two_phase:
+        fragmented_hosts = [ip for ip, opened in bypass_data.items() if opened is not None]
+        bypassed_hosts = {ip: opened for ip, opened in bypass_data.items() if opened}
+        print(f"Hosts fragment-scanned: {len(fragmented_hosts)} of {total_ips}")
+        print(f"Hosts with ports opened by fragmentation: {len(bypassed_hosts)}")
+        for ip, opened in bypassed_hosts.items():
+            print(f"IP: {ip} - Opened: {', '.join(opened)}")
+
     if failed_ips:
         missing_count = len(failed_ips)
         print(f"Missing screenshots: {missing_count}")
@@ -1,17 +1,50 @@
-import subprocess
 import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from evidence_store import EvidenceStore, host_workspace, save_raw_output
+from recorder import RunRecorder
+from run_metrics import METRICS, timed
+import launcher
+import scheduler
+from results_db import ResultsDB
+from stream_pipeline import stream_lines, stream_pages, render_pages
 import time
 import sys
+import argparse
+from nmap_output import filter_scripts, resolve_scripts
+from nmap_timing import TimingController, is_timing_line
 
-def run_nmap(ip, command):
+@timed("run_nmap", host_arg=0)
+def run_nmap(ip, command, timing=None):
+    if timing:
+        command = f"{command} {timing.options(ip)}"
     full_command = f"{command} {ip}"
-    result = subprocess.run(full_command, shell=True, capture_output=True, text=True)
+    started = time.time()
+    result = launcher.run(full_command)
+    if timing:
+        timing.record(ip, result.stdout, time.time() - started)
     return full_command, result.stdout
 
-def save_output_to_html(ip, command, output, folder):
-    filename = os.path.join(folder, f"{ip.replace('.', '_')}.html")
+# Function to parse "name=script-expression" profile arguments
+def parse_profiles(profile_args):
+    profiles = {}
+    for profile_arg in profile_args:
+        name, sep, expression = profile_arg.partition("=")
+        if not sep or not name or not expression:
+            raise ValueError(f"Invalid profile '{profile_arg}', expected <folder>=<script expression>")
+        profiles[name] = expression
+    return profiles
+
+# Function to build one nmap command running the union of all profile scripts
+def build_combined_command(command, profiles):
+    return f"{command} --script \"{','.join(profiles.values())}\""
+
+# Lines of scanner output per screenshot in --stream mode
+LINES_PER_PAGE = 60
+
+@timed("save_output_to_html", host_arg=0)
+def save_output_to_html(ip, command, output, folder, suffix=""):
+    filename = os.path.join(folder, f"{ip.replace('.', '_')}{suffix}.html")
     html_content = f"""
     <html>
     <head>
@@ -43,47 +76,184 @@ def save_output_to_html(ip, command, output, folder):
         file.write(html_content)
     return filename
 
+@timed("generate_screenshot")
 def generate_screenshot(html_file):
     image_file = html_file.replace(".html", ".png")
-    command = f"wkhtmltoimage {html_file} {image_file}"
-    subprocess.run(command, shell=True)
+    launcher.run(["wkhtmltoimage", html_file, image_file], capture_output=False)
     return image_file
 
-def process_ip(ip, command, folder, progress_data):
-    try:
-        full_command, output = run_nmap(ip, command)
-        html_file = save_output_to_html(ip, full_command, output, folder)
+# Function to render nmap output page by page while the scan is still running
+def process_ip_streaming(ip, command, folder, render_pool, timing=None, results_db=None):
+    if timing:
+        command = f"{command} {timing.options(ip)}"
+    full_command = f"{command} {ip}"
+    started = time.time()
+    status_lines = []
+    output_lines = []
+
+    def scan_lines():
+        for line in stream_lines(full_command):
+            if is_timing_line(line):
+                status_lines.append(line)
+            if results_db:
+                output_lines.append(line)
+            yield line
+
+    def render_page(page, number):
+        html_file = save_output_to_html(ip, full_command, "\n".join(page), folder, suffix=f"_part{number}")
         generate_screenshot(html_file)
         os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
+        return html_file.replace(".html", ".png")
+
+    image_files = render_pages(stream_pages(scan_lines(), LINES_PER_PAGE), render_pool, render_page)
+    if timing:
+        timing.record(ip, "\n".join(status_lines), time.time() - started)
+    if results_db:
+        results_db.add_nmap(ip, "\n".join(output_lines))
+    return image_files
+
+def process_ip(ip, command, folder, progress_data, timing=None, render_pool=None, store=None, recorder=None, results_db=None):
+    with host_workspace(store, folder) as folder:
+        try:
+            if render_pool:
+                process_ip_streaming(ip, command, folder, render_pool, timing, results_db)
+                progress_data[ip] = "Success"
+                return
+            started = time.time()
+            full_command, output = run_nmap(ip, command, timing)
+            if recorder:
+                recorder.record(ip, full_command, started, time.time(), stdout=output)
+            if results_db:
+                results_db.add_nmap(ip, output)
+            if store:
+                save_raw_output(folder, f"{ip.replace('.', '_')}.txt", f"{full_command}\n{output}")
+            html_file = save_output_to_html(ip, full_command, output, folder)
+            generate_screenshot(html_file)
+            os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
+            progress_data[ip] = "Success"
+        except Exception as e:
+            progress_data[ip] = f"Error: {e}"
+
+# Function to scan each IP once with the union of all profiles and screenshot each profile's results
+def process_ip_combined(ip, command, profile_scripts, progress_data, timing=None, store=None, recorder=None, results_db=None):
+    try:
+        started = time.time()
+        full_command, output = run_nmap(ip, command, timing)
+        if recorder:
+            recorder.record(ip, full_command, started, time.time(), stdout=output)
+        if results_db:
+            results_db.add_nmap(ip, output)
+        for layout_folder, script_ids in profile_scripts.items():
+            with host_workspace(store, layout_folder) as folder:
+                if store:
+                    save_raw_output(folder, f"{ip.replace('.', '_')}.txt", f"{full_command}\n{output}")
+                html_file = save_output_to_html(ip, full_command, filter_scripts(output, script_ids), folder)
+                generate_screenshot(html_file)
+                os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
         progress_data[ip] = "Success"
     except Exception as e:
         progress_data[ip] = f"Error: {e}"
 
+# Function to rebuild the screenshots of one recorded host (used by replay.py)
+def render_recording(record, folder, header):
+    ip = record["ip"]
+    if header.get("profiles"):
+        # Combined runs are split per profile again, into <folder>/<profile folder>
+        outputs = {
+            os.path.join(folder, layout_folder): filter_scripts(record["stdout"], set(script_ids))
+            for layout_folder, script_ids in header["profiles"].items()
+        }
+    else:
+        outputs = {folder: record["stdout"]}
+    for target_folder, output in outputs.items():
+        os.makedirs(target_folder, exist_ok=True)
+        html_file = save_output_to_html(ip, record["command"], output, target_folder)
+        generate_screenshot(html_file)
+        os.remove(html_file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="python script.py <nmap_command> <ip_list_file> [--profile <folder>=<scripts> ...]",
+        description="Run nmap NSE scans per IP and screenshot the output. With --profile, every IP is "
+                    "scanned once with the union of all profile scripts and each profile's results are "
+                    "saved to its own folder, e.g. --profile http_nse=http-* --profile vuln_nse=vuln",
+    )
+    parser.add_argument("nmap_command", help="Base nmap command, e.g. \"nmap -Pn -sV\"")
+    parser.add_argument("ip_list_file", help="File with one IP per line")
+    parser.add_argument("--profile", action="append", default=[], help="Named script profile <folder>=<script expression>")
+    parser.add_argument("--adaptive-timing", action="store_true",
+                        help="Tune nmap rate, retries and RTT timeouts per /24 from observed RTT and response rate")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render output pages while nmap is still running (ignored with --profile)")
+    parser.add_argument("--store", help="Pack screenshots and raw output into this evidence store instead of loose files")
+    parser.add_argument("--no-record", action="store_true", help="Do not record raw output to recordings/ for replay.py")
+    parser.add_argument("--db", help="Also write structured results to this SQLite results database")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    launcher.add_arguments(parser)
+    scheduler.add_arguments(parser)
+    return parser.parse_args()
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python script.py <nmap_command> <ip_list_file>")
-        sys.exit(1)
+    args = parse_args()
+    launcher.configure(args)
+    store = EvidenceStore(args.store) if args.store else None
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("nmap_nse")
 
-    nmap_command = sys.argv[1]
-    ip_list_file = sys.argv[2]
+    nmap_command = args.nmap_command
+    ip_list_file = args.ip_list_file
 
     with open(ip_list_file, "r") as file:
         ips = [line.strip() for line in file]
 
-    folder = "http_nse"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
+    try:
+        profiles = parse_profiles(args.profile)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if profiles:
+        # Resolve categories and wildcards once so results can be split by script ID
+        profile_scripts = {folder: resolve_scripts(expression) for folder, expression in profiles.items()}
+        # A profile without script IDs would have every script block filtered out of its screenshots
+        unresolved = [f"{folder}={profiles[folder]}" for folder, script_ids in profile_scripts.items() if not script_ids]
+        if unresolved:
+            print(f"No NSE scripts found for profile(s) {', '.join(unresolved)}; check them with nmap --script-help")
+            sys.exit(1)
+        nmap_command = build_combined_command(nmap_command, profiles)
+        folders = list(profiles)
+    else:
+        folders = ["http_nse"]
+
+    for folder in folders:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    folder = folders[0]
 
     total_ips = len(ips)
     progress_data = {}
+    recorder = None
+    if not args.no_record:
+        if profiles:
+            recorder = RunRecorder("nmap_nse", ".", {"profiles": {name: sorted(ids) for name, ids in profile_scripts.items()}})
+        else:
+            recorder = RunRecorder("nmap_nse", folder)
+    timing = TimingController(log=tqdm.write) if args.adaptive_timing else None
 
     start_time = time.time()
 
+    # Longest expected targets first, so a slow host does not start last and hold up the run
+    ips, schedule = scheduler.plan(ips, "nmap_nse", args, workers=5)
+
     # Overall progress bar
     with tqdm(total=total_ips, desc="Overall Progress", unit="IP") as overall_pbar:
         # Use ThreadPoolExecutor to manage concurrent tasks
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(process_ip, ip, nmap_command, folder, progress_data): ip for ip in ips}
+        with ThreadPoolExecutor(max_workers=5) as executor, ThreadPoolExecutor(max_workers=5) as render_pool:
+            if profiles:
+                futures = {executor.submit(process_ip_combined, ip, nmap_command, profile_scripts, progress_data, timing, store=store, recorder=recorder, results_db=results_db): ip for ip in ips}
+            else:
+                futures = {executor.submit(process_ip, ip, nmap_command, folder, progress_data, timing, render_pool if args.stream else None, store=store, recorder=recorder, results_db=results_db): ip for ip in ips}
 
             # Update progress bar as tasks complete
             for future in as_completed(futures):
@@ -108,6 +278,30 @@ def main():
     print(f"Screenshots taken: {screenshot_count}")
     print(f"Time taken for overall process: {elapsed_time:.2f} seconds")
 
+    scheduler.report(schedule, end_time)
+
+    if results_db:
+        results_db.close()
+
+    launcher.report()
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "nmap_nse")
+
+    if recorder:
+        recorder.close()
+        print(f"Raw output recorded to {recorder.path}")
+
+    if store:
+        stats = store.stats()
+        store.close()
+        print(f"Evidence store: {stats['files']} files in {stats['packs']} pack(s) at {args.store}")
+
+    if timing:
+        print("Adaptive timing per subnet:")
+        for line in timing.report():
+            print(f"  {line}")
+
     if failed_ips:
         missing_count = len(failed_ips)
         print(f"Missing screenshots: {missing_count}")
@@ -1,10 +1,18 @@
-import subprocess
 import os
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from evidence_store import EvidenceStore, host_workspace, save_raw_output
+from recorder import RunRecorder
+from run_metrics import METRICS, timed
+import launcher
+import scheduler
+from results_db import ResultsDB
+from preflight import sweep
+from stream_pipeline import stream_lines, stream_pages, render_pages
 import textwrap
 import time
+import argparse
 from PIL import Image, ImageDraw, ImageFont
 
 # Function to strip ANSI escape codes
@@ -13,14 +21,24 @@ def strip_ansi_codes(text):
     return ansi_escape.sub('', text)
 
 # Run sslscan command
+@timed("run_sslscan", host_arg=0)
 def run_sslscan(ip):
     command = f"sslscan {ip}"
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    result = launcher.run(command)
     clean_output = strip_ansi_codes(result.stdout)
     return command, clean_output
 
-# Save output to images with dynamically adjusted height and minimal margin
-def save_output_to_images(ip, command, output, folder):
+MAX_LINES_PER_IMAGE = 50  # Define the maximum number of lines per image
+
+# Wrap lines that are too long, with the command as the first line
+def wrap_output_lines(command, output_lines):
+    yield f"Command: {command}"
+    for line in output_lines:
+        yield from (textwrap.wrap(line, width=118) if len(line) > 118 else [line])
+
+# Render one chunk of lines to an image with dynamically adjusted height and minimal margin
+@timed("render_chunk", host_arg=0)
+def render_chunk(ip, chunk, index, folder):
     # Define image properties
     image_width = 1024  # Fixed width
     background_color = "#0C0C0C"
@@ -37,8 +55,6 @@ def save_output_to_images(ip, command, output, folder):
     red_rectangle_color = "#FF0000"  # Red color for rectangle highlights
 
     line_height = font_size + 6
-    max_lines_per_image = 50  # Define the maximum number of lines per image
-    output_lines = output.splitlines()
 
     # Define the list of key-value pairs to highlight
     highlight_keys = [
@@ -46,76 +62,125 @@ def save_output_to_images(ip, command, output, folder):
         "signature algorithm", "rsa key strength", "ssl/tls protocols"
     ]
 
-    # Wrap lines that are too long
-    wrapped_lines = []
-    for line in output_lines:
-        wrapped_lines.extend(textwrap.wrap(line, width=118) if len(line) > 118 else [line])
+    # Calculate required image height
+    required_height = len(chunk) * line_height + 20  # Minimal margin
+    img = Image.new("RGB", (image_width, required_height), color=background_color)
+    draw = ImageDraw.Draw(img)
 
-    wrapped_lines.insert(0, f"Command: {command}")  # Add command as the first line
+    y_position = 10
+    for line in chunk:
+        if "Command:" in line:
+            draw.text((10, y_position), line, font=font, fill=command_color)
+        else:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                key = key.strip()
+                value = value.strip()
+                key_highlight = key.lower() in highlight_keys
 
-    # Split into chunks based on max lines per image
-    chunks = [wrapped_lines[i:i + max_lines_per_image] for i in range(0, len(wrapped_lines), max_lines_per_image)]
-    image_files = []
-
-    for index, chunk in enumerate(chunks):
-        # Calculate required image height
-        required_height = len(chunk) * line_height + 20  # Minimal margin
-        img = Image.new("RGB", (image_width, required_height), color=background_color)
-        draw = ImageDraw.Draw(img)
-
-        y_position = 10
-        for line in chunk:
-            if "Command:" in line:
-                draw.text((10, y_position), line, font=font, fill=command_color)
+                if key_highlight:
+                    # Draw red rectangle around the entire key-value pair
+                    key_value_text = f"{key}: {value}"
+                    key_value_position = (10, y_position)
+                    key_value_size = draw.textbbox((0, 0), key_value_text, font=font)
+                    rectangle_bbox = (key_value_position[0] - 2, key_value_position[1] - 2, key_value_position[0] + key_value_size[2] + 2, key_value_position[1] + key_value_size[3] + 2)
+                    draw.rectangle(rectangle_bbox, outline=red_rectangle_color)
+                    draw.text(key_value_position, key_value_text, font=font, fill=text_color)
+                else:
+                    draw.text((10, y_position), key + ":", font=font, fill=key_color)
+                    draw.text((10 + draw.textbbox((0, 0), key + ":", font=font)[2], y_position), value, font=font, fill=text_color)
             else:
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    key = key.strip()
-                    value = value.strip()
-                    key_highlight = key.lower() in highlight_keys
-
-                    if key_highlight:
-                        # Draw red rectangle around the entire key-value pair
-                        key_value_text = f"{key}: {value}"
-                        key_value_position = (10, y_position)
-                        key_value_size = draw.textbbox((0, 0), key_value_text, font=font)
-                        rectangle_bbox = (key_value_position[0] - 2, key_value_position[1] - 2, key_value_position[0] + key_value_size[2] + 2, key_value_position[1] + key_value_size[3] + 2)
-                        draw.rectangle(rectangle_bbox, outline=red_rectangle_color)
-                        draw.text(key_value_position, key_value_text, font=font, fill=text_color)
-                    else:
-                        draw.text((10, y_position), key + ":", font=font, fill=key_color)
-                        draw.text((10 + draw.textbbox((0, 0), key + ":", font=font)[2], y_position), value, font=font, fill=text_color)
+                if "SSL/TLS Protocols" in line:
+                    # Highlight "SSL/TLS Protocols" section in red
+                    section_title = "SSL/TLS Protocols"
+                    draw.text((10, y_position), section_title, font=font, fill=tls_protocols_color)
+                    y_position += line_height
                 else:
-                    if "SSL/TLS Protocols" in line:
-                        # Highlight "SSL/TLS Protocols" section in red
-                        section_title = "SSL/TLS Protocols"
-                        draw.text((10, y_position), section_title, font=font, fill=tls_protocols_color)
-                        y_position += line_height
-                    else:
-                        draw.text((10, y_position), line, font=font, fill=text_color)
-
-            y_position += line_height
-
-        # Crop image to content with 1mm margin
-        content_bbox = img.getbbox()
-        cropped_img = img.crop(content_bbox)
-        image_file = os.path.join(folder, f"{ip.replace('.', '_')}_part{index+1}.png")
-        cropped_img.save(image_file)
-        image_files.append(image_file)
+                    draw.text((10, y_position), line, font=font, fill=text_color)
 
-    return image_files
+        y_position += line_height
+
+    # Crop image to content with 1mm margin
+    content_bbox = img.getbbox()
+    cropped_img = img.crop(content_bbox)
+    image_file = os.path.join(folder, f"{ip.replace('.', '_')}_part{index+1}.png")
+    cropped_img.save(image_file)
+    return image_file
+
+# Save output to images with dynamically adjusted height and minimal margin
+@timed("save_output_to_images", host_arg=0)
+def save_output_to_images(ip, command, output, folder):
+    wrapped_lines = list(wrap_output_lines(command, output.splitlines()))
+
+    # Split into chunks based on max lines per image
+    chunks = [wrapped_lines[i:i + MAX_LINES_PER_IMAGE] for i in range(0, len(wrapped_lines), MAX_LINES_PER_IMAGE)]
+    return [render_chunk(ip, chunk, index, folder) for index, chunk in enumerate(chunks)]
 
 # Process IP function
-def process_ip(ip, folder, progress_data):
-    try:
-        command, output = run_sslscan(ip)
-        save_output_to_images(ip, command, output, folder)
-        progress_data[ip] = "Success"
-    except Exception as e:
-        progress_data[ip] = f"Error: {e}"
+def process_ip(ip, folder, progress_data, render_pool=None, store=None, recorder=None, results_db=None):
+    with host_workspace(store, folder) as folder:
+        try:
+            if render_pool:
+                process_ip_streaming(ip, folder, render_pool, results_db)
+            else:
+                started = time.time()
+                command, output = run_sslscan(ip)
+                if recorder:
+                    recorder.record(ip, command, started, time.time(), stdout=output)
+                if results_db:
+                    results_db.add_sslscan(ip, output)
+                if store:
+                    save_raw_output(folder, f"{ip.replace('.', '_').replace(':', '_')}.txt", f"{command}\n{output}")
+                save_output_to_images(ip, command, output, folder)
+            progress_data[ip] = "Success"
+        except Exception as e:
+            progress_data[ip] = f"Error: {e}"
+
+# Render each image as soon as sslscan has printed enough lines for it, holding one page per host in memory
+# (and the whole output with --db, which is parsed once the scan ends)
+def process_ip_streaming(ip, folder, render_pool, results_db=None):
+    command = f"sslscan {ip}"
+    scanned_lines = []
+
+    def scan_lines():
+        for line in stream_lines(command):
+            line = strip_ansi_codes(line)
+            if results_db:
+                scanned_lines.append(line)
+            yield line
+
+    pages = stream_pages(wrap_output_lines(command, scan_lines()), MAX_LINES_PER_IMAGE)
+    image_files = render_pages(pages, render_pool, lambda chunk, number: render_chunk(ip, chunk, number - 1, folder))
+    if results_db:
+        results_db.add_sslscan(ip, "\n".join(scanned_lines))
+    return image_files
+
+# Function to rebuild the images of one recorded host (used by replay.py)
+def render_recording(record, folder, header):
+    return save_output_to_images(record["ip"], record["command"], record["stdout"], folder)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run sslscan per target in ip.txt and save screenshots")
+    parser.add_argument("--no-preflight", action="store_true", help="Skip the TCP pre-flight sweep and scan every target")
+    parser.add_argument("--preflight-timeout", type=float, default=2.0, help="Connect timeout for the pre-flight sweep")
+    parser.add_argument("--stream", action="store_true", help="Render images while sslscan is still running")
+    parser.add_argument("--store", help="Pack screenshots and raw output into this evidence store instead of loose files")
+    parser.add_argument("--no-record", action="store_true", help="Do not record raw output to recordings/ for replay.py")
+    parser.add_argument("--db", help="Also write structured results to this SQLite results database")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    launcher.add_arguments(parser)
+    scheduler.add_arguments(parser)
+    return parser.parse_args()
 
 # Main function
 def main():
+    args = parse_args()
+    launcher.configure(args)
+    store = EvidenceStore(args.store) if args.store else None
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("sslscan")
+
     with open("ip.txt", "r") as file:
         ips = [line.strip() for line in file]
 
@@ -125,12 +190,21 @@ def main():
 
     total_ips = len(ips)
     progress_data = {}
+    recorder = None if args.no_record else RunRecorder("sslscan", folder)
 
     start_time = time.time()
 
-    with tqdm(total=total_ips, desc="Overall Progress", unit="IP") as overall_pbar:
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(process_ip, ip, folder, progress_data): ip for ip in ips}
+    # Drop targets with nothing listening on 443 before starting a heavy scanner process for them
+    unreachable = {}
+    if not args.no_preflight:
+        ips, unreachable = sweep(ips, default_port=443, timeout=args.preflight_timeout)
+
+    # Longest expected targets first, so a slow host does not start last and hold up the run
+    ips, schedule = scheduler.plan(ips, "sslscan", args, workers=5)
+
+    with tqdm(total=len(ips), desc="Overall Progress", unit="IP") as overall_pbar:
+        with ThreadPoolExecutor(max_workers=5) as executor, ThreadPoolExecutor(max_workers=5) as render_pool:
+            futures = {executor.submit(process_ip, ip, folder, progress_data, render_pool if args.stream else None, store=store, recorder=recorder, results_db=results_db): ip for ip in ips}
             for future in as_completed(futures):
                 ip = futures[future]
                 overall_pbar.set_postfix_str(f"Current IP: {ip}")
@@ -151,6 +225,30 @@ def main():
     print(f"Screenshots taken: {screenshot_count}")
     print(f"Time taken for overall process: {elapsed_time:.2f} seconds")
 
+    scheduler.report(schedule, end_time)
+
+    if results_db:
+        results_db.close()
+
+    launcher.report()
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "sslscan")
+
+    if recorder:
+        recorder.close()
+        print(f"Raw output recorded to {recorder.path}")
+
+    if store:
+        stats = store.stats()
+        store.close()
+        print(f"Evidence store: {stats['files']} files in {stats['packs']} pack(s) at {args.store}")
+
+    if unreachable:
+        print(f"Unreachable targets skipped: {len(unreachable)}")
+        for ip, reason in unreachable.items():
+            print(f"IP: {ip} - Reason: {reason}")
+
     if failed_ips:
         print(f"\nIPs with errors or no screenshot: {len(failed_ips)}")
         for ip in failed_ips:
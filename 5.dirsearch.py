@@ -1,22 +1,27 @@
 import subprocess
 import os
 import json
-import psutil
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from evidence_store import EvidenceStore, host_workspace, save_raw_output
+from recorder import RunRecorder
+from run_metrics import METRICS, timed
+import launcher
+import scheduler
+from results_db import ResultsDB
+from preflight import sweep
 import time
+import argparse
 import shutil
 import gc
 
-# Define memory limit (e.g., 75% of total system memory)
-MEMORY_LIMIT = 0.75 * psutil.virtual_memory().total
-
+@timed("run_dirsearch", host_arg=0)
 def run_dirsearch(ip):
     output_file = f"{ip.replace('.', '_')}.json"
     command = f"dirsearch -u https://{ip}/ -x 204,400,401,403,404,500,502 -t 50 --format json -o {output_file}"
 
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        result = launcher.run(command)
         result.check_returncode()
         # Verify if the output file was created
         if not os.path.exists(output_file):
@@ -27,6 +32,7 @@ def run_dirsearch(ip):
     return command, result.stdout, output_file
 
 
+@timed("filter_and_limit_results")
 def filter_and_limit_results(json_data, max_per_group=5):
     seen_urls = set()
     grouped_results = {}
@@ -69,6 +75,7 @@ def format_json_output(filtered_results, json_data, command):
     return "<br>".join(formatted_output)
 
 
+@timed("save_output_to_html", host_arg=0)
 def save_output_to_html(ip, formatted_output, command, folder):
     filename = os.path.join(folder, f"{ip.replace('.', '_')}.html")
     html_content = f"""
@@ -137,18 +144,20 @@ def save_output_to_html(ip, formatted_output, command, folder):
     return filename
 
 
+@timed("generate_screenshot")
 def generate_screenshot(html_file):
     image_file = html_file.replace(".html", ".png")
-    command = f"wkhtmltoimage {html_file} {image_file}"
+    command = ["wkhtmltoimage", html_file, image_file]
 
     try:
-        subprocess.run(command, shell=True, check=True)
+        launcher.run(command, capture_output=False, check=True)
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Screenshot generation failed: {e.stderr}")
 
     return image_file
 
 
+@timed("cleanup_files", host_arg=0)
 def cleanup_files(ip, output_file, html_file):
     if os.path.exists(output_file):
         os.remove(output_file)
@@ -157,35 +166,79 @@ def cleanup_files(ip, output_file, html_file):
     gc.collect()
 
 
-def memory_within_limit():
-    current_memory_usage = psutil.virtual_memory().used
-    return current_memory_usage < MEMORY_LIMIT
+def process_ip(ip, folder, progress_data, store=None, recorder=None, results_db=None):
+    with host_workspace(store, folder) as folder:
+        try:
+            started = time.time()
+            command, output, output_file = run_dirsearch(ip)
 
+            with open(output_file, "r") as json_file:
+                json_data = json.load(json_file)
 
-def process_ip(ip, folder, progress_data):
-    try:
-        command, output, output_file = run_dirsearch(ip)
+            if recorder:
+                recorder.record(ip, command, started, time.time(), stdout=output, json_data=json_data)
+            if results_db:
+                results_db.add_dirsearch(ip, json_data)
+
+            if store:
+                with open(output_file, "rb") as raw_file:
+                    save_raw_output(folder, os.path.basename(output_file), raw_file.read())
 
-        with open(output_file, "r") as json_file:
-            json_data = json.load(json_file)
+            filtered_results = filter_and_limit_results(json_data, max_per_group=5)
 
-        filtered_results = filter_and_limit_results(json_data, max_per_group=5)
+            if not filtered_results:
+                progress_data[ip] = "No valid 200 OK responses"
+                return
 
-        if not filtered_results:
-            progress_data[ip] = "No valid 200 OK responses"
-            return
+            formatted_output = format_json_output(filtered_results, json_data, command)
+            html_file = save_output_to_html(ip, formatted_output, command, folder)
+            generate_screenshot(html_file)
+            cleanup_files(ip, output_file, html_file)
 
-        formatted_output = format_json_output(filtered_results, json_data, command)
-        html_file = save_output_to_html(ip, formatted_output, command, folder)
-        generate_screenshot(html_file)
-        cleanup_files(ip, output_file, html_file)
+            progress_data[ip] = "Success"
+        except Exception as e:
+            progress_data[ip] = f"Error: {e}"
 
-        progress_data[ip] = "Success"
-    except Exception as e:
-        progress_data[ip] = f"Error: {e}"
+
+# Function to rebuild the screenshot of one recorded host (used by replay.py)
+def render_recording(record, folder, header):
+    json_data = record["json"]
+    filtered_results = filter_and_limit_results(json_data, max_per_group=5)
+    if not filtered_results:
+        return None
+
+    formatted_output = format_json_output(filtered_results, json_data, record["command"])
+    html_file = save_output_to_html(record["ip"], formatted_output, record["command"], folder)
+    image_file = generate_screenshot(html_file)
+    os.remove(html_file)
+    return image_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run dirsearch against https://<ip>/ for each IP in ip.txt and save screenshots")
+    parser.add_argument("--no-preflight", action="store_true", help="Skip the TCP pre-flight sweep and scan every target")
+    parser.add_argument("--preflight-timeout", type=float, default=2.0, help="Connect timeout for the pre-flight sweep")
+    parser.add_argument("--store", help="Pack screenshots and raw output into this evidence store instead of loose files")
+    parser.add_argument("--no-record", action="store_true", help="Do not record raw output to recordings/ for replay.py")
+    parser.add_argument("--db", help="Also write structured results to this SQLite results database")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    launcher.add_arguments(parser)
+    scheduler.add_arguments(parser)
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+    launcher.configure(args)
+    # psutil is only needed for the memory guard while scanning, so it is imported here rather than at start-up
+    import psutil
+    # Define memory limit (e.g., 75% of total system memory)
+    memory_limit = 0.75 * psutil.virtual_memory().total
+    store = EvidenceStore(args.store) if args.store else None
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("dirsearch")
+
     with open("ip.txt", "r") as file:
         ips = [line.strip() for line in file]
 
@@ -195,18 +248,27 @@ def main():
 
     total_ips = len(ips)
     progress_data = {}
+    recorder = None if args.no_record else RunRecorder("dirsearch", folder)
 
     start_time = time.time()
 
-    with tqdm(total=total_ips, desc="Overall Progress", unit="IP") as overall_pbar:
+    # Drop targets with nothing listening on 443 before starting a heavy scanner process for them
+    unreachable = {}
+    if not args.no_preflight:
+        ips, unreachable = sweep(ips, default_port=443, timeout=args.preflight_timeout)
+
+    # Longest expected targets first, so a slow host does not start last and hold up the run
+    ips, schedule = scheduler.plan(ips, "dirsearch", args, workers=3)
+
+    with tqdm(total=len(ips), desc="Overall Progress", unit="IP") as overall_pbar:
         with ThreadPoolExecutor(max_workers=3) as executor:
             futures = {}
 
             for ip in ips:
-                while not memory_within_limit():
+                while psutil.virtual_memory().used >= memory_limit:
                     time.sleep(1)
 
-                future = executor.submit(process_ip, ip, folder, progress_data)
+                future = executor.submit(process_ip, ip, folder, progress_data, store=store, recorder=recorder, results_db=results_db)
                 futures[future] = ip
 
             for future in as_completed(futures):
@@ -229,6 +291,30 @@ def main():
     print(f"Screenshots taken: {screenshot_count}")
     print(f"Time taken for overall process: {elapsed_time:.2f} seconds")
 
+    scheduler.report(schedule, end_time)
+
+    if results_db:
+        results_db.close()
+
+    launcher.report()
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "dirsearch")
+
+    if recorder:
+        recorder.close()
+        print(f"Raw output recorded to {recorder.path}")
+
+    if store:
+        stats = store.stats()
+        store.close()
+        print(f"Evidence store: {stats['files']} files in {stats['packs']} pack(s) at {args.store}")
+
+    if unreachable:
+        print(f"Unreachable targets skipped: {len(unreachable)}")
+        for ip, reason in unreachable.items():
+            print(f"IP: {ip} - Reason: {reason}")
+
     if failed_ips:
         missing_count = len(failed_ips)
         print(f"Missing screenshots: {missing_count}")
@@ -1,17 +1,147 @@
-import subprocess
 import os
+import re
+import hashlib
+import shlex
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from evidence_store import EvidenceStore, host_workspace, save_raw_output
+from recorder import RunRecorder
+from run_metrics import METRICS, timed
+import launcher
+import scheduler
+from results_db import ResultsDB
+from stream_pipeline import stream_lines, stream_pages, render_pages
 import time
-import sys
+import argparse
+from nmap_timing import TimingController, is_timing_line
+from nmap_output import resolve_scripts, split_port_blocks, split_script_blocks
+from nse_cache import NseCache, service_fingerprint
 
-def run_nmap(ip, command):
+@timed("run_nmap", host_arg=0)
+def run_nmap(ip, command, timing=None):
+    if timing:
+        command = f"{command} {timing.options(ip)}"
     full_command = f"{command} {ip}"
-    result = subprocess.run(full_command, shell=True, capture_output=True, text=True)
+    started = time.time()
+    result = launcher.run(full_command)
+    if timing:
+        timing.record(ip, result.stdout, time.time() - started)
     return full_command, result.stdout
 
-def save_output_to_html(ip, command, output, folder):
-    filename = os.path.join(folder, f"{ip.replace('.', '_')}.html")
+SCRIPT_OPTION = re.compile(r"""--script[= ]\s*("[^"]*"|'[^']*'|\S+)""")
+PORT_OPTION = re.compile(r'\s-p\s*\S+')
+SCAN_TYPE_OPTION = re.compile(r'(?<!\S)-s[STAWMNFXYZU]+(?!\S)')
+
+# nmap -p prefixes per protocol, so a rescan hits UDP and SCTP ports with the right scan type
+PORT_PREFIXES = {"tcp": "T", "udp": "U", "sctp": "S"}
+
+# Script expression -> script IDs, resolved once per run with nmap --script-help
+_script_ids = {}
+_script_ids_lock = threading.Lock()
+
+def script_ids(expression):
+    with _script_ids_lock:
+        if expression not in _script_ids:
+            # When nmap cannot resolve the expression, cache it as a single unit like before
+            _script_ids[expression] = sorted(resolve_scripts(expression)) or [expression]
+        return _script_ids[expression]
+
+# Function to map script ID -> its output block within a port block or the host script section
+def script_results(lines, scripts):
+    blocks = {script_id: "\n".join(block) for kind, script_id, block in split_script_blocks("\n".join(lines)) if kind == 'script'}
+    if len(scripts) == 1 and scripts[0] not in blocks:
+        return {scripts[0]: "\n".join(blocks.values())}  # Unresolved expression, all its output is one unit
+    return blocks
+
+# Function to build an nmap -p list such as T:80,443,U:161 from port block keys such as 80/tcp and 161/udp
+def port_list(ports):
+    by_proto = {}
+    for port in sorted(ports, key=lambda port: int(port.split("/")[0])):
+        number, proto = port.split("/")
+        by_proto.setdefault(PORT_PREFIXES.get(proto, "T"), []).append(number)
+    return ",".join(f"{prefix}:{','.join(by_proto[prefix])}" for prefix in PORT_PREFIXES.values() if prefix in by_proto)
+
+# Function to run the vulnerability scripts only where a script's cached result is missing, expired or was
+# taken against a different service fingerprint, using a cheap version scan to decide
+def run_cached_scan(ip, command, cache, timing=None):
+    script_match = SCRIPT_OPTION.search(command)
+    scripts = script_ids(script_match.group(1).strip("\"'")) if script_match else [command]
+    port_option = PORT_OPTION.search(f" {command}")
+    # The probe keeps the command's scan types (e.g. -sU), otherwise it would only ever see TCP ports
+    scan_types = "".join(f" {scan_type}" for scan_type in SCAN_TYPE_OPTION.findall(command))
+    version_options = "-Pn -sV --version-light" + scan_types + (port_option.group(0) if port_option else "")
+    version_command, version_output = run_nmap(ip, f"nmap {version_options}", timing)
+
+    version_blocks, _ = split_port_blocks(version_output)
+    fingerprints = {
+        port: service_fingerprint(lines[0])
+        for port, lines in version_blocks.items()
+        if lines[0].split()[1] == "open"
+    }
+    host_fingerprint = hashlib.sha1(",".join(sorted(f"{port}={fp}" for port, fp in fingerprints.items())).encode()).hexdigest()
+
+    # (port or "host") -> {script ID: (output, scanned_at)}; every script is cached per port and per host
+    results = {port: {} for port in fingerprints}
+    results["host"] = {}
+    stale = {}
+    for port, fingerprint in list(fingerprints.items()) + ([("host", host_fingerprint)] if fingerprints else []):
+        for script in scripts:
+            cached = cache.get(ip, port, script, fingerprint)
+            if cached:
+                results[port][script] = cached
+            else:
+                stale.setdefault(port, set()).add(script)
+
+    full_command = f"{command} {ip} (all script results from cache)"
+    if stale:
+        # Host scripts can depend on any open port, so when one must run again every open port is scanned
+        # with it; otherwise only the stale ports are rescanned and the cached host results are kept
+        scan_ports = list(fingerprints) if "host" in stale else [port for port in stale]
+        scan_scripts = sorted(set().union(*stale.values()))
+        scan_command = SCRIPT_OPTION.sub(lambda _: f"--script {shlex.quote(','.join(scan_scripts))}", PORT_OPTION.sub("", f" {command}")).strip()
+        scan_command += f" -p {port_list(scan_ports)}"
+        full_command, scan_output = run_nmap(ip, scan_command, timing)
+        scan_blocks, host_script_lines = split_port_blocks(scan_output)
+        scanned = {port: script_results(scan_blocks.get(port, []), scan_scripts) for port in scan_ports}
+        if "host" in stale:
+            scanned["host"] = script_results(host_script_lines, scan_scripts)
+        rows = []
+        for port, outputs in scanned.items():
+            fingerprint = host_fingerprint if port == "host" else fingerprints[port]
+            for script in scan_scripts:
+                output = outputs.get(script, "")  # An empty result is cached too, the script ran and found nothing
+                rows.append((ip, port, script, fingerprint, output))
+                results[port][script] = (output, None)
+        cache.put_many(rows)
+
+    def cached_note(port_results):
+        cached_at = [scanned_at for _, scanned_at in port_results.values() if scanned_at]
+        return f"  (cached result from {time.strftime('%Y-%m-%d %H:%M', time.localtime(min(cached_at)))})" if cached_at else None
+
+    output_lines = [f"Service check: {version_command}", "", "PORT      STATE SERVICE VERSION"]
+    for port in sorted(fingerprints, key=lambda port: int(port.split("/")[0])):
+        output_lines.append(version_blocks[port][0])
+        output_lines.extend(output for output, _ in (results[port][script] for script in scripts) if output)
+        note = cached_note(results[port])
+        if note:
+            output_lines.append(note)
+    host_output = [output for output, _ in (results["host"].get(script, ("", None)) for script in scripts) if output]
+    if host_output:
+        output_lines.extend(["", "Host script results:"] + host_output)
+        note = cached_note(results["host"])
+        if note:
+            output_lines.append(note)
+    if not fingerprints:
+        output_lines.append("No open ports found by the service check, vulnerability scripts skipped.")
+    return full_command, "\n".join(output_lines)
+
+# Lines of scanner output per screenshot in --stream mode
+LINES_PER_PAGE = 60
+
+@timed("save_output_to_html", host_arg=0)
+def save_output_to_html(ip, command, output, folder, suffix=""):
+    filename = os.path.join(folder, f"{ip.replace('.', '_')}{suffix}.html")
     html_content = f"""
     <html>
     <head>
@@ -43,29 +173,105 @@ def save_output_to_html(ip, command, output, folder):
         file.write(html_content)
     return filename
 
+@timed("generate_screenshot")
 def generate_screenshot(html_file):
     image_file = html_file.replace(".html", ".png")
-    command = f"wkhtmltoimage {html_file} {image_file}"
-    subprocess.run(command, shell=True)
+    launcher.run(["wkhtmltoimage", html_file, image_file], capture_output=False)
     return image_file
 
-def process_ip(ip, command, folder, progress_data):
-    try:
-        full_command, output = run_nmap(ip, command)
-        html_file = save_output_to_html(ip, full_command, output, folder)
+# Function to render nmap output page by page while the scan is still running
+def process_ip_streaming(ip, command, folder, render_pool, timing=None, results_db=None):
+    if timing:
+        command = f"{command} {timing.options(ip)}"
+    full_command = f"{command} {ip}"
+    started = time.time()
+    status_lines = []
+    output_lines = []
+
+    def scan_lines():
+        for line in stream_lines(full_command):
+            if is_timing_line(line):
+                status_lines.append(line)
+            if results_db:
+                output_lines.append(line)
+            yield line
+
+    def render_page(page, number):
+        html_file = save_output_to_html(ip, full_command, "\n".join(page), folder, suffix=f"_part{number}")
         generate_screenshot(html_file)
         os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
-        progress_data[ip] = "Success"
-    except Exception as e:
-        progress_data[ip] = f"Error: {e}"
+        return html_file.replace(".html", ".png")
+
+    image_files = render_pages(stream_pages(scan_lines(), LINES_PER_PAGE), render_pool, render_page)
+    if timing:
+        timing.record(ip, "\n".join(status_lines), time.time() - started)
+    if results_db:
+        results_db.add_nmap(ip, "\n".join(output_lines))
+    return image_files
+
+def process_ip(ip, command, folder, progress_data, timing=None, render_pool=None, store=None, recorder=None, cache=None, results_db=None):
+    with host_workspace(store, folder) as folder:
+        try:
+            if render_pool:
+                process_ip_streaming(ip, command, folder, render_pool, timing, results_db)
+                progress_data[ip] = "Success"
+                return
+            started = time.time()
+            if cache:
+                full_command, output = run_cached_scan(ip, command, cache, timing)
+            else:
+                full_command, output = run_nmap(ip, command, timing)
+            if recorder:
+                recorder.record(ip, full_command, started, time.time(), stdout=output)
+            if results_db:
+                results_db.add_nmap(ip, output)
+            if store:
+                save_raw_output(folder, f"{ip.replace('.', '_')}.txt", f"{full_command}\n{output}")
+            html_file = save_output_to_html(ip, full_command, output, folder)
+            generate_screenshot(html_file)
+            os.remove(html_file)  # Optional: Delete the HTML file if you only need the screenshots
+            progress_data[ip] = "Success"
+        except Exception as e:
+            progress_data[ip] = f"Error: {e}"
+
+# Function to rebuild the screenshot of one recorded host (used by replay.py)
+def render_recording(record, folder, header):
+    html_file = save_output_to_html(record["ip"], record["command"], record["stdout"], folder)
+    generate_screenshot(html_file)
+    os.remove(html_file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(usage="python script.py <nmap_command> <ip_list_file>")
+    parser.add_argument("nmap_command", help="nmap command, e.g. \"nmap -Pn -sV --script vuln\"")
+    parser.add_argument("ip_list_file", help="File with one IP per line")
+    parser.add_argument("--adaptive-timing", action="store_true",
+                        help="Tune nmap rate, retries and RTT timeouts per /24 from observed RTT and response rate")
+    parser.add_argument("--stream", action="store_true",
+                        help="Render output pages while nmap is still running")
+    parser.add_argument("--store", help="Pack screenshots and raw output into this evidence store instead of loose files")
+    parser.add_argument("--cache-ttl", type=float,
+                        help="Reuse NSE results younger than this many hours for services whose version is unchanged")
+    parser.add_argument("--cache-db", default="nse_cache.db", help="NSE result cache database used with --cache-ttl")
+    parser.add_argument("--no-record", action="store_true", help="Do not record raw output to recordings/ for replay.py")
+    parser.add_argument("--db", help="Also write structured results to this SQLite results database")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    launcher.add_arguments(parser)
+    scheduler.add_arguments(parser)
+    args = parser.parse_args()
+    if args.stream and args.cache_ttl is not None:
+        parser.error("--cache-ttl cannot be combined with --stream, which renders nmap output as it arrives")
+    return args
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python script.py <nmap_command> <ip_list_file>")
-        sys.exit(1)
+    args = parse_args()
+    launcher.configure(args)
+    store = EvidenceStore(args.store) if args.store else None
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("vuln_nse")
 
-    nmap_command = sys.argv[1]
-    ip_list_file = sys.argv[2]
+    nmap_command = args.nmap_command
+    ip_list_file = args.ip_list_file
 
     with open(ip_list_file, "r") as file:
         ips = [line.strip() for line in file]
@@ -76,14 +282,20 @@ def main():
 
     total_ips = len(ips)
     progress_data = {}
+    recorder = None if args.no_record else RunRecorder("vuln_nse", folder)
+    cache = NseCache(args.cache_db, args.cache_ttl * 3600) if args.cache_ttl is not None else None
+    timing = TimingController(log=tqdm.write) if args.adaptive_timing else None
 
     start_time = time.time()
 
+    # Longest expected targets first, so a slow host does not start last and hold up the run
+    ips, schedule = scheduler.plan(ips, "vuln_nse", args, workers=5)
+
     # Overall progress bar
     with tqdm(total=total_ips, desc="Overall Progress", unit="IP") as overall_pbar:
         # Use ThreadPoolExecutor to manage concurrent tasks
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {executor.submit(process_ip, ip, nmap_command, folder, progress_data): ip for ip in ips}
+        with ThreadPoolExecutor(max_workers=5) as executor, ThreadPoolExecutor(max_workers=5) as render_pool:
+            futures = {executor.submit(process_ip, ip, nmap_command, folder, progress_data, timing, render_pool if args.stream else None, store=store, recorder=recorder, cache=cache, results_db=results_db): ip for ip in ips}
 
             # Update progress bar as tasks complete
             for future in as_completed(futures):
@@ -108,6 +320,34 @@ def main():
     print(f"Screenshots taken: {screenshot_count}")
     print(f"Time taken for overall process: {elapsed_time:.2f} seconds")
 
+    if cache:
+        cache.close()
+        print(f"NSE cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate():.0%} hit rate)")
+
+    scheduler.report(schedule, end_time)
+
+    if results_db:
+        results_db.close()
+
+    launcher.report()
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "vuln_nse")
+
+    if recorder:
+        recorder.close()
+        print(f"Raw output recorded to {recorder.path}")
+
+    if store:
+        stats = store.stats()
+        store.close()
+        print(f"Evidence store: {stats['files']} files in {stats['packs']} pack(s) at {args.store}")
+
+    if timing:
+        print("Adaptive timing per subnet:")
+        for line in timing.report():
+            print(f"  {line}")
+
     if failed_ips:
         missing_count = len(failed_ips)
         print(f"Missing screenshots: {missing_count}")
@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+
+# Stand-in scanner behaviour is tuned with environment variables, per tool first (BENCH_NMAP_LATENCY) then global (BENCH_LATENCY)
+def setting(tool, name, default):
+    value = os.environ.get(f"BENCH_{tool.upper()}_{name}", os.environ.get(f"BENCH_{name}"))
+    return type(default)(value) if value is not None else default
+
+# Function to sleep for the configured latency with some jitter, like a real scan of a remote host
+def simulate_latency(tool, rng):
+    latency = setting(tool, "LATENCY", 0.05)
+    jitter = setting(tool, "JITTER", 0.2)
+    time.sleep(max(0.0, latency * (1 + rng.uniform(-jitter, jitter))))
+
+# Same target gives the same output on every run so baselines stay comparable
+def target_rng(args):
+    targets = [arg for arg in args if re.match(r"^(https?://)?\d+\.\d+\.\d+\.\d+", arg)]
+    return random.Random(zlib.crc32((targets[-1] if targets else " ".join(args)).encode()))
+
+# Function to print nmap-style output with open ports, NSE script blocks and host scripts
+def fake_nmap(args):
+    rng = target_rng(args)
+    simulate_latency("nmap", rng)
+    port_count = setting("nmap", "PORTS", 10)
+    script_lines = setting("nmap", "OUTPUT_LINES", 6)
+    target = next((arg for arg in reversed(args) if re.match(r"^\d+\.\d+\.\d+\.\d+$", arg)), "127.0.0.1")
+
+    print(f"Starting Nmap 7.94 ( https://nmap.org ) at {time.strftime('%Y-%m-%d %H:%M %Z')}")
+    print(f"Nmap scan report for {target}")
+    print(f"Host is up ({rng.uniform(0.0005, 0.05):.4f}s latency).")
+    print(f"Not shown: {1000 - port_count} filtered tcp ports (no-response)")
+    print("PORT      STATE SERVICE       VERSION")
+    services = ["ssh", "http", "https", "smtp", "domain", "microsoft-ds", "mysql", "rdp", "snmp", "ldap"]
+    for port in sorted(rng.sample(range(1, 65535), port_count)):
+        service = rng.choice(services)
+        print(f"{f'{port}/tcp':<9} {rng.choice(['open', 'open', 'open', 'closed']):<5} {service:<13} {service}d {rng.randint(1, 9)}.{rng.randint(0, 20)}")
+        if "--version-light" in args or not script_lines:
+            continue
+        print(f"| {service}-vuln-check:")
+        for line in range(script_lines - 1):
+            print(f"|   finding {line}: {'VULNERABLE' if rng.random() < 0.1 else 'not vulnerable'} ({rng.getrandbits(64):016x})")
+        print("|_")
+    print("")
+    print("Host script results:")
+    print(f"|_smb-vuln-ms17-010: {'VULNERABLE' if rng.random() < 0.05 else 'not vulnerable'}")
+    print("")
+    print(f"Nmap done: 1 IP address (1 host up) scanned in {rng.uniform(1, 60):.2f} seconds")
+
+# Function to print sslscan-style output, with the ANSI colours the real tool uses
+def fake_sslscan(args):
+    rng = target_rng(args)
+    simulate_latency("sslscan", rng)
+    cipher_lines = setting("sslscan", "OUTPUT_LINES", 30)
+    target = args[-1] if args else "127.0.0.1"
+
+    print("\x1b[32mVersion: 2.0.15-static\x1b[0m")
+    print(f"\x1b[32mConnected to {target}\x1b[0m\n")
+    print(f"Testing SSL server {target} on port 443 using SNI name {target}\n")
+    print("  \x1b[1;34mSSL/TLS Protocols:\x1b[0m")
+    for protocol in ("SSLv2", "SSLv3", "TLSv1.0", "TLSv1.1", "TLSv1.2", "TLSv1.3"):
+        state = "enabled" if protocol >= "TLSv1.1" or rng.random() < 0.2 else "disabled"
+        colour = "\x1b[31m" if state == "enabled" and protocol < "TLSv1.2" else "\x1b[32m"
+        print(f"{protocol:<9} {colour}{state}\x1b[0m")
+    print("\n  \x1b[1;34mSupported Server Cipher(s):\x1b[0m")
+    ciphers = ["ECDHE-RSA-AES256-GCM-SHA384", "ECDHE-RSA-AES128-GCM-SHA256", "AES256-SHA", "DES-CBC3-SHA", "RC4-SHA"]
+    for _ in range(cipher_lines):
+        print(f"Accepted  TLSv1.2  {rng.choice([128, 256])} bits  {rng.choice(ciphers):<30} Curve 25519 DHE 253")
+    print("\n  \x1b[1;34mSSL Certificate:\x1b[0m")
+    print(f"Subject:  {target}")
+    print(f"Not valid after:  {rng.randint(2024, 2030)}-01-01 00:00:00 GMT")
+
+# Function to write a dirsearch JSON report to the -o path
+def fake_dirsearch(args):
+    rng = target_rng(args)
+    simulate_latency("dirsearch", rng)
+    result_count = setting("dirsearch", "OUTPUT_LINES", 40)
+    url = args[args.index("-u") + 1] if "-u" in args else "https://127.0.0.1/"
+    output_file = args[args.index("-o") + 1] if "-o" in args else "report.json"
+
+    sizes = [rng.randint(100, 50000) for _ in range(3)]
+    results = [
+        {"url": f"{url.rstrip('/')}/{rng.choice(['admin', 'api', 'backup', 'static', 'login', 'cgi-bin'])}/{index}",
+         "status": rng.choice([200, 200, 200, 301, 302]),
+         "content-length": rng.choice(sizes),
+         "content-type": "text/html",
+         "redirect": ""}
+        for index in range(result_count)
+    ]
+    report = {"info": {"args": "dirsearch " + " ".join(args), "time": time.strftime("%a %b %d %H:%M:%S %Y")}, "results": results}
+    with open(output_file, "w") as file:
+        json.dump(report, file)
+    print(f"Task Completed - {result_count} results")
+
+# Function to write a valid PNG of the configured size, noisy enough that it does not compress to nothing
+def write_png(path, width, height, rng):
+    palette = [bytes((rng.randrange(256), rng.randrange(256), rng.randrange(256))) for _ in range(16)]
+    blank = b"\x00" + b"\xff\xff\xff" * width
+    text_rows = [b"\x00" + b"".join(rng.choice(palette) for _ in range(width)) for _ in range(16)]
+    rows = [blank if rng.random() < 0.7 else rng.choice(text_rows) for _ in range(height)]
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(b"".join(rows), 6)))
+        file.write(chunk(b"IEND", b""))
+
+# Function to "render" HTML: read the input (file or stdin) and write a PNG to the last argument
+def fake_wkhtmltoimage(args):
+    if "--version" in args or "-V" in args:
+        print("wkhtmltoimage 0.12.6 (with patched qt)")
+        return
+    paths = [arg for arg in args if not arg.startswith("-") or arg == "-"]
+    if len(paths) < 2:
+        print("Usage: wkhtmltoimage [OPTIONS]... <input file> <output file>", file=sys.stderr)
+        sys.exit(1)
+    source, output_file = paths[-2], paths[-1]
+    html = sys.stdin.buffer.read() if source == "-" else open(source, "rb").read()
+    rng = random.Random(zlib.crc32(html))
+    simulate_latency("wkhtmltoimage", rng)
+    width, height = (int(value) for value in setting("wkhtmltoimage", "IMAGE_SIZE", "1024x768").split("x"))
+    write_png(output_file, width, height, rng)
+
+TOOLS = {
+    "nmap": fake_nmap,
+    "sslscan": fake_sslscan,
+    "dirsearch": fake_dirsearch,
+    "wkhtmltoimage": fake_wkhtmltoimage,
+}
+
+def main(tool):
+    TOOLS[tool](sys.argv[1:])
@@ -0,0 +1,122 @@
+import os
+import csv
+import random
+import argparse
+
+NESSUS_COLUMNS = ['Plugin ID', 'CVE', 'CVSS v2.0 Base Score', 'Risk', 'Host', 'Protocol', 'Port', 'Name',
+                  'Synopsis', 'Description', 'Solution', 'See Also', 'Plugin Output']
+COMPLIANCE_COLUMNS = ['Plugin ID', 'Risk', 'Host', 'Protocol', 'Port', 'Name', 'Description']
+
+# Share of rows per risk level, roughly what a typical internal scan looks like
+RISK_WEIGHTS = {'None': 70, 'Low': 8, 'Medium': 14, 'High': 6, 'Critical': 2}
+CVSS_RANGES = {'None': (0.0, 0.0), 'Low': (0.1, 3.9), 'Medium': (4.0, 6.9), 'High': (7.0, 8.9), 'Critical': (9.0, 10.0)}
+COMMON_PORTS = [(0, 'tcp'), (22, 'tcp'), (80, 'tcp'), (443, 'tcp'), (445, 'tcp'), (3389, 'tcp'), (161, 'udp'), (53, 'udp')]
+
+# Function to build host addresses 10.x.y.z from a running index, skipping .0 and .255
+def host_address(index):
+    index, last = divmod(index, 254)
+    second, third = divmod(index, 256)
+    return f"10.{second & 255}.{third}.{last + 1}"
+
+# Function to build a plugin catalog; a few plugins fire on most hosts and most plugins are rare, as in real exports
+def build_plugin_catalog(rng, plugin_count):
+    risks = list(RISK_WEIGHTS)
+    catalog = []
+    for index in range(plugin_count):
+        risk = rng.choices(risks, weights=list(RISK_WEIGHTS.values()))[0]
+        low, high = CVSS_RANGES[risk]
+        catalog.append({
+            'Plugin ID': 10000 + index,
+            'CVE': f"CVE-{rng.randint(2005, 2024)}-{rng.randint(1000, 49999)}" if risk != 'None' else '',
+            'CVSS v2.0 Base Score': f"{rng.uniform(low, high):.1f}" if risk != 'None' else '',
+            'Risk': risk,
+            'Name': f"Synthetic {risk} finding {index} in {rng.choice(['OpenSSL', 'Apache', 'IIS', 'SMB', 'SSH', 'Kernel', 'Java'])}",
+            'Synopsis': f"The remote host is affected by synthetic issue {index}.",
+            'Description': f"Synthetic description for plugin {index}. " * rng.randint(1, 6),
+            'Solution': "Upgrade to the latest version.",
+            'See Also': f"https://example.com/advisory/{index}",
+        })
+    weights = [1.0 / (rank + 1) for rank in range(plugin_count)]
+    return catalog, weights
+
+# Function to write a Nessus CSV export with `rows` findings spread over `hosts` hosts
+def write_nessus_csv(path, hosts, rows, plugin_count, output_lines, rng):
+    catalog, weights = build_plugin_catalog(rng, plugin_count)
+    rows_per_host, extra = divmod(rows, hosts)
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=NESSUS_COLUMNS)
+        writer.writeheader()
+        for host_index in range(hosts):
+            host = host_address(host_index)
+            for plugin in rng.choices(catalog, weights=weights, k=rows_per_host + (host_index < extra)):
+                port, protocol = rng.choice(COMMON_PORTS)
+                output = "\n".join(f"  {plugin['Name']} detail line {line}: value={rng.getrandbits(32):08x}" for line in range(rng.randint(0, output_lines)))
+                writer.writerow({**plugin, 'Host': host, 'Port': port, 'Protocol': protocol, 'Plugin Output': output})
+
+# Function to write a compliance export: one row per (host, checklist item) with the CIS-style description config_va.py parses
+def write_compliance_csv(path, hosts, checks, rng):
+    items = [(f"{rng.randint(1, 18)}.{rng.randint(1, 12)}.{index}", f"Ensure 'Synthetic setting {index}' is configured")
+             for index in range(checks)]
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=COMPLIANCE_COLUMNS)
+        writer.writeheader()
+        for host_index in range(hosts):
+            host = host_address(host_index)
+            for number, title in items:
+                result = 'PASSED' if rng.random() < 0.7 else 'FAILED'
+                policy_value = rng.choice(['Enabled', 'Disabled', '1', '0', '14', 'Administrators'])
+                actual_value = policy_value if result == 'PASSED' else rng.choice(['Not set', 'Disabled', '0', 'Everyone'])
+                description = (
+                    f'"{number} {title} : [{result}]\n\n'
+                    f"This policy setting controls synthetic behaviour {number}.\n\n"
+                    f"Solution:\nSet the policy to {policy_value}.\n\n"
+                    f"Impact:\nNone expected.\n\n"
+                    f"See Also:\nhttps://example.com/cis/{number}\n\n"
+                    f"Reference:\n800-53|CM-6\n\n"
+                    f"Policy Value:\n{policy_value}\n\n"
+                    f'Actual Value:\n{actual_value}"'
+                )
+                writer.writerow({'Plugin ID': 21157, 'Risk': result, 'Host': host, 'Protocol': 'tcp', 'Port': 0,
+                                 'Name': 'Windows Compliance Checks', 'Description': description})
+
+# Function to write ip.txt with one host per line
+def write_ip_list(path, hosts):
+    with open(path, 'w') as file:
+        file.writelines(f"{host_address(index)}\n" for index in range(hosts))
+
+# Function to generate the whole synthetic data set into a folder
+def generate(output_dir, hosts, rows, plugins=2000, checks=200, compliance_hosts=None, output_lines=8, scan_hosts=None, seed=1):
+    rng = random.Random(seed)
+    nessus_dir = os.path.join(output_dir, 'nessus')
+    os.makedirs(nessus_dir, exist_ok=True)
+    paths = {
+        'nessus_dir': nessus_dir,
+        'nessus_csv': os.path.join(nessus_dir, 'synthetic_scan.csv'),
+        'compliance_csv': os.path.join(output_dir, 'synthetic_compliance.csv'),
+        'ip_list': os.path.join(output_dir, 'ip.txt'),
+    }
+    write_nessus_csv(paths['nessus_csv'], hosts, rows, plugins, output_lines, rng)
+    write_compliance_csv(paths['compliance_csv'], compliance_hosts or hosts, checks, rng)
+    write_ip_list(paths['ip_list'], scan_hosts or hosts)
+    return paths
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic Nessus, compliance and ip.txt inputs for benchmarking")
+    parser.add_argument("output_dir", help="Folder to write the data set to")
+    parser.add_argument("--hosts", type=int, default=10000, help="Hosts in the Nessus export")
+    parser.add_argument("--rows", type=int, default=2000000, help="Findings (rows) in the Nessus export")
+    parser.add_argument("--plugins", type=int, default=2000, help="Distinct plugins to draw findings from")
+    parser.add_argument("--checks", type=int, default=200, help="Compliance checklist items per host")
+    parser.add_argument("--compliance-hosts", type=int, help="Hosts in the compliance export (default: --hosts)")
+    parser.add_argument("--output-lines", type=int, default=8, help="Maximum Plugin Output lines per finding")
+    parser.add_argument("--scan-hosts", type=int, help="Hosts written to ip.txt for the scanner scripts (default: --hosts)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed, so the same arguments give the same files")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    paths = generate(args.output_dir, args.hosts, args.rows, args.plugins, args.checks, args.compliance_hosts,
+                     args.output_lines, args.scan_hosts, args.seed)
+    for name, path in paths.items():
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        print(f"{name:<15} {path} ({size / 1024 / 1024:.1f} MB)" if size else f"{name:<15} {path}")
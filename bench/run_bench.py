@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+from generate import generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FAKEBIN_DIR = os.path.join(BENCH_DIR, "fakebin")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Benchmark cases: script, arguments (formatted with the data set paths), metrics tool name, stdin, which hosts count applies
+CASES = {
+    "nessus": ("1.nessus.py", ["{nessus_dir}"], "nessus", None, "hosts"),
+    "plugin": ("plugin.py", ["{nessus_csv}", "--severity", "critical", "--output-dir", "screenshots"], "plugin", None, "hosts"),
+    "compliance": ("config_va.py", [], None, "{compliance_csv}\n", "compliance_hosts"),
+    "nmap_firewall": ("2.nmap_firewall.py", [], "nmap_firewall", None, "scan_hosts"),
+    "nmap_nse": ("3.nmap_nse.py", ["nmap -Pn -sV", "ip.txt"], "nmap_nse", None, "scan_hosts"),
+    "sslscan": ("4.sslscan.py", ["--no-preflight"], "sslscan", None, "scan_hosts"),
+    "dirsearch": ("5.dirsearch.py", ["--no-preflight"], "dirsearch", None, "scan_hosts"),
+    "vuln_nse": ("6.vuln_nse.py", ["nmap -Pn -sV --script vuln", "ip.txt"], "vuln_nse", None, "scan_hosts"),
+}
+
+# Function to build the environment: fake scanners first on PATH, the repo importable, and the stand-in tuning
+def bench_environment(args):
+    env = dict(os.environ)
+    env["PATH"] = FAKEBIN_DIR + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    env["BENCH_LATENCY"] = str(args.latency)
+    env["BENCH_OUTPUT_LINES"] = str(args.scanner_lines)
+    env["BENCH_WKHTMLTOIMAGE_LATENCY"] = str(args.render_latency)
+    env["BENCH_WKHTMLTOIMAGE_IMAGE_SIZE"] = args.image_size
+    return env
+
+# Function to read the per-stage summary a script wrote with --metrics-dir
+def load_stages(metrics_dir, tool, wall_seconds):
+    path = os.path.join(metrics_dir, f"{tool}-metrics.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        stages = json.load(file)["stages"]
+    return {
+        stage: {"count": stats["count"], "seconds": stats["sum"], "p90": stats["p90"],
+                "per_second": stats["count"] / wall_seconds if wall_seconds else 0.0}
+        for stage, stats in stages.items()
+    }
+
+# Function to run one case in its own folder and measure wall time, CPU time and peak RSS with wait4()
+def run_case(name, paths, counts, workdir, env):
+    script, arguments, tool, stdin_template, count_key = CASES[name]
+    case_dir = os.path.join(workdir, name)
+    shutil.rmtree(case_dir, ignore_errors=True)
+    os.makedirs(case_dir)
+    shutil.copy(paths["ip_list"], os.path.join(case_dir, "ip.txt"))
+
+    command = [sys.executable, os.path.join(REPO_DIR, script)] + [argument.format(**paths) for argument in arguments]
+    if tool:
+        command += ["--metrics-dir", "metrics"]
+    log_path = os.path.join(workdir, f"{name}.log")
+
+    with open(log_path, "w") as log:
+        start_time = time.time()
+        process = subprocess.Popen(command, cwd=case_dir, env=env, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True)
+        if stdin_template:
+            process.stdin.write(stdin_template.format(**paths))
+        process.stdin.close()
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.time() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    hosts = counts[count_key]
+    return {
+        "exit_code": process.returncode,
+        "wall_seconds": wall_seconds,
+        "user_seconds": usage.ru_utime,
+        "system_seconds": usage.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,  # ru_maxrss is in KiB on Linux
+        "hosts": hosts,
+        "hosts_per_second": hosts / wall_seconds if wall_seconds else 0.0,
+        "stages": load_stages(os.path.join(case_dir, "metrics"), tool, wall_seconds) if tool else {},
+        "log": log_path,
+    }
+
+# Function to list (label, current, baseline, change, regressed) for every metric both runs have
+def compare(results, baseline, tolerance):
+    rows = []
+    for name, case in results["cases"].items():
+        previous = baseline["cases"].get(name)
+        if not previous or case["exit_code"] or previous["exit_code"]:
+            continue
+        metrics = [(f"{name} wall_seconds", case["wall_seconds"], previous["wall_seconds"], False),
+                   (f"{name} peak_rss_mb", case["peak_rss_mb"], previous["peak_rss_mb"], False)]
+        for stage, stats in case["stages"].items():
+            if stage in previous["stages"]:
+                metrics.append((f"{name} {stage}/s", stats["per_second"], previous["stages"][stage]["per_second"], True))
+        for label, current, before, higher_is_better in metrics:
+            change = (current - before) / before if before else 0.0
+            worse = -change if higher_is_better else change
+            rows.append((label, current, before, change, worse > tolerance))
+    return rows
+
+def print_results(results):
+    print(f"\n{'case':<15} {'exit':>4} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'hosts/s':>9}")
+    for name, case in results["cases"].items():
+        print(f"{name:<15} {case['exit_code']:>4} {case['wall_seconds']:>9.2f} {case['user_seconds'] + case['system_seconds']:>9.2f} "
+              f"{case['peak_rss_mb']:>9.1f} {case['hosts_per_second']:>9.1f}")
+        for stage, stats in sorted(case["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            print(f"  {stage:<24} n={stats['count']:<7} {stats['per_second']:>9.1f}/s  p90={stats['p90']:.3f}s")
+
+def print_comparison(rows, tolerance):
+    print(f"\nComparison with baseline (regression threshold {tolerance:.0%}):")
+    for label, current, before, change, regressed in rows:
+        print(f"  {label:<40} {before:>10.2f} -> {current:>10.2f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the scripts against synthetic exports and stand-in scanner binaries")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma separated cases to run")
+    parser.add_argument("--workdir", help="Folder for the data set and outputs (default: a temporary folder)")
+    parser.add_argument("--data", help="Reuse a data set made by generate.py instead of generating one")
+    parser.add_argument("--hosts", type=int, default=500, help="Hosts in the Nessus export (10000 for a full-scale run)")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows in the Nessus export (2000000 for a full-scale run)")
+    parser.add_argument("--checks", type=int, default=50, help="Compliance checklist items per host")
+    parser.add_argument("--compliance-hosts", type=int, default=100, help="Hosts in the compliance export")
+    parser.add_argument("--scan-hosts", type=int, default=50, help="Hosts in ip.txt for the scanner scripts")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each stand-in scanner takes per host")
+    parser.add_argument("--render-latency", type=float, default=0.02, help="Seconds each stand-in wkhtmltoimage render takes")
+    parser.add_argument("--scanner-lines", type=int, default=6, help="Output size knob for the stand-in scanners")
+    parser.add_argument("--image-size", default="1024x768", help="Size of the PNGs the stand-in wkhtmltoimage writes")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown reported as a regression")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="netscripts-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    counts = {"hosts": args.hosts, "compliance_hosts": args.compliance_hosts, "scan_hosts": args.scan_hosts}
+
+    if args.data:
+        data_dir = os.path.abspath(args.data)
+        paths = {
+            "nessus_dir": os.path.join(data_dir, "nessus"),
+            "nessus_csv": os.path.join(data_dir, "nessus", "synthetic_scan.csv"),
+            "compliance_csv": os.path.join(data_dir, "synthetic_compliance.csv"),
+            "ip_list": os.path.join(data_dir, "ip.txt"),
+        }
+    else:
+        start_time = time.time()
+        paths = generate(os.path.join(workdir, "data"), args.hosts, args.rows, checks=args.checks,
+                         compliance_hosts=args.compliance_hosts, scan_hosts=args.scan_hosts)
+        print(f"Generated data set in {time.time() - start_time:.2f} seconds")
+    paths = {name: os.path.abspath(path) for name, path in paths.items()}
+
+    env = bench_environment(args)
+    config = {key: value for key, value in vars(args).items() if key not in ("workdir", "data", "baseline", "save_baseline", "cases")}
+    results = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "config": config, "cases": {}}
+    for name in args.cases.split(","):
+        print(f"Running {name}...")
+        results["cases"][name] = run_case(name, paths, counts, workdir, env)
+        if results["cases"][name]["exit_code"]:
+            print(f"  {name} exited with {results['cases'][name]['exit_code']}, see {results['cases'][name]['log']}")
+
+    results_path = os.path.join(workdir, "results.json")
+    with open(results_path, "w") as file:
+        json.dump(results, file, indent=2)
+    print_results(results)
+    print(f"\nResults saved to {results_path}")
+
+    if args.save_baseline:
+        shutil.copy(results_path, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline["config"] != config:
+        print("Warning: baseline was recorded with different settings, comparison may be misleading")
+    rows = compare(results, baseline, args.tolerance)
+    print_comparison(rows, args.tolerance)
+    regressions = sum(1 for row in rows if row[4])
+    print(f"\n{regressions} regression(s)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+ENTRY_POINT = os.path.join(REPO_DIR, "netscripts.py")
+
+# Modules that must only load once a subcommand needs them
+HEAVY_MODULES = ("pandas", "numpy", "PIL", "imgkit", "xlsxwriter", "psutil", "tqdm", "zstandard")
+
+# Function to time a command several times and return the median wall time in milliseconds
+def median_ms(command, runs):
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(timings)
+
+# Function to run a command under -X importtime and return {top-level module: cumulative microseconds}
+def import_times(arguments):
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments, capture_output=True, text=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cumulative.isdigit():
+            top_level = name.split(".")[0]
+            modules[top_level] = max(modules.get(top_level, 0), int(cumulative))
+    return modules
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Guard the start-up time of netscripts.py")
+    parser.add_argument("--runs", type=int, default=7, help="Timed runs per command")
+    parser.add_argument("--budget-ms", type=float, default=60.0, help="Allowed start-up time on top of a bare interpreter")
+    parser.add_argument("--commands", default="", help="Comma separated subcommands whose --help import time to report")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    bare = median_ms([sys.executable, "-c", "pass"], args.runs)
+    entry = median_ms([sys.executable, ENTRY_POINT, "--help"], args.runs)
+    overhead = entry - bare
+    modules = import_times([ENTRY_POINT, "--help"])
+    heavy = sorted(module for module in HEAVY_MODULES if module in modules)
+
+    print("Startup Report:")
+    print(f"Bare interpreter: {bare:.1f} ms")
+    print(f"netscripts.py --help: {entry:.1f} ms ({overhead:+.1f} ms, budget {args.budget_ms:.0f} ms)")
+    for name in filter(None, args.commands.split(",")):
+        command_modules = import_times([ENTRY_POINT, name, "--help"])
+        slowest = sorted(command_modules.items(), key=lambda item: -item[1])[:5]
+        print(f"  {name:<12} " + ", ".join(f"{module} {micros / 1000:.0f} ms" for module, micros in slowest))
+
+    failures = []
+    if heavy:
+        failures.append(f"heavy modules imported by the entry point: {', '.join(heavy)}")
+    if overhead > args.budget_ms:
+        failures.append(f"start-up overhead {overhead:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,20 @@
 import pandas as pd
+import numpy as np
+import os
 import re
+import time
+import argparse
 from xlsxwriter.utility import xl_col_to_name
+from results_db import ResultsDB
 
-# === User Input ===
-input_csv = input("Enter full path to the Nessus compliance CSV file: ").strip()
-
-# === Load CSV ===
-df = pd.read_csv(input_csv)
-
-# === Filter checklist entries only ===
-checklist_rows = df[df['Description'].str.contains(r'^\s*"\d+\.\d+', na=False)]
+# === Delta Mode ===
+# Rows read per chunk when streaming an export, and the cheap patterns used to fingerprint a check without the full parse
+DELTA_CHUNK_ROWS = 50000
+CHECKLIST_TITLE = r'^\s*"?\s*(\d+(?:\.\d+)+[^\n]*?)\s*(?::\s*\[[A-Z]+\][^\n]*)?$'
+CHECK_STATUS = r':\s*\[(PASSED|FAILED|WARNING|ERROR)\]'
+ACTUAL_VALUE = r'Actual Value:\s*([^\n]*)'
+# Key scheme of the saved index; an index built with another scheme is rebuilt as a new baseline
+DELTA_INDEX_KEY = "host+plugin+title"
 
 # === Parsing Logic ===
 def extract_fields(row):
@@ -65,23 +70,172 @@ def extract_fields(row):
     fields["Impact"] = remaining.strip() if remaining else None
     return fields
 
-# === Apply Parsing ===
-parsed_records = checklist_rows.apply(extract_fields, axis=1).tolist()
-final_df = pd.DataFrame(parsed_records)
-
-# === Export to Excel ===
-output_excel = "compliance_by_ip.xlsx"
-with pd.ExcelWriter(output_excel, engine='xlsxwriter') as writer:
-    workbook = writer.book
-    for ip in final_df['IP'].unique():
-        ip_df = final_df[final_df['IP'] == ip].drop(columns=["IP"])
-        sheet_name = ip.replace('.', '_')
-        ip_df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-        worksheet = writer.sheets[sheet_name]
-        wrap_format = workbook.add_format({'text_wrap': True, 'valign': 'top'})
-        for col_idx in range(len(ip_df.columns)):
-            col_letter = xl_col_to_name(col_idx)
-            worksheet.set_column(f'{col_letter}:{col_letter}', 45, wrap_format)
-
-print(f"\n✅ Done! Excel saved as: {output_excel}")
+# === Excel Formatting ===
+def format_sheet(workbook, worksheet, column_count):
+    wrap_format = workbook.add_format({'text_wrap': True, 'valign': 'top'})
+    for col_idx in range(column_count):
+        col_letter = xl_col_to_name(col_idx)
+        worksheet.set_column(f'{col_letter}:{col_letter}', 45, wrap_format)
+
+# === Delta Index ===
+# (host, plugin ID, full checklist title) and (result, actual value) are reduced to 64-bit hashes, so the index
+# holds two integers per check plus the host, checklist and result needed to report removed checks.
+# The full title and plugin keep two policies that both number a check "1.1.1" apart.
+def fingerprint_checks(chunk):
+    checklist_ids = chunk['Description'].str.extract(CHECKLIST_TITLE, expand=False, flags=re.MULTILINE).str.strip()
+    status = chunk['Description'].str.extract(CHECK_STATUS, expand=False)
+    results = status.fillna(chunk['Risk'].astype(str) if 'Risk' in chunk.columns else '')
+    actual_values = chunk['Description'].str.extract(ACTUAL_VALUE, expand=False).fillna('').str.strip(' "')
+    hosts = chunk['Host'].astype(str)
+    plugin_ids = chunk['Plugin ID'].astype(str) if 'Plugin ID' in chunk.columns else pd.Series('', index=chunk.index)
+
+    keys = pd.util.hash_pandas_object(pd.DataFrame({'host': hosts, 'plugin': plugin_ids, 'check': checklist_ids}), index=False).values
+    values = pd.util.hash_pandas_object(pd.DataFrame({'result': results, 'actual': actual_values}), index=False).values
+    return (keys, values, hosts.to_numpy(dtype=object), checklist_ids.to_numpy(dtype=object), results.to_numpy(dtype=object),
+            actual_values.to_numpy(dtype=object))
+
+def load_delta_index(index_path):
+    if not os.path.exists(index_path):
+        return None
+    index = pd.read_pickle(index_path)
+    if index.attrs.get('key') != DELTA_INDEX_KEY:
+        print(f"Index at {index_path} uses an older key scheme; rebuilding it as a new baseline")
+        return None
+    return index
+
+def save_delta_index(index_path, keys, values, hosts, checklist_ids, results):
+    index = pd.DataFrame({
+        'value': values,
+        'host': pd.Categorical(hosts),
+        'checklist': pd.Categorical(checklist_ids),
+        'result': pd.Categorical(results),
+    }, index=keys)
+    index = index[~index.index.duplicated(keep='last')]
+    index.attrs['key'] = DELTA_INDEX_KEY
+    temp_path = f"{index_path}.tmp"
+    index.to_pickle(temp_path)
+    os.replace(temp_path, index_path)
+    return len(index)
+
+# Function to parse only the rows that changed, adding the previous result for context
+def parse_delta_rows(rows, previous_results):
+    if rows.empty:
+        return []
+    records = rows.apply(extract_fields, axis=1).tolist()
+    for record, previous_result in zip(records, previous_results):
+        record["Previous Result"] = previous_result
+    return records
+
+# Function to stream a new export against the previous index and write only changed, new, resolved and removed checks
+def delta(input_csv, index_path, output_excel="compliance_delta.xlsx", results_db=None):
+    start_time = time.time()
+    previous = load_delta_index(index_path)
+    if previous is not None:
+        previous_keys = previous.index.values
+        previous_values = previous['value'].values
+        previous_results = previous['result'].astype(str).values
+
+    sheets = {"Changed": [], "New": [], "Resolved": []}
+    seen = {"keys": [], "values": [], "hosts": [], "checklist_ids": [], "results": []}
+    scanned = 0
+
+    for chunk in pd.read_csv(input_csv, chunksize=DELTA_CHUNK_ROWS, usecols=lambda column: column in ('Host', 'Plugin ID', 'Risk', 'Description')):
+        chunk = chunk[chunk['Description'].str.contains(r'^\s*"\d+\.\d+', na=False)]
+        if chunk.empty:
+            continue
+        keys, values, hosts, checklist_ids, results, actual_values = fingerprint_checks(chunk)
+        if results_db:
+            results_db.add_compliance(zip(hosts, checklist_ids, results, actual_values))
+        for name, column in zip(seen, (keys, values, hosts, checklist_ids, results)):
+            seen[name].append(column)
+        scanned += len(chunk)
+        if previous is None:
+            continue
+
+        positions = previous.index.get_indexer(keys)
+        known = positions >= 0
+        if len(previous):
+            lookup = np.where(known, positions, 0)
+            changed = known & (previous_values[lookup] != values)
+            was_failed = previous_results[lookup] == 'FAILED'
+        else:
+            # The baseline export had no checks, everything in this one is new
+            changed = was_failed = np.zeros(len(keys), dtype=bool)
+        resolved = changed & was_failed & (results == 'PASSED')
+
+        sheets["New"] += parse_delta_rows(chunk[~known], [None] * int((~known).sum()))
+        sheets["Resolved"] += parse_delta_rows(chunk[resolved], previous_results[positions[resolved]])
+        sheets["Changed"] += parse_delta_rows(chunk[changed & ~resolved], previous_results[positions[changed & ~resolved]])
+
+    columns = {name: np.concatenate(values) if values else np.array([]) for name, values in seen.items()}
+    index_size = save_delta_index(index_path, columns["keys"], columns["values"], columns["hosts"],
+                                  columns["checklist_ids"], columns["results"])
+    if previous is None:
+        print(f"\nNo previous index at {index_path}; saved a baseline of {index_size} checks for the next run")
+        return
+
+    # Checks that were in the previous export but not in this one (host retired or check dropped)
+    removed = previous[~np.isin(previous_keys, columns["keys"])]
+    removed_df = pd.DataFrame({"IP": removed['host'].astype(str), "Checklist": removed['checklist'].astype(str),
+                               "Previous Result": removed['result'].astype(str)})
+
+    with pd.ExcelWriter(output_excel, engine='xlsxwriter') as writer:
+        for sheet_name, records in sheets.items():
+            sheet_df = pd.DataFrame(records, columns=["IP", "Checklist", "Result", "Previous Result", "Actual Value",
+                                                      "Policy Value", "Description", "Solution", "Impact"])
+            sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+            format_sheet(writer.book, writer.sheets[sheet_name], len(sheet_df.columns))
+        removed_df.to_excel(writer, sheet_name="Removed", index=False)
+        format_sheet(writer.book, writer.sheets["Removed"], len(removed_df.columns))
+
+    print("\nDelta Summary:")
+    print(f"Checks in export: {scanned}")
+    print(", ".join(f"{name}: {len(records)}" for name, records in sheets.items()) + f", Removed: {len(removed_df)}")
+    print(f"Time taken: {time.time() - start_time:.2f} seconds")
+    print(f"\n✅ Done! Delta saved as: {output_excel}")
+
+def main(input_csv, output_excel="compliance_by_ip.xlsx", results_db=None):
+    # === Load CSV ===
+    df = pd.read_csv(input_csv)
+
+    # === Filter checklist entries only ===
+    checklist_rows = df[df['Description'].str.contains(r'^\s*"\d+\.\d+', na=False)]
+    if results_db and not checklist_rows.empty:
+        _, _, hosts, checklist_ids, results, actual_values = fingerprint_checks(checklist_rows)
+        results_db.add_compliance(zip(hosts, checklist_ids, results, actual_values))
+
+    # === Apply Parsing ===
+    parsed_records = checklist_rows.apply(extract_fields, axis=1).tolist()
+    final_df = pd.DataFrame(parsed_records)
+
+    # === Export to Excel ===
+    with pd.ExcelWriter(output_excel, engine='xlsxwriter') as writer:
+        workbook = writer.book
+        for ip in final_df['IP'].unique():
+            ip_df = final_df[final_df['IP'] == ip].drop(columns=["IP"])
+            sheet_name = ip.replace('.', '_')
+            ip_df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+            format_sheet(workbook, writer.sheets[sheet_name], len(ip_df.columns))
+
+    print(f"\n✅ Done! Excel saved as: {output_excel}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a Nessus compliance CSV into one Excel sheet per IP")
+    parser.add_argument("csv", nargs="?", help="Nessus compliance CSV export (prompted for when omitted)")
+    parser.add_argument("--output", help="Excel workbook to write (default compliance_by_ip.xlsx, or compliance_delta.xlsx with --delta)")
+    parser.add_argument("--delta", metavar="INDEX", help="Compare against the index saved by the previous run and write only the differences")
+    parser.add_argument("--db", help="Also write every check's result to this SQLite results database")
+    args = parser.parse_args()
+
+    # === User Input ===
+    input_csv = args.csv or input("Enter full path to the Nessus compliance CSV file: ").strip()
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db:
+        results_db.start_run("compliance")
+    if args.delta:
+        delta(input_csv, args.delta, args.output or "compliance_delta.xlsx", results_db)
+    else:
+        main(input_csv, args.output or "compliance_by_ip.xlsx", results_db)
+    if results_db:
+        results_db.close()
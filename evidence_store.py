@@ -0,0 +1,241 @@
+import os
+import sys
+import time
+import zlib
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows; there the store takes one writer process at a time
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is preferred, zlib keeps the store usable without it
+    zstandard = None
+
+PACK_SIZE_LIMIT = 256 * 1024 * 1024
+COMMIT_EVERY = 200
+
+# Function to compress a blob with zstd when available, returning the codec used
+def compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+def decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This store contains zstd blobs, install the 'zstandard' package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+# Content-addressed store: every blob is kept once (keyed by SHA-256), compressed and appended
+# to a few large pack files, with an SQLite index mapping the original file paths to blobs.
+# Several processes may write to one store (e.g. two runners with the same --store): a writer holds
+# an flock on write.lock from its first write until the next commit, so pack offsets never interleave
+class EvidenceStore:
+    def __init__(self, root, pack_size_limit=PACK_SIZE_LIMIT):
+        self.root = root
+        self.pack_size_limit = pack_size_limit
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, pack TEXT, offset INTEGER, "
+            "length INTEGER, size INTEGER, codec TEXT)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, digest TEXT, stored_at REAL)")
+        self.pending = 0
+        self.pack_name = None
+        self.pack_file = None
+        self.read_handles = {}
+        self.lock_file = open(os.path.join(root, "write.lock"), "a")
+        self.write_locked = False
+
+    # Function to take the cross-process write lock; another writer may have appended or started a pack meanwhile
+    def _lock_for_write(self):
+        if self.write_locked:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.write_locked = True
+        if self.pack_file is not None:
+            self.pack_file.close()
+            self.pack_file = None
+
+    def _writable_pack(self, incoming):
+        if self.pack_file is None:
+            row = self.db.execute("SELECT pack FROM blobs ORDER BY pack DESC LIMIT 1").fetchone()
+            self.pack_name = row[0] if row else "pack-00001.pack"
+            self.pack_file = open(os.path.join(self.root, self.pack_name), "ab")
+        self.pack_file.seek(0, os.SEEK_END)
+        if self.pack_file.tell() and self.pack_file.tell() + incoming > self.pack_size_limit:
+            self.pack_file.close()
+            number = int(self.pack_name[5:10]) + 1
+            self.pack_name = f"pack-{number:05d}.pack"
+            self.pack_file = open(os.path.join(self.root, self.pack_name), "ab")
+        return self.pack_file
+
+    def put_bytes(self, path, data):
+        if isinstance(data, str):
+            data = data.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self._lock_for_write()
+            known = self.db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if not known:
+                codec, payload = compress(data)
+                pack_file = self._writable_pack(len(payload))
+                offset = pack_file.tell()
+                pack_file.write(payload)
+                self.db.execute(
+                    "INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                    (digest, self.pack_name, offset, len(payload), len(data), codec),
+                )
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path.replace(os.sep, "/"), digest, time.time()))
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY:
+                self._commit()
+        return digest
+
+    def put_file(self, path, file_path):
+        with open(file_path, "rb") as file:
+            return self.put_bytes(path, file.read())
+
+    # Store every file under a local directory with paths relative to it, prefixed with `prefix`;
+    # committed at the end so other writer processes get the lock between hosts
+    def ingest_dir(self, local_dir, prefix):
+        count = 0
+        for dirpath, _, filenames in os.walk(local_dir):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                self.put_file(os.path.join(prefix, os.path.relpath(file_path, local_dir)), file_path)
+                count += 1
+        with self.lock:
+            self._commit()
+        return count
+
+    def get(self, path):
+        with self.lock:
+            self._commit()
+            row = self.db.execute(
+                "SELECT b.pack, b.offset, b.length, b.codec FROM files f JOIN blobs b ON b.digest = f.digest "
+                "WHERE f.path = ?", (path,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(path)
+        return self._read_blob(*row)
+
+    def _read_blob(self, pack, offset, length, codec):
+        handle = self.read_handles.get(pack)
+        if handle is None:
+            handle = self.read_handles[pack] = open(os.path.join(self.root, pack), "rb")
+        handle.seek(offset)
+        return decompress(codec, handle.read(length))
+
+    # Expand stored files into `dest` using their original relative paths
+    def export(self, dest, prefix=""):
+        with self.lock:
+            self._commit()
+            rows = self.db.execute(
+                "SELECT f.path, b.pack, b.offset, b.length, b.codec FROM files f JOIN blobs b ON b.digest = f.digest "
+                "WHERE substr(f.path, 1, ?) = ? ORDER BY b.pack, b.offset", (len(prefix), prefix)
+            ).fetchall()
+        for path, pack, offset, length, codec in rows:
+            target = os.path.join(dest, *path.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as file:
+                file.write(self._read_blob(pack, offset, length, codec))
+        return len(rows)
+
+    def stats(self):
+        with self.lock:
+            self._commit()
+            files = self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            blobs, raw, stored, packs = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0), COUNT(DISTINCT pack) FROM blobs"
+            ).fetchone()
+        return {"files": files, "blobs": blobs, "raw_bytes": raw, "stored_bytes": stored, "packs": packs}
+
+    def _commit(self):
+        if self.pack_file is not None:
+            self.pack_file.flush()
+        self.db.commit()
+        self.pending = 0
+        if self.write_locked:
+            if fcntl is not None:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.write_locked = False
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            if self.pack_file is not None:
+                self.pack_file.close()
+                self.pack_file = None
+            for handle in self.read_handles.values():
+                handle.close()
+            self.read_handles = {}
+            self.lock_file.close()
+            self.db.close()
+
+# Context manager giving a runner a local scratch folder per host; with a store its contents
+# are packed under `layout_folder` afterwards, without a store the layout folder is used directly
+@contextmanager
+def host_workspace(store, layout_folder):
+    if store is None:
+        yield layout_folder
+        return
+    workdir = tempfile.mkdtemp(prefix="evidence-")
+    try:
+        yield workdir
+    finally:
+        store.ingest_dir(workdir, os.path.basename(os.path.normpath(layout_folder)))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Function to keep a raw tool output next to the rendered images in a host workspace
+def save_raw_output(workdir, filename, data):
+    raw_dir = os.path.join(workdir, "raw")
+    os.makedirs(raw_dir, exist_ok=True)
+    with open(os.path.join(raw_dir, filename), "wb" if isinstance(data, bytes) else "w") as file:
+        file.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export a packed evidence store")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    export_parser = subparsers.add_parser("export", help="Expand stored files into the usual folder layout")
+    export_parser.add_argument("store", help="Evidence store directory")
+    export_parser.add_argument("dest", help="Destination directory")
+    export_parser.add_argument("--prefix", default="", help="Only export paths starting with this, e.g. sslscan_results/")
+    stats_parser = subparsers.add_parser("stats", help="Show file, blob and compression counts")
+    stats_parser.add_argument("store", help="Evidence store directory")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.store, "index.sqlite")):
+        print(f"No evidence store found at {args.store}")
+        sys.exit(1)
+
+    store = EvidenceStore(args.store)
+    try:
+        if args.action == "export":
+            start_time = time.time()
+            count = store.export(args.dest, args.prefix)
+            print(f"Exported {count} files to {args.dest} in {time.time() - start_time:.2f} seconds")
+        else:
+            stats = store.stats()
+            ratio = stats["raw_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0.0
+            print(f"Files: {stats['files']}, unique blobs: {stats['blobs']}, packs: {stats['packs']}")
+            print(f"Raw bytes: {stats['raw_bytes']}, stored bytes: {stats['stored_bytes']} ({ratio:.1f}x)")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
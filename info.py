@@ -1,7 +1,9 @@
 import os
+import argparse
 import pandas as pd
 from multiprocessing import Pool
 from tqdm import tqdm
+from merge_exports import export_paths, merge_exports
 
 def process_csv(file_path):
     try:
@@ -35,8 +37,32 @@ def process_files_in_folder(folder_path):
     for result in results:
         print(result)
 
-# Specify the folder path
-folder_path = '/root/Documents/Checklist/csv'
+# Function to merge every CSV in the folder (newest export wins per finding) into one cleaned CSV
+def merge_files_in_folder(folder_path):
+    csv_files = export_paths([folder_path], exclude_suffix='_cleaned.csv')
+    merged, rows_read = merge_exports(csv_files)
 
-# Call the function to process the CSV files
-process_files_in_folder(folder_path)
+    # Filter rows to keep only 'Critical', 'High', 'Medium', 'Low' risk levels
+    valid_risks = ['Critical', 'High', 'Medium', 'Low']
+    cleaned_data = merged[merged['Risk'].isin(valid_risks)]
+
+    output_file_path = os.path.join(folder_path, 'merged_cleaned.csv')
+    cleaned_data.to_csv(output_file_path, index=False)
+    print(f"Merged {len(csv_files)} files: {rows_read} rows, {rows_read - len(merged)} duplicates dropped")
+    print(f"Cleaned data saved to {output_file_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep only Critical/High/Medium/Low findings of every Nessus CSV in a folder")
+    # Specify the folder path
+    parser.add_argument("folder", nargs="?", default='/root/Documents/Checklist/csv', help="Folder with Nessus CSV reports")
+    parser.add_argument("--merge", action="store_true", help="Write one deduplicated merged_cleaned.csv instead of one file per CSV")
+    args = parser.parse_args()
+
+    # Call the function to process the CSV files
+    if args.merge:
+        merge_files_in_folder(args.folder)
+    else:
+        process_files_in_folder(args.folder)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tqdm import tqdm
+import launcher
+import scheduler
+from recorder import RunRecorder
+from runners import RUNNERS, load_runner
+
+# Output folder each runner script uses, so queue workers write where a local run would
+RUNNER_FOLDERS = {
+    "nmap_firewall": "firewall_bypass",
+    "nmap_nse": "http_nse",
+    "sslscan": "sslscan_results",
+    "dirsearch": "dirsearch_results",
+    "vuln_nse": "vuln_nse",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tool TEXT NOT NULL,
+    options TEXT NOT NULL,
+    max_attempts INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    node TEXT,
+    lease_expires REAL,
+    deadline REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS nodes (
+    node TEXT PRIMARY KEY,
+    workers INTEGER,
+    started REAL,
+    last_seen REAL
+);
+"""
+
+# Lease-based job queue in an SQLite file on a path every node can reach.
+# Each thread opens its own JobQueue, sqlite3 connections are not shared between threads.
+class JobQueue:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA busy_timeout = 60000")
+        self.conn.executescript(SCHEMA)
+
+    # Writes that read-then-update take the write lock up front so two nodes never lease the same job
+    def transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def publish(self, tool, targets, options, max_attempts=3):
+        conn = self.transaction()
+        try:
+            run_id = conn.execute("INSERT INTO runs (tool, options, max_attempts, created) VALUES (?, ?, ?, ?)",
+                                  (tool, json.dumps(options), max_attempts, time.time())).lastrowid
+            conn.executemany("INSERT INTO jobs (run_id, target) VALUES (?, ?)", ((run_id, target) for target in targets))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return run_id
+
+    def runs(self):
+        return {run_id: (tool, json.loads(options))
+                for run_id, tool, options in self.conn.execute("SELECT id, tool, options FROM runs")}
+
+    # Leases that ran out (node died or hung) go back to the queue, or fail after max_attempts
+    def requeue_expired(self, conn, now):
+        failed = conn.execute(
+            "UPDATE jobs SET state = 'failed', status = 'Lease expired ' || attempts || ' times', finished = ? "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= (SELECT max_attempts FROM runs WHERE runs.id = jobs.run_id)",
+            (now, now)).rowcount
+        requeued = conn.execute(
+            "UPDATE jobs SET state = 'queued', node = NULL, lease_expires = NULL, deadline = NULL WHERE state = 'leased' AND lease_expires < ?",
+            (now,)).rowcount
+        return requeued, failed
+
+    def reap(self):
+        conn = self.transaction()
+        try:
+            counts = self.requeue_expired(conn, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return counts
+
+    # Function to lease up to batch_size queued jobs to a node. The attempt number returned with each job
+    # is its lease token: a re-queued job leased again, even by the same node, has a higher one
+    def claim(self, node, batch_size, lease_seconds):
+        now = time.time()
+        conn = self.transaction()
+        try:
+            self.requeue_expired(conn, now)
+            jobs = conn.execute("SELECT id, run_id, target, attempts + 1 FROM jobs WHERE state = 'queued' ORDER BY id LIMIT ?",
+                                (batch_size,)).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET state = 'leased', node = ?, lease_expires = ?, attempts = attempts + 1, started = ? WHERE id = ?",
+                ((node, now + lease_seconds, now, job_id) for job_id, _, _, _ in jobs))
+            conn.execute("UPDATE nodes SET last_seen = ? WHERE node = ?", (now, node))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return jobs
+
+    # Function to mark a leased job as running and return its deadline. The worker kills the job's scanner
+    # once it is reached; past it the heartbeat also stops renewing the lease, so a job that still hangs
+    # expires and is re-queued instead of being held forever
+    def start(self, job_id, node, attempt, job_timeout):
+        now = time.time()
+        self.conn.execute("UPDATE jobs SET started = ?, deadline = ? WHERE id = ? AND node = ? AND attempts = ? AND state = 'leased'",
+                          (now, now + job_timeout, job_id, node, attempt))
+        return now + job_timeout
+
+    # A result only counts if the job is still held under the same lease; otherwise it was re-queued and
+    # someone else owns it, possibly this node again under a newer attempt
+    def complete(self, job_id, node, attempt, status):
+        state = "done" if status == "Success" else "failed"
+        return self.conn.execute(
+            "UPDATE jobs SET state = ?, status = ?, finished = ?, lease_expires = NULL, deadline = NULL "
+            "WHERE id = ? AND node = ? AND attempts = ? AND state = 'leased'",
+            (state, status, time.time(), job_id, node, attempt)).rowcount == 1
+
+    # Function to hand back every job still leased to a node that is shutting down
+    def release(self, node):
+        return self.conn.execute("UPDATE jobs SET state = 'queued', node = NULL, lease_expires = NULL, deadline = NULL "
+                                 "WHERE node = ? AND state = 'leased'", (node,)).rowcount
+
+    # Function to renew the leases of this node's jobs that are waiting or still within their deadline
+    def heartbeat(self, node, lease_seconds):
+        now = time.time()
+        self.conn.execute("UPDATE jobs SET lease_expires = ? WHERE node = ? AND state = 'leased' AND (deadline IS NULL OR deadline > ?)",
+                          (now + lease_seconds, node, now))
+        self.conn.execute("UPDATE nodes SET last_seen = ? WHERE node = ?", (now, node))
+
+    def register(self, node, workers):
+        now = time.time()
+        self.conn.execute("INSERT INTO nodes (node, workers, started, last_seen) VALUES (?, ?, ?, ?) "
+                          "ON CONFLICT(node) DO UPDATE SET workers = excluded.workers, started = excluded.started, last_seen = excluded.last_seen",
+                          (node, workers, now, now))
+
+    def counts(self, run_id=None):
+        query = "SELECT state, COUNT(*) FROM jobs" + (" WHERE run_id = ?" if run_id else "") + " GROUP BY state"
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(self.conn.execute(query, (run_id,) if run_id else ())))
+        return counts
+
+    # Per-node throughput over the span the node was actually working
+    def node_throughput(self, run_id=None):
+        query = ("SELECT jobs.node, COUNT(*), SUM(state = 'done'), MIN(jobs.started), MAX(finished), SUM(finished - jobs.started), "
+                 "nodes.workers, nodes.last_seen FROM jobs LEFT JOIN nodes ON nodes.node = jobs.node "
+                 "WHERE state IN ('done', 'failed') AND jobs.node IS NOT NULL" + (" AND run_id = ?" if run_id else "") +
+                 " GROUP BY jobs.node ORDER BY jobs.node")
+        return self.conn.execute(query, (run_id,) if run_id else ()).fetchall()
+
+    def failures(self, run_id=None):
+        query = "SELECT target, status FROM jobs WHERE state = 'failed'" + (" AND run_id = ?" if run_id else "") + " ORDER BY id"
+        return self.conn.execute(query, (run_id,) if run_id else ()).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+# Background thread extending this node's leases while its jobs run, up to each job's deadline
+class Heartbeat(threading.Thread):
+    def __init__(self, path, node, lease_seconds):
+        super().__init__(daemon=True)
+        self.path = path
+        self.node = node
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+
+    def run(self):
+        queue = JobQueue(self.path)
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                queue.heartbeat(self.node, self.lease_seconds)
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+# Function to run one target with the tool's own process_ip, returning the status it reports. Every child
+# it starts is killed at the job's deadline, which process_ip then reports as an error
+def run_target(tool, target, options, folder, recorder, deadline):
+    runner = load_runner(tool)
+    progress_data = {}
+    launcher.set_deadline(deadline)
+    try:
+        if tool == "nmap_firewall":
+            runner.process_ip(target, folder, progress_data, options.get("two_phase", False), {}, recorder=recorder)
+        elif tool in ("nmap_nse", "vuln_nse"):
+            runner.process_ip(target, options["command"], folder, progress_data, recorder=recorder)
+        else:
+            runner.process_ip(target, folder, progress_data, recorder=recorder)
+    finally:
+        launcher.set_deadline(None)
+    return progress_data.get(target, "No status reported")
+
+# Function to pull batches from the queue and run them until it is drained (or forever with stay=True)
+def work(path, node, workers=3, batch_size=5, lease_seconds=300, output_dir=".", record=True, stay=False, poll_seconds=5,
+         job_timeout=3600):
+    queue = JobQueue(path)
+    queue.register(node, workers)
+    heartbeat = Heartbeat(path, node, lease_seconds)
+    heartbeat.start()
+    runs = {}
+    recorders = {}
+    pending = deque()
+    in_flight = {}
+    completed = failed = lost = 0
+    start_time = time.time()
+
+    def submit(executor, job):
+        job_id, run_id, target, attempt = job
+        if run_id not in runs:
+            runs.update(queue.runs())
+        tool, options = runs[run_id]
+        load_runner(tool)  # Import the runner here, not concurrently in the worker threads
+        folder = os.path.join(output_dir, RUNNER_FOLDERS[tool])
+        os.makedirs(folder, exist_ok=True)
+        if record and run_id not in recorders:
+            recorders[run_id] = RunRecorder(tool, folder, {**options, "queue_run": run_id, "node": node})
+        deadline = queue.start(job_id, node, attempt, job_timeout)
+        return executor.submit(run_target, tool, target, options, folder, recorders.get(run_id), deadline)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(desc=f"Worker {node}", unit="IP") as pbar:
+            while True:
+                # Keep a batch in hand so the workers never wait on the queue between targets
+                if len(pending) + len(in_flight) <= workers:
+                    pending.extend(queue.claim(node, batch_size, lease_seconds))
+                while pending and len(in_flight) < workers:
+                    job = pending.popleft()
+                    in_flight[submit(executor, job)] = job
+
+                if not in_flight:
+                    counts = queue.counts()
+                    if not stay and not counts["queued"] and not counts["leased"]:
+                        break
+                    time.sleep(poll_seconds)  # Other nodes still hold leases that may expire and come back
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id, _, target, attempt = in_flight.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        status = f"Exception: {e}"
+                    if not queue.complete(job_id, node, attempt, status):
+                        lost += 1  # Lease expired while running and the job was re-queued
+                    elif status == "Success":
+                        completed += 1
+                    else:
+                        failed += 1
+                    pbar.set_postfix_str(f"Current IP: {target}")
+                    pbar.update(1)
+    finally:
+        heartbeat.stop()
+        released = queue.release(node)
+        if released:
+            print(f"Released {released} unfinished jobs back to the queue")
+        for recorder in recorders.values():
+            recorder.close()
+        queue.close()
+
+    elapsed_time = time.time() - start_time
+    print(f"\nWorker {node} Summary:")
+    print(f"Targets completed: {completed}, failed: {failed}, lease lost: {lost}")
+    print(f"Results saved on this node under {os.path.abspath(output_dir)}")
+    print(f"Time taken: {elapsed_time:.2f} seconds ({(completed + failed) / elapsed_time * 60 if elapsed_time else 0:.1f} targets/min)")
+    launcher.report()
+
+def print_status(queue, run_id=None):
+    counts = queue.counts(run_id)
+    total = sum(counts.values())
+    print(f"\nQueue Status{f' (run {run_id})' if run_id else ''}:")
+    print(f"Jobs: {total} total, {counts['queued']} queued, {counts['leased']} leased, {counts['done']} done, {counts['failed']} failed")
+    now = time.time()
+    for node, finished, succeeded, first_start, last_finish, busy, workers, last_seen in queue.node_throughput(run_id):
+        span = (last_finish - first_start) if first_start and last_finish else 0
+        rate = finished / span * 60 if span else 0.0
+        seen = f"{now - last_seen:.0f}s ago" if last_seen else "never"
+        print(f"  {node:<20} finished={finished:<6} ok={succeeded:<6} {rate:>7.1f} targets/min "
+              f"avg={busy / finished if finished else 0:.1f}s workers={workers} last seen {seen}")
+    for target, status in queue.failures(run_id)[:20]:
+        print(f"  failed {target}: {status}")
+
+# Function to publish a run and, when watching, re-queue expired leases until every job is finished
+def coordinate(path, tool, targets, options, max_attempts, watch, poll_seconds=5):
+    queue = JobQueue(path)
+    run_id = queue.publish(tool, targets, options, max_attempts)
+    print(f"Published run {run_id}: {len(targets)} {tool} targets to {path}")
+    if watch:
+        with tqdm(total=len(targets), desc=f"Run {run_id}", unit="IP") as pbar:
+            while True:
+                requeued, _ = queue.reap()
+                if requeued:
+                    tqdm.write(f"Re-queued {requeued} jobs with expired leases")
+                counts = queue.counts(run_id)
+                pbar.update(counts["done"] + counts["failed"] - pbar.n)
+                if not counts["queued"] and not counts["leased"]:
+                    break
+                time.sleep(poll_seconds)
+        print_status(queue, run_id)
+    queue.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distribute the per-IP scanners over several nodes through a shared SQLite job queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish", help="Publish targets for a tool (coordinator)")
+    publish.add_argument("queue", help="Queue database on a path shared by all nodes")
+    publish.add_argument("tool", choices=sorted(RUNNERS))
+    publish.add_argument("--ip-list", default="ip.txt", help="File with one target per line")
+    publish.add_argument("--nmap-command", help="Base nmap command for nmap_nse / vuln_nse, e.g. \"nmap -Pn -sV\"")
+    publish.add_argument("--two-phase", action="store_true", help="Two-phase scan for nmap_firewall")
+    publish.add_argument("--max-attempts", type=int, default=3, help="Leases per job before it is marked failed")
+    publish.add_argument("--watch", action="store_true", help="Stay and re-queue expired leases until the run is finished")
+    scheduler.add_arguments(publish)
+
+    worker = subparsers.add_parser("work", help="Pull and run jobs (worker, one per node)")
+    worker.add_argument("queue", help="Queue database on a path shared by all nodes")
+    worker.add_argument("--node", default=socket.gethostname(), help="Node name used for leases and reporting")
+    worker.add_argument("--workers", type=int, default=3, help="Targets scanned at once on this node")
+    worker.add_argument("--batch", type=int, default=5, help="Jobs leased per claim")
+    worker.add_argument("--lease", type=float, default=300, help="Lease length in seconds, renewed by heartbeats")
+    worker.add_argument("--job-timeout", type=float, default=3600,
+                        help="Seconds a single target may run before its scanner is killed and the job marked failed")
+    worker.add_argument("--output-dir", default=".",
+                        help="Where the tool result folders are created on this node; results are not copied anywhere, "
+                             "so point this at shared storage to collect every node's screenshots in one place")
+    worker.add_argument("--no-record", action="store_true", help="Do not record raw output to recordings/ for replay.py")
+    worker.add_argument("--stay", action="store_true", help="Keep polling for new runs when the queue is empty")
+    launcher.add_arguments(worker)
+
+    status = subparsers.add_parser("status", help="Show job counts and per-node throughput")
+    status.add_argument("queue", help="Queue database")
+    status.add_argument("--run", type=int, help="Only this run")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == "publish":
+        if args.tool in ("nmap_nse", "vuln_nse") and not args.nmap_command:
+            print(f"{args.tool} needs --nmap-command")
+            return
+        with open(args.ip_list, "r") as file:
+            targets = [line.strip() for line in file if line.strip()]
+        # Jobs are claimed in publish order, so longest expected first holds across all nodes
+        targets, _ = scheduler.plan(targets, args.tool, args, workers=1)
+        options = {"command": args.nmap_command} if args.nmap_command else {}
+        if args.two_phase:
+            options["two_phase"] = True
+        coordinate(args.queue, args.tool, targets, options, args.max_attempts, args.watch)
+    elif args.command == "work":
+        launcher.configure(args)
+        work(args.queue, args.node, args.workers, args.batch, args.lease, args.output_dir, not args.no_record, args.stay,
+             job_timeout=args.job_timeout)
+    else:
+        queue = JobQueue(args.queue)
+        print_status(queue, args.run)
+        queue.close()
+
+if __name__ == "__main__":
+    main()
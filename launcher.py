@@ -0,0 +1,195 @@
+import os
+import time
+import shlex
+import resource
+import threading
+import subprocess
+
+# Limits applied to every scanner/renderer child of this run, set once from the command line with configure()
+LIMITS = {
+    "nice": None,
+    "ionice": None,
+    "memory_mb": None,
+    "cpu_seconds": None,
+    "cgroup": None,
+}
+
+IONICE_CLASSES = ("idle", "best-effort")
+
+_usage_lock = threading.Lock()
+_usage = {}
+_warned = set()
+_deadline = threading.local()
+
+def add_arguments(parser):
+    group = parser.add_argument_group("child process limits")
+    group.add_argument("--nice", type=int, help="Niceness added to every scanner and renderer child")
+    group.add_argument("--ionice", choices=IONICE_CLASSES, help="I/O scheduling class for children (needs psutil)")
+    group.add_argument("--child-memory-mb", type=int, help="Address space limit (RLIMIT_AS) per child, in MB")
+    group.add_argument("--child-cpu-seconds", type=int, help="CPU time limit (RLIMIT_CPU) per child, in seconds")
+    group.add_argument("--cgroup", help="cgroup v2 directory to place children in, created when missing")
+    group.add_argument("--cgroup-memory-mb", type=int, help="memory.max for the whole --cgroup, in MB")
+    group.add_argument("--cgroup-cpus", type=float, help="cpu.max for the whole --cgroup, in CPUs")
+
+# Function to set the launcher limits from parsed arguments (see add_arguments)
+def configure(args):
+    LIMITS.update(nice=args.nice, ionice=args.ionice, memory_mb=args.child_memory_mb,
+                  cpu_seconds=args.child_cpu_seconds, cgroup=args.cgroup)
+    if args.cgroup:
+        setup_cgroup(args.cgroup, args.cgroup_memory_mb, args.cgroup_cpus)
+
+# Function to create the cgroup and write its aggregate limits; children are added to it as they start
+def setup_cgroup(path, memory_mb=None, cpus=None):
+    if not os.path.exists(os.path.join(os.path.dirname(os.path.abspath(path)), "cgroup.procs")):
+        print(f"Warning: {path} is not inside a cgroup v2 hierarchy, continuing without it")
+        LIMITS["cgroup"] = None
+        return
+    try:
+        os.makedirs(path, exist_ok=True)
+        if memory_mb:
+            with open(os.path.join(path, "memory.max"), "w") as file:
+                file.write(str(memory_mb * 1024 * 1024))
+        if cpus:
+            with open(os.path.join(path, "cpu.max"), "w") as file:
+                file.write(f"{int(cpus * 100000)} 100000")
+    except OSError as e:
+        print(f"Warning: cgroup {path} not usable, continuing without it: {e}")
+        LIMITS["cgroup"] = None
+
+def warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        print(f"Warning: {message}")
+
+# Function to apply the limits to a freshly started child. This is done from the parent with
+# prlimit()/setpriority() rather than a preexec_fn, which is not safe to use from the worker threads
+def apply_limits(pid):
+    try:
+        if LIMITS["nice"]:
+            os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, 0) + LIMITS["nice"])
+        if LIMITS["memory_mb"]:
+            limit = LIMITS["memory_mb"] * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if LIMITS["cpu_seconds"]:
+            # The soft limit sends SIGXCPU, the hard limit a few seconds later SIGKILL
+            resource.prlimit(pid, resource.RLIMIT_CPU, (LIMITS["cpu_seconds"], LIMITS["cpu_seconds"] + 5))
+    except (ProcessLookupError, PermissionError):
+        pass  # The child already exited
+    if LIMITS["ionice"]:
+        set_ionice(pid, LIMITS["ionice"])
+    if LIMITS["cgroup"]:
+        try:
+            with open(os.path.join(LIMITS["cgroup"], "cgroup.procs"), "w") as file:
+                file.write(str(pid))
+        except ProcessLookupError:
+            pass
+        except OSError as e:
+            warn_once("cgroup", f"cannot add children to cgroup {LIMITS['cgroup']}: {e}")
+
+# psutil is only needed for --ionice, so it is imported on first use rather than at start-up
+def set_ionice(pid, io_class_name):
+    try:
+        import psutil
+    except ImportError:
+        warn_once("ionice", "psutil is not installed, --ionice ignored")
+        return
+    io_class = psutil.IOPRIO_CLASS_IDLE if io_class_name == "idle" else psutil.IOPRIO_CLASS_BE
+    try:
+        psutil.Process(pid).ionice(io_class)
+    except psutil.Error:
+        pass
+
+# Commands are split like a shell would split them, but run without one
+def command_argv(command):
+    return shlex.split(command) if isinstance(command, str) else list(command)
+
+# Function to start a child with the limits applied; finish it with wait() to record its resource usage
+def popen(command, **kwargs):
+    process = subprocess.Popen(command_argv(command), **kwargs)
+    process.started = time.time()
+    apply_limits(process.pid)
+    return process
+
+# Function to reap a child with wait4() and record its CPU time and peak RSS under the program name
+def wait(process):
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    record_usage(os.path.basename(process.args[0]), time.time() - process.started, usage, process.returncode)
+    return process.returncode
+
+def record_usage(program, wall_seconds, usage, returncode):
+    with _usage_lock:
+        stats = _usage.setdefault(program, {"runs": 0, "failures": 0, "wall": 0.0, "user": 0.0, "system": 0.0, "max_rss_kb": 0})
+        stats["runs"] += 1
+        stats["failures"] += returncode != 0
+        stats["wall"] += wall_seconds
+        stats["user"] += usage.ru_utime
+        stats["system"] += usage.ru_stime
+        stats["max_rss_kb"] = max(stats["max_rss_kb"], usage.ru_maxrss)
+
+def read_stream(stream, chunks):
+    chunks.append(stream.read())
+    stream.close()
+
+# Function to bound every child the calling thread starts with run() by a time.time() deadline, or to clear it
+# with None. The job queue sets one per target, so a hung scanner is killed once its job runs out of time
+def set_deadline(deadline):
+    _deadline.value = deadline
+
+# Function to narrow a run() timeout to what is left of the calling thread's deadline
+def deadline_timeout(command, timeout):
+    deadline = getattr(_deadline, "value", None)
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise subprocess.TimeoutExpired(command_argv(command), 0)
+    return min(timeout, remaining) if timeout else remaining
+
+# Drop-in for subprocess.run(command, capture_output=True, text=True, check=..., timeout=...) without the shell
+def run(command, capture_output=True, text=True, check=False, timeout=None):
+    timeout = deadline_timeout(command, timeout)
+    pipe = subprocess.PIPE if capture_output else None
+    process = popen(command, stdout=pipe, stderr=pipe, stdin=subprocess.DEVNULL, text=text)
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer:
+        timer.start()
+    stdout = stderr = None
+    try:
+        if capture_output:
+            # stderr is drained on a thread so neither pipe can fill up and block the child
+            stderr_chunks = []
+            stderr_reader = threading.Thread(target=read_stream, args=(process.stderr, stderr_chunks))
+            stderr_reader.start()
+            stdout = process.stdout.read()
+            process.stdout.close()
+            stderr_reader.join()
+            stderr = stderr_chunks[0]
+        returncode = wait(process)
+    finally:
+        if timer:
+            timer.cancel()
+
+    if expired.is_set():
+        raise subprocess.TimeoutExpired(process.args, timeout, output=stdout, stderr=stderr)
+    result = subprocess.CompletedProcess(process.args, returncode, stdout, stderr)
+    if check:
+        result.check_returncode()
+    return result
+
+# Function to print per-program child usage gathered during this run
+def report():
+    with _usage_lock:
+        usage = {program: dict(stats) for program, stats in _usage.items()}
+    if not usage:
+        return
+    print("\nChild process usage:")
+    for program, stats in sorted(usage.items()):
+        print(f"  {program:<16} runs={stats['runs']:<6} failed={stats['failures']:<4} wall={stats['wall']:.2f}s "
+              f"cpu={stats['user'] + stats['system']:.2f}s peak_rss={stats['max_rss_kb'] / 1024:.1f}MB")
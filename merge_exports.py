@@ -0,0 +1,121 @@
+import os
+import time
+import argparse
+import xml.etree.ElementTree as ET
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+# A finding is the same finding in every export when these match; the newest export wins
+KEY_COLUMNS = ['Host', 'Plugin ID', 'Port', 'Protocol']
+
+EXPORT_EXTENSIONS = ('.csv', '.nessus')
+
+# .nessus ReportItem child elements and the CSV export columns they become
+NESSUS_ITEM_COLUMNS = {
+    'risk_factor': 'Risk',
+    'cvss_base_score': 'CVSS v2.0 Base Score',
+    'synopsis': 'Synopsis',
+    'description': 'Description',
+    'solution': 'Solution',
+    'see_also': 'See Also',
+    'plugin_output': 'Plugin Output',
+}
+
+# Function to expand files and folders into the CSV and .nessus exports they contain, oldest first by modification time
+def export_paths(paths, exclude_suffix=None):
+    csv_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            csv_files.extend(os.path.join(path, name) for name in os.listdir(path) if name.endswith(EXPORT_EXTENSIONS))
+        else:
+            csv_files.append(path)
+    if exclude_suffix:
+        csv_files = [csv_file for csv_file in csv_files if not csv_file.endswith(exclude_suffix)]
+    return sorted(csv_files, key=lambda csv_file: (os.path.getmtime(csv_file), csv_file))
+
+# Function to load a .nessus (XML) export with the same columns as the CSV export, one host at a time
+def load_nessus_xml(nessus_file):
+    rows = []
+    for _, element in ET.iterparse(nessus_file, events=('end',)):
+        if element.tag != 'ReportHost':
+            continue
+        properties = {tag.get('name'): tag.text for tag in element.iterfind('HostProperties/tag')}
+        host_columns = {
+            'Host': element.get('name'),
+            'Operating System': properties.get('operating-system', 'Unknown'),
+            'Host Start': properties.get('HOST_START'),
+            'Host End': properties.get('HOST_END'),
+        }
+        for item in element.iterfind('ReportItem'):
+            row = {
+                'Plugin ID': item.get('pluginID'),
+                'CVE': ','.join(cve.text for cve in item.iterfind('cve') if cve.text),
+                'Protocol': item.get('protocol'),
+                'Port': item.get('port'),
+                'Name': item.get('pluginName'),
+                **host_columns,
+            }
+            for tag, column in NESSUS_ITEM_COLUMNS.items():
+                row[column] = item.findtext(tag)
+            rows.append(row)
+        element.clear()  # Keep memory flat on large scans
+    df = pd.DataFrame(rows, columns=['Plugin ID', 'CVE', 'CVSS v2.0 Base Score', 'Risk', 'Host', 'Protocol', 'Port', 'Name',
+                                     'Synopsis', 'Description', 'Solution', 'See Also', 'Plugin Output',
+                                     'Operating System', 'Host Start', 'Host End'])
+    df['Risk'] = df['Risk'].fillna('None')
+    return df
+
+def read_export(csv_file, usecols=None):
+    if csv_file.endswith('.nessus'):
+        df = load_nessus_xml(csv_file)
+        return df if usecols is None else df[[column for column in df.columns if column in set(usecols) | set(KEY_COLUMNS)]]
+    if usecols is None:
+        return pd.read_csv(csv_file)
+    wanted = set(usecols) | set(KEY_COLUMNS)
+    return pd.read_csv(csv_file, usecols=lambda column: column in wanted)
+
+# Function to normalize the key columns so the same finding hashes the same in every export
+def normalize_keys(df):
+    df = df.copy()
+    df['Host'] = df['Host'].astype(str).str.strip()
+    for column in ('Plugin ID', 'Port'):
+        values = df[column] if column in df.columns else pd.Series(0, index=df.index)
+        df[column] = pd.to_numeric(values, errors='coerce').fillna(0).astype(int)
+    protocols = df['Protocol'] if 'Protocol' in df.columns else pd.Series('', index=df.index)
+    df['Protocol'] = protocols.fillna('').astype(str).str.strip().str.lower()
+    return df
+
+# Function to merge exports given oldest first, keeping the newest row per (Host, Plugin ID, Port, Protocol)
+def merge_frames(frames):
+    frames = [normalize_keys(df) for df in frames]
+    if not frames:
+        return pd.DataFrame(columns=KEY_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(KEY_COLUMNS, keep='last').reset_index(drop=True)
+
+# Function to read every export in parallel and return one deduplicated frame plus the rows read
+def merge_exports(csv_files, usecols=None, workers=4):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames = list(executor.map(lambda csv_file: read_export(csv_file, usecols), csv_files))
+    return merge_frames(frames), sum(len(df) for df in frames)
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge overlapping Nessus CSV exports, keeping the newest finding per host/plugin/port/protocol")
+    parser.add_argument("paths", nargs="+", help="Nessus CSV / .nessus exports or folders containing them")
+    parser.add_argument("-o", "--output", default="merged_export.csv", help="Merged CSV to write")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    csv_files = [csv_file for csv_file in export_paths(args.paths) if os.path.abspath(csv_file) != os.path.abspath(args.output)]
+    merged, rows_read = merge_exports(csv_files)
+    merged.to_csv(args.output, index=False)
+
+    print("\nSummary Report:")
+    print(f"Exports merged: {len(csv_files)}")
+    print(f"Rows read: {rows_read}, unique findings: {len(merged)}, duplicates dropped: {rows_read - len(merged)}")
+    print(f"Hosts: {merged['Host'].nunique()}")
+    print(f"Merged export saved to {args.output}")
+    print(f"Time taken: {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand -> (script file, description). Nothing is imported until a subcommand is chosen,
+# so pandas, PIL, imgkit and friends only load for the tools that need them.
+COMMANDS = {
+    "nessus": ("1.nessus.py", "Per-host vulnerability summary screenshots from Nessus CSV exports"),
+    "firewall": ("2.nmap_firewall.py", "Fragmented nmap scan per IP in ip.txt"),
+    "nse": ("3.nmap_nse.py", "nmap NSE scripts per IP, optionally split into profiles"),
+    "sslscan": ("4.sslscan.py", "sslscan per target in ip.txt"),
+    "dirsearch": ("5.dirsearch.py", "dirsearch against https://<ip>/ per IP in ip.txt"),
+    "vuln": ("6.vuln_nse.py", "nmap vuln scripts per IP, with an optional result cache"),
+    "plugin": ("plugin.py", "Plugin Output screenshots per host from a Nessus CSV"),
+    "compliance": ("config_va.py", "Compliance CSV to one Excel sheet per IP"),
+    "info": ("info.py", "Drop informational findings from every CSV in a folder"),
+    "info-remove": ("info_issue_remove_from_nessus_reports.py", "Same as info, with the reports folder as default"),
+    "replay": ("replay.py", "Re-render screenshots from recorded scanner output"),
+    "queue": ("job_queue.py", "Publish, work and monitor the multi-node job queue"),
+    "results": ("results_db.py", "Query the SQLite results database"),
+    "evidence": ("evidence_store.py", "Export or inspect a packed evidence store"),
+    "merge": ("merge_exports.py", "Merge overlapping Nessus CSV exports, newest finding wins"),
+    "watch": ("watch_exports.py", "Process Nessus exports as they land in a folder"),
+    "optimize": ("optimize_images.py", "Palette-quantize and recompress screenshot PNGs in place"),
+    "bench": (os.path.join("bench", "run_bench.py"), "Benchmark the tools against synthetic data"),
+}
+
+def print_usage():
+    print("usage: netscripts.py <command> [arguments...]\n")
+    print("commands:")
+    for name, (script, description) in COMMANDS.items():
+        print(f"  {name:<12} {description} ({script})")
+    print("\nRun 'netscripts.py <command> --help' for the options of a command.")
+
+# Function to run a tool script exactly as if it had been started directly
+def run_command(name, arguments):
+    import runpy
+
+    script = os.path.join(SCRIPT_DIR, COMMANDS[name][0])
+    sys.argv = [script] + arguments
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name="__main__")
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print_usage()
+        return 0
+    name = sys.argv[1]
+    if name not in COMMANDS:
+        print(f"Unknown command '{name}'\n")
+        print_usage()
+        return 2
+    run_command(name, sys.argv[2:])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
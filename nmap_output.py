@@ -0,0 +1,109 @@
+import re
+import subprocess
+
+# NSE results in nmap's normal output are "|"-prefixed blocks that start with "<script-id>:"
+# and end on the line prefixed with "|_"
+SCRIPT_START = re.compile(r'^\|_?\s?([\w.\-]+):')
+
+# Function to split nmap normal output into plain text and per-script blocks
+def split_script_blocks(output):
+    segments = []
+    text_lines = []
+    block_id = None
+    block_lines = []
+
+    for line in output.splitlines():
+        if block_id is not None and not line.startswith('|'):
+            # Unterminated block, close it and treat the line as plain text
+            segments.append(('script', block_id, block_lines))
+            block_id = None
+
+        if block_id is None:
+            match = SCRIPT_START.match(line)
+            if not match:
+                text_lines.append(line)
+                continue
+            if text_lines:
+                segments.append(('text', None, text_lines))
+                text_lines = []
+            block_id = match.group(1)
+            block_lines = [line]
+        else:
+            block_lines.append(line)
+
+        if line.startswith('|_'):
+            segments.append(('script', block_id, block_lines))
+            block_id = None
+
+    if block_id is not None:
+        segments.append(('script', block_id, block_lines))
+    if text_lines:
+        segments.append(('text', None, text_lines))
+    return segments
+
+# Function to keep only the script blocks of the given script IDs, leaving host and port lines intact
+def filter_scripts(output, script_ids):
+    kept = []
+    for kind, script_id, lines in split_script_blocks(output):
+        if kind == 'text' or script_id in script_ids:
+            kept.extend(lines)
+    return "\n".join(kept)
+
+# Function to resolve an NSE script expression (names, categories, wildcards) to script IDs
+def resolve_scripts(script_expression):
+    result = subprocess.run(["nmap", "--script-help", script_expression], capture_output=True, text=True)
+    lines = result.stdout.splitlines()
+    # Every script entry is its ID on one line followed by a "Categories:" line
+    return {lines[i].strip() for i in range(len(lines) - 1) if lines[i + 1].startswith("Categories:")}
+
+PORT_LINE = re.compile(r'^(\d+)/(tcp|udp|sctp)\s+(\S+)')
+# "Not shown: 995 closed tcp ports (reset), 3 filtered tcp ports (no-response)" (older nmap: "Not shown: 995 closed ports")
+NOT_SHOWN = re.compile(r'^Not shown: (.+)$')
+COLLAPSED_STATE = re.compile(r'(\d+) (\S+) (?:(?:tcp|udp|sctp) )?ports')
+# "All 1000 scanned ports on <host> are filtered", or "... are closed (600) or filtered (400)"; nmap 7.92+
+# prints "... are in ignored states." followed by a "Not shown" line instead
+ALL_SCANNED = re.compile(r'^All (\d+) scanned ports on .+ are (.+?)\.?$')
+STATE_COUNT = re.compile(r'(\S+) \((\d+)\)')
+
+# Function to map "port/proto" to the state nmap reported for it
+def parse_port_states(output):
+    states = {}
+    for line in output.splitlines():
+        match = PORT_LINE.match(line)
+        if match:
+            states[f"{match.group(1)}/{match.group(2)}"] = match.group(3)
+    return states
+
+# Function to read the per-state counts of the ports nmap collapsed instead of listing
+def parse_not_shown(output):
+    collapsed = {}
+    for line in output.splitlines():
+        line = line.strip()
+        match = NOT_SHOWN.match(line)
+        if match:
+            for count, state in COLLAPSED_STATE.findall(match.group(1)):
+                collapsed[state] = collapsed.get(state, 0) + int(count)
+            continue
+        match = ALL_SCANNED.match(line)
+        if match and match.group(2) != "in ignored states":
+            for state, count in STATE_COUNT.findall(match.group(2)) or [(match.group(2), match.group(1))]:
+                collapsed[state] = collapsed.get(state, 0) + int(count)
+    return collapsed
+
+# Function to split nmap output into per-port blocks (port line plus its script lines) and host script lines
+def split_port_blocks(output):
+    port_blocks = {}
+    host_script_lines = []
+    current = None
+    for line in output.splitlines():
+        match = PORT_LINE.match(line)
+        if match:
+            current = port_blocks.setdefault(f"{match.group(1)}/{match.group(2)}", [])
+            current.append(line)
+        elif line.startswith("Host script results:"):
+            current = host_script_lines
+        elif line.startswith("|") and current is not None:
+            current.append(line)
+        else:
+            current = None
+    return port_blocks, host_script_lines
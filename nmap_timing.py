@@ -0,0 +1,130 @@
+import re
+import time
+import ipaddress
+import statistics
+import threading
+
+LATENCY = re.compile(r'Host is up \(([\d.]+)s latency\)')
+# Printed in normal output when probes to a live host kept going unanswered
+RETRANSMISSION_CAP = re.compile(r'giving up on port because retransmission cap hit')
+
+# Starting point for a subnet nothing is known about yet, close to nmap's -T3 behaviour. No --min-rate is
+# forced until the subnet has answered; nmap's own congestion control sets the pace until then
+MIN_RATE_FLOOR = 100
+DEFAULT_PARAMS = {
+    'max_retries': 3,
+    'initial_rtt_ms': 500,
+    'max_rtt_ms': 1500,
+    'min_parallelism': 8,
+}
+
+# Function to tell whether a streamed output line is one the controller reads, so streaming runs keep only those
+def is_timing_line(line):
+    return line.startswith("Host is up") or bool(RETRANSMISSION_CAP.search(line))
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+# Per-subnet observations and the timing parameters currently used for it
+class SubnetTiming:
+    def __init__(self):
+        self.params = dict(DEFAULT_PARAMS)
+        self.rtts = []
+        self.answered = 0
+        self.lossy = 0
+        self.scanned = 0
+        self.batch_scanned = 0
+        self.batch_started = time.time()
+        self.total_seconds = 0.0
+
+    # Share of the hosts that answered whose probes got through without hitting the retransmission cap.
+    # Hosts that never answer (nothing at that address) say nothing about the path and are left out
+    def response_rate(self):
+        return (self.answered - self.lossy) / self.answered if self.answered else None
+
+def format_rate(response_rate):
+    return "n/a" if response_rate is None else f"{response_rate:.0%}"
+
+# Function to derive the next batch's parameters from observed RTT and response rate
+def tune_params(params, rtts, response_rate):
+    params = dict(params)
+    if response_rate is None:
+        return params  # No host answered yet, nothing to tune on
+    if rtts:
+        rtt_ms = statistics.median(rtts[-50:]) * 1000
+        params['initial_rtt_ms'] = int(clamp(rtt_ms * 4, 50, 1000))
+        params['max_rtt_ms'] = int(clamp(rtt_ms * 10, 100, 3000))
+
+    if response_rate < 0.8:
+        # Lossy path (VPN, rate-limited firewall): slow down and retry more instead of forcing reruns
+        if 'min_rate' in params:
+            params['min_rate'] = int(clamp(params['min_rate'] * 0.5, 20, 5000))
+        params['max_retries'] = int(clamp(params['max_retries'] + 1, 1, 6))
+        params['min_parallelism'] = int(clamp(params['min_parallelism'] // 2, 1, 128))
+    elif response_rate > 0.95:
+        # Clean path: push harder and give up on unanswered probes sooner
+        params['min_rate'] = int(clamp(params['min_rate'] * 1.5, 20, 5000)) if 'min_rate' in params else MIN_RATE_FLOOR
+        params['max_retries'] = int(clamp(params['max_retries'] - 1, 1, 6))
+        params['min_parallelism'] = int(clamp(params['min_parallelism'] * 2, 1, 128))
+    return params
+
+# Controller that hands out nmap timing options per subnet and retunes them after every batch of hosts
+class TimingController:
+    def __init__(self, prefix=24, batch_size=8, log=print):
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.log = log
+        self.subnets = {}
+        self.lock = threading.Lock()
+
+    def subnet(self, ip):
+        try:
+            return str(ipaddress.ip_network(f"{ip}/{self.prefix}", strict=False))
+        except ValueError:
+            return ip  # Hostnames are tuned on their own
+
+    def options(self, ip):
+        with self.lock:
+            params = self.subnets.setdefault(self.subnet(ip), SubnetTiming()).params
+            return (
+                (f"--min-rate {params['min_rate']} " if 'min_rate' in params else "") +
+                f"--max-retries {params['max_retries']} "
+                f"--initial-rtt-timeout {params['initial_rtt_ms']}ms --max-rtt-timeout {params['max_rtt_ms']}ms "
+                f"--min-parallelism {params['min_parallelism']}"
+            )
+
+    def record(self, ip, output, elapsed):
+        latency = LATENCY.search(output or "")
+        subnet = self.subnet(ip)
+        with self.lock:
+            timing = self.subnets.setdefault(subnet, SubnetTiming())
+            timing.scanned += 1
+            timing.batch_scanned += 1
+            timing.total_seconds += elapsed
+            if latency:
+                timing.answered += 1
+                timing.rtts.append(float(latency.group(1)))
+                if RETRANSMISSION_CAP.search(output):
+                    timing.lossy += 1
+
+            if timing.batch_scanned >= self.batch_size:
+                batch_seconds = time.time() - timing.batch_started
+                throughput = timing.batch_scanned / batch_seconds * 60 if batch_seconds else 0.0
+                self.log(
+                    f"[timing] {subnet}: {timing.batch_scanned} hosts at {throughput:.1f} hosts/min with {timing.params}, "
+                    f"response rate {format_rate(timing.response_rate())}"
+                )
+                timing.params = tune_params(timing.params, timing.rtts, timing.response_rate())
+                timing.batch_scanned = 0
+                timing.batch_started = time.time()
+
+    def report(self):
+        lines = []
+        for subnet, timing in sorted(self.subnets.items()):
+            rtt = f"{statistics.median(timing.rtts) * 1000:.1f}ms" if timing.rtts else "n/a"
+            average = timing.total_seconds / timing.scanned if timing.scanned else 0.0
+            lines.append(
+                f"{subnet}: {timing.scanned} hosts, median RTT {rtt}, response rate {format_rate(timing.response_rate())}, "
+                f"avg {average:.1f}s per host, final {timing.params}"
+            )
+        return lines
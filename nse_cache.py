@@ -0,0 +1,52 @@
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Function to fingerprint a port from its version-detection line (state, service and version)
+def service_fingerprint(port_line):
+    return hashlib.sha1(" ".join(port_line.split()[1:]).encode()).hexdigest()
+
+# SQLite cache of NSE script output keyed by host, port (or "host" for host scripts), script ID and service fingerprint
+class NseCache:
+    def __init__(self, path, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS nse_results (host TEXT, port TEXT, script_id TEXT, fingerprint TEXT, "
+            "output TEXT, scanned_at REAL, PRIMARY KEY (host, port, script_id))"
+        )
+
+    # Return (output, scanned_at) when a fresh result for the same service fingerprint exists, else None
+    def get(self, host, port, script, fingerprint):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT output, scanned_at FROM nse_results WHERE host = ? AND port = ? AND script_id = ? AND fingerprint = ?",
+                (host, port, script, fingerprint),
+            ).fetchone()
+            if row and time.time() - row[1] <= self.ttl_seconds:
+                self.hits += 1
+                return row
+            self.misses += 1
+            return None
+
+    # Function to store many (host, port, script, fingerprint, output) results in one transaction
+    def put_many(self, rows):
+        scanned_at = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO nse_results VALUES (?, ?, ?, ?, ?, ?)",
+                [(*row, scanned_at) for row in rows],
+            )
+            self.db.commit()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self):
+        with self.lock:
+            self.db.close()
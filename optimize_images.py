@@ -0,0 +1,126 @@
+import os
+import io
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+from PIL import Image, ImageChops, ImageStat
+
+IMAGE_EXTENSIONS = ('.png',)
+
+# Function to collect PNGs from files and folders given on the command line
+def find_images(paths):
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                images.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            images.append(path)
+    return images
+
+# Function to compare a candidate encoding with the original pixels: (largest channel difference, mean difference)
+def pixel_error(original, encoded_bytes):
+    with Image.open(io.BytesIO(encoded_bytes)) as encoded:
+        difference = ImageChops.difference(original, encoded.convert(original.mode))
+    largest = max(high for _, high in difference.getextrema())
+    mean = sum(ImageStat.Stat(difference).mean) / len(original.getbands())
+    return largest, mean
+
+def encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+# Function to build the palette version: exact when the image has at most 256 colours, quantized otherwise
+def palette_candidate(image, lossless):
+    if image.mode == "RGBA":
+        return None  # Screenshots have no transparency; leave anything that does alone
+    if image.getcolors(maxcolors=256) is not None:
+        return image.convert("P", palette=Image.Palette.ADAPTIVE, colors=256)
+    if lossless:
+        return None
+    return image.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+
+# Function to optimize one image in a worker process; the file is only replaced by a smaller, verified encoding
+def optimize_image(path, webp=False, lossless=False, max_delta=48, max_mean=1.0):
+    result = {"path": path, "before": os.path.getsize(path), "after": None, "mode": "unchanged", "error": None}
+    try:
+        with Image.open(path) as source:
+            original = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+
+        candidates = []
+        if webp:
+            candidates.append(("webp", encode(original, "WEBP", lossless=True, quality=100, method=4), ".webp"))
+        else:
+            palette = palette_candidate(original, lossless)
+            if palette is not None:
+                candidates.append(("palette", encode(palette, "PNG", optimize=True), ".png"))
+            candidates.append(("recompressed", encode(original, "PNG", optimize=True), ".png"))
+
+        for mode, data, extension in sorted(candidates, key=lambda candidate: len(candidate[1])):
+            if len(data) >= result["before"]:
+                break
+            largest, mean = pixel_error(original, data)
+            lossless_mode = mode != "palette" or original.getcolors(maxcolors=256) is not None
+            if (lossless_mode and largest) or largest > max_delta or mean > max_mean:
+                continue  # Fidelity check failed, try the next (larger) candidate
+
+            output_path = os.path.splitext(path)[0] + extension
+            temp_path = f"{output_path}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, output_path)
+            if output_path != path:
+                os.remove(path)
+            result.update(path=output_path, after=len(data), mode=mode)
+            break
+    except Exception as e:
+        result["error"] = str(e)
+    if result["after"] is None:
+        result["after"] = result["before"]
+    return result
+
+def optimize_images(paths, workers=None, webp=False, lossless=False, max_delta=48, max_mean=1.0):
+    images = find_images(paths)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = executor.map(optimize_image, images, [webp] * len(images), [lossless] * len(images),
+                               [max_delta] * len(images), [max_mean] * len(images), chunksize=4)
+        for result in tqdm(futures, total=len(images), desc="Optimizing images", unit="img"):
+            results.append(result)
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Palette-quantize and recompress screenshot PNGs in place, optionally as lossless WebP")
+    parser.add_argument("paths", nargs="+", help="PNG files or folders to optimize (searched recursively)")
+    parser.add_argument("--webp", action="store_true", help="Convert to lossless WebP instead of optimized PNG")
+    parser.add_argument("--lossless", action="store_true", help="Only exact palettes and lossless recompression, never quantize")
+    parser.add_argument("--max-delta", type=int, default=48, help="Largest channel difference allowed for a quantized image")
+    parser.add_argument("--max-mean", type=float, default=1.0, help="Mean channel difference allowed for a quantized image")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: CPU count)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    results = optimize_images(args.paths, args.workers, args.webp, args.lossless, args.max_delta, args.max_mean)
+    elapsed_time = time.time() - start_time
+
+    before = sum(result["before"] for result in results)
+    after = sum(result["after"] for result in results)
+    modes = {}
+    for result in results:
+        modes[result["mode"]] = modes.get(result["mode"], 0) + 1
+    errors = [result for result in results if result["error"]]
+
+    print("\nOptimization Summary:")
+    print(f"Images processed: {len(results)} (" + ", ".join(f"{mode}={count}" for mode, count in sorted(modes.items())) + ")")
+    print(f"Size: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB, saved {(before - after) / 1024 / 1024:.1f} MB"
+          f" ({(before - after) / before * 100 if before else 0:.1f}%)")
+    print(f"Time taken: {elapsed_time:.2f} seconds ({len(results) / elapsed_time if elapsed_time else 0:.1f} images/s)")
+    for result in errors:
+        print(f"Image: {result['path']} - Error: {result['error']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,76 @@
 import os
-import pandas as pd
+import re
+import time
 import textwrap
+import pickle
+import argparse
+import shutil
+import tempfile
+import pandas as pd
 import imgkit
 from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from evidence_store import EvidenceStore
+from results_db import ResultsDB
+from merge_exports import export_paths, merge_frames, read_export
+from run_metrics import METRICS, timed, run_profiled
 
-# Function to create screenshots with HTML and CSS
-def create_screenshot(ip, vuln_name, protocol, port, plugin_output, output_dir):
-    # Create directory for the IP if it doesn't exist
-    ip_dir = os.path.join(output_dir, ip)
-    os.makedirs(ip_dir, exist_ok=True)
+# Columns needed for rendering and filtering; everything else in the export is ignored
+INDEX_COLUMNS = ['Plugin ID', 'Risk', 'Host', 'Protocol', 'Port', 'Name', 'Plugin Output']
 
-    # Truncate the vulnerability name if too long
-    vuln_filename = vuln_name[:50] + '...' if len(vuln_name) > 50 else vuln_name
-    vuln_filename = vuln_filename.replace(" ", "_").replace("/", "_")
+# Rough cost of one wkhtmltoimage render, used when nothing was rendered in this run
+DEFAULT_RENDER_SECONDS = 0.8
+
+# Plugin output longer than this many wrapped lines is split into _part1, _part2, ... images
+MAX_LINES_PER_PAGE = 120
+PAGE_WORKERS = 4
+
+# Whitespace as textwrap sees it (string.whitespace), and other whitespace such as a no-break space,
+# which textwrap keeps inside words but still strips from line ends, so only a whole-text wrap reproduces it
+WRAP_WHITESPACE = "\t\n\x0b\x0c\r "
+OTHER_WHITESPACE = re.compile(r'[^\S\t\n\x0b\x0c\r ]')
+
+# Function to lazily wrap the plugin output into lines of at most `width` characters, giving exactly
+# textwrap.wrap's lines. The text is wrapped a segment of whole lines at a time: trailing whitespace
+# moves on to the next segment and the last wrapped line is carried over, so greedy filling is unchanged
+def iter_wrapped_lines(text, width=95, segment_chars=64 * 1024):
+    wrapper = textwrap.TextWrapper(width=width)
+    if OTHER_WHITESPACE.search(text):
+        yield from wrapper.wrap(text)
+        return
+    carry = ""
+    tail = ""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + segment_chars)
+        end = len(text) if end < 0 else end + 1
+        expanded = tail + text[start:end].expandtabs()
+        start = end
+        body = expanded.rstrip(WRAP_WHITESPACE) if start < len(text) else expanded
+        tail = expanded[len(body):]
+        lines = wrapper.wrap(carry + body)
+        carry = lines.pop() if lines and start < len(text) else ""
+        yield from lines
+    if carry:
+        yield carry
 
-    # Wrap the plugin output text
-    wrapped_output = "<br>".join(textwrap.wrap(plugin_output, width=95))
+# Function to group wrapped lines into fixed-height pages
+def iter_pages(lines, max_lines_per_page=MAX_LINES_PER_PAGE):
+    page = []
+    for line in lines:
+        page.append(line)
+        if len(page) == max_lines_per_page:
+            yield page
+            page = []
+    if page:
+        yield page
 
-    # HTML content
-    html_content = f"""
+# Function to build the HTML for one page of plugin output
+def build_page_html(protocol, port, page_lines, page_number, page_total):
+    wrapped_output = "<br>".join(page_lines)
+    page_label = f" (page {page_number}/{page_total})" if page_total > 1 else ""
+
+    return f"""
     <html>
     <head>
         <style>
@@ -42,7 +94,7 @@ def create_screenshot(ip, vuln_name, protocol, port, plugin_output, output_dir):
         </style>
     </head>
     <body>
-        <h3><b>Plugin Output</b></h3>
+        <h3><b>Plugin Output{page_label}</b></h3>
         <hr>
         <p><b>{protocol}/{port}</b></p>
         <div class="code-block">{wrapped_output}</div>
@@ -50,6 +102,9 @@ def create_screenshot(ip, vuln_name, protocol, port, plugin_output, output_dir):
     </html>
     """
 
+# Function to render one HTML page to PNG
+@timed("render_page")
+def render_page(html_content, screenshot_path):
     # Options to disable external resource loading
     options = {
         'no-images': '',
@@ -57,11 +112,49 @@ def create_screenshot(ip, vuln_name, protocol, port, plugin_output, output_dir):
     }
 
     # Convert HTML to PNG using imgkit
-    screenshot_path = os.path.join(ip_dir, f'{vuln_filename}.png')
     imgkit.from_string(html_content, screenshot_path, options=options)
+    return screenshot_path
+
+# Function to create screenshots with HTML and CSS, one PNG per page of plugin output
+@timed("create_screenshot", host_arg=0)
+def create_screenshot(ip, vuln_name, protocol, port, plugin_output, output_dir, page_workers=PAGE_WORKERS):
+    # Create directory for the IP if it doesn't exist
+    ip_dir = os.path.join(output_dir, ip)
+    os.makedirs(ip_dir, exist_ok=True)
+
+    # Truncate the vulnerability name if too long
+    vuln_filename = vuln_name[:50] + '...' if len(vuln_name) > 50 else vuln_name
+    vuln_filename = vuln_filename.replace(" ", "_").replace("/", "_")
+
+    # Count pages in a first lazy pass so page labels are known before anything is rendered
+    page_total = max(1, sum(1 for _ in iter_pages(iter_wrapped_lines(plugin_output))))
+    if page_total == 1:
+        page_lines = next(iter_pages(iter_wrapped_lines(plugin_output)), [])
+        html_content = build_page_html(protocol, port, page_lines, 1, 1)
+        return [render_page(html_content, os.path.join(ip_dir, f'{vuln_filename}.png'))]
+
+    # Render pages in parallel while keeping only a bounded number of pages in memory
+    screenshot_paths = {}
+    pending = {}
+    with ThreadPoolExecutor(max_workers=page_workers) as executor:
+        for page_number, page_lines in enumerate(iter_pages(iter_wrapped_lines(plugin_output)), start=1):
+            if len(pending) >= page_workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    screenshot_paths[pending.pop(future)] = future.result()
+            html_content = build_page_html(protocol, port, page_lines, page_number, page_total)
+            screenshot_path = os.path.join(ip_dir, f'{vuln_filename}_part{page_number}.png')
+            pending[executor.submit(render_page, html_content, screenshot_path)] = page_number
+        for future, page_number in pending.items():
+            screenshot_paths[page_number] = future.result()
+
+    # In page order; sorting the paths as text would put _part10 before _part2
+    return [screenshot_paths[page_number] for page_number in sorted(screenshot_paths)]
 
 # Function to process each IP and its associated vulnerabilities
 def process_ip(ip, vulnerabilities, output_dir):
+    render_count = 0
+    render_seconds = 0.0
     for index, row in vulnerabilities.iterrows():
         vuln_name = row['Name']
         protocol = row['Protocol']
@@ -72,12 +165,124 @@ def process_ip(ip, vulnerabilities, output_dir):
         if pd.isna(plugin_output):
             plugin_output = ""
         
+        render_start = time.time()
         create_screenshot(ip, vuln_name, protocol, port, plugin_output, output_dir)
+        render_seconds += time.time() - render_start
+        render_count += 1
+
+    return render_count, render_seconds, METRICS.drain()  # Spans recorded in this worker go back to the parent
+
+# Function to load the export through a column-pruned index cached next to the CSV
+@timed("parse_csv")
+def load_export_index(input_csv):
+    stat = os.stat(input_csv)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    index_file = f"{input_csv}.idx"
+
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'rb') as file:
+                cached_signature, df = pickle.load(file)
+            if cached_signature == signature:
+                return df
+        except Exception:
+            pass  # Stale or unreadable index, rebuild it below
+
+    df = read_export(input_csv, usecols=INDEX_COLUMNS)
+    missing = [column for column in INDEX_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"{input_csv} is missing the column(s) {', '.join(missing)}; is it a Nessus CSV export?")
+    df['Risk'] = df['Risk'].fillna('None').astype('category')
+    df['Port'] = pd.to_numeric(df['Port'], errors='coerce').fillna(0).astype(int)
+    df['Plugin ID'] = pd.to_numeric(df['Plugin ID'], errors='coerce').fillna(0).astype(int)
+
+    try:
+        with open(index_file, 'wb') as file:
+            pickle.dump((signature, df), file, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass  # Read-only export folder, the index is only an optimization
+
+    return df
+
+# Function to load several overlapping exports as one, keeping the newest finding per host/plugin/port/protocol
+@timed("merge_exports")
+def load_merged_index(input_csvs):
+    csv_files = export_paths(input_csvs)
+    frames = [load_export_index(csv_file) for csv_file in csv_files]
+    df = merge_frames(frames)
+    df['Risk'] = df['Risk'].astype('category')
+    rows_read = sum(len(frame) for frame in frames)
+    print(f"Merged {len(csv_files)} exports: {rows_read} rows, {len(df)} unique findings, {rows_read - len(df)} duplicates dropped")
+    return df
+
+# Function to split comma separated option values, reading @file arguments line by line
+def split_option(values):
+    items = []
+    for value in values or []:
+        if value.startswith('@'):
+            with open(value[1:], 'r') as file:
+                items.extend(line.strip() for line in file if line.strip())
+        else:
+            items.extend(item.strip() for item in value.split(',') if item.strip())
+    return items
+
+# Function to apply the query options to the export before it is partitioned by host
+@timed("filter_findings")
+def filter_findings(df, severities=None, plugin_ids=None, name_pattern=None, hosts=None, ports=None):
+    mask = pd.Series(True, index=df.index)
+
+    if severities:
+        # Nessus reports informational findings with a Risk of "None"
+        wanted = {'none' if severity.lower() == 'info' else severity.lower() for severity in severities}
+        mask &= df['Risk'].astype(str).str.lower().isin(wanted)
+    if plugin_ids:
+        mask &= df['Plugin ID'].isin([int(plugin_id) for plugin_id in plugin_ids])
+    if name_pattern:
+        mask &= df['Name'].str.contains(name_pattern, flags=re.IGNORECASE, regex=True, na=False)
+    if hosts:
+        mask &= df['Host'].isin(set(hosts))
+    if ports:
+        mask &= df['Port'].isin([int(port) for port in ports])
+
+    return df[mask]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render Nessus Plugin Output screenshots per host")
+    parser.add_argument("csv", nargs="*", help="Nessus CSV exports or folders; several are merged, newest export wins (prompted for when omitted)")
+    parser.add_argument("--severity", action="append", help="Risk levels to render, e.g. critical,high (info = Risk None)")
+    parser.add_argument("--plugin-id", action="append", help="Plugin IDs to render, comma separated or @file")
+    parser.add_argument("--name", help="Regular expression matched against the plugin name")
+    parser.add_argument("--hosts", action="append", help="Hosts to render, comma separated or @file")
+    parser.add_argument("--port", action="append", help="Ports to render, comma separated")
+    parser.add_argument("--output-dir", default="./screenshots", help="Directory to save the screenshots")
+    parser.add_argument("--processes", type=int, default=3, help="Number of render processes")
+    parser.add_argument("--store", help="Pack screenshots into this evidence store instead of loose files")
+    parser.add_argument("--db", help="Also write the findings to this SQLite results database")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings as JSON and a Prometheus textfile to this folder")
+    parser.add_argument("--cprofile", help="Profile the run with cProfile and save the stats to this file")
+    return parser.parse_args()
+
+def main(args):
 
-def main():
     # Load the CSV file
-    input_csv = input("Enter the path to the CSV file: ")
-    df = pd.read_csv(input_csv)
+    input_csvs = args.csv or [input("Enter the path to the CSV file: ")]
+    try:
+        if len(input_csvs) == 1 and not os.path.isdir(input_csvs[0]):
+            df = load_export_index(input_csvs[0])
+        else:
+            df = load_merged_index(input_csvs)
+    except ValueError as e:
+        print(e)
+        return
+
+    if args.db:
+        results_db = ResultsDB(args.db)
+        results_db.start_run("plugin")
+        results_db.add_findings(zip(
+            df['Host'].astype(str).str.strip(), df['Plugin ID'], df['Name'].astype(str).str.strip(),
+            df['Risk'].astype(str), df['Port'], df['Protocol'].astype(str),
+        ))
+        results_db.close()
 
     # Use the correct column names based on your CSV file
     ip_column = 'Host'
@@ -86,21 +291,64 @@ def main():
     protocol_column = 'Protocol'
     port_column = 'Port'
 
+    # Push the query filters down before partitioning so skipped rows are never rendered
+    selected = filter_findings(
+        df,
+        severities=split_option(args.severity),
+        plugin_ids=split_option(args.plugin_id),
+        name_pattern=args.name,
+        hosts=split_option(args.hosts),
+        ports=split_option(args.port),
+    )
+    skipped_renders = len(df) - len(selected)
+
     # Pre-process and extract necessary columns
-    ip_addresses = df[ip_column].unique()
-    vulnerabilities = df[[ip_column, plugin_name_column, plugin_output_column, protocol_column, port_column]]
+    vulnerabilities = selected[[ip_column, plugin_name_column, plugin_output_column, protocol_column, port_column]]
 
-    # Directory to save the screenshots
-    output_dir = './screenshots'
+    # Directory to save the screenshots; with a store they are rendered to local scratch space and packed afterwards
+    output_dir = tempfile.mkdtemp(prefix="evidence-") if args.store else args.output_dir
     os.makedirs(output_dir, exist_ok=True)
 
     # Use multiprocessing to process each IP in parallel
-    ip_process_info = [(ip, vulnerabilities[vulnerabilities[ip_column] == ip], output_dir) for ip in ip_addresses]
+    ip_process_info = [(ip, group, output_dir) for ip, group in vulnerabilities.groupby(ip_column, sort=False)]
+
+    results = []
+    failed_ips = {}
+    with Pool(processes=args.processes) as pool:  # Adjust the number of processes if needed
+        pending = {ip: pool.apply_async(process_ip, (ip, group, host_dir)) for ip, group, host_dir in ip_process_info}
+        for ip, result in pending.items():
+            try:
+                results.append(result.get())
+            except Exception as e:
+                failed_ips[ip] = f"Exception: {e}"  # One failed host must not abort the export
 
-    with Pool(processes=3) as pool:  # Adjust the number of processes if needed
-        pool.starmap(process_ip, ip_process_info)
+    if args.store:
+        store = EvidenceStore(args.store)
+        store.ingest_dir(output_dir, os.path.basename(os.path.normpath(args.output_dir)))
+        store.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    render_count = sum(count for count, _, _ in results)
+    render_seconds = sum(seconds for _, seconds, _ in results)
+    for _, _, spans in results:
+        METRICS.merge(spans)
+    average_render = render_seconds / render_count if render_count else DEFAULT_RENDER_SECONDS
 
     print("Screenshots created successfully.")
+    print(f"Rendered: {render_count} of {len(df)} findings")
+    print(f"Skipped renders: {skipped_renders}")
+    print(f"Estimated time saved: {skipped_renders * average_render:.2f} seconds of render time")
+    if failed_ips:
+        print(f"\nIPs with errors or no screenshot: {len(failed_ips)}")
+        for ip, status in failed_ips.items():
+            print(f"IP: {ip} - Status: {status}")
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "plugin")
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.cprofile:
+        run_profiled(args.cprofile, main, args)
+    else:
+        main(args)
@@ -0,0 +1,51 @@
+import asyncio
+import resource
+import time
+
+# Function to split an ip.txt entry into host and port, falling back to the tool's default port
+def split_target(target, default_port):
+    host, sep, port = target.rpartition(":")
+    if sep and host and port.isdigit() and ":" not in host:
+        return host, int(port)
+    return target, default_port
+
+# Function to attempt one non-blocking TCP connect and return the failure reason, or None if it connected
+async def probe(host, port, timeout, semaphore):
+    async with semaphore:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except asyncio.TimeoutError:
+            return f"timeout after {timeout}s on port {port}"
+        except ConnectionRefusedError:
+            return f"connection refused on port {port}"
+        except OSError as e:
+            return f"{e.strerror or e} on port {port}"
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return None
+
+async def sweep_async(targets, timeout, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    reasons = await asyncio.gather(*(probe(host, port, timeout, semaphore) for host, port in targets))
+    return dict(zip(targets, reasons))
+
+# Function to keep concurrent sockets well below the open file limit
+def max_concurrency(requested):
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return max(1, min(requested, soft_limit - 64))
+
+# Function to sweep targets and split them into reachable ones and unreachable ones with a reason
+def sweep(targets, default_port=443, timeout=2.0, concurrency=2000):
+    endpoints = {target: split_target(target, default_port) for target in targets}
+    start_time = time.time()
+    results = asyncio.run(sweep_async(sorted(set(endpoints.values())), timeout, max_concurrency(concurrency)))
+    elapsed_time = time.time() - start_time
+
+    reachable = [target for target in targets if results[endpoints[target]] is None]
+    unreachable = {target: results[endpoints[target]] for target in targets if results[endpoints[target]] is not None}
+    rate = len(endpoints) / elapsed_time if elapsed_time else 0.0
+    print(f"Pre-flight: {len(reachable)} of {len(targets)} targets reachable ({elapsed_time:.2f}s, {rate:.0f} targets/s)")
+    return reachable, unreachable
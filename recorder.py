@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import time
+import threading
+
+RECORDINGS_FOLDER = "recordings"
+
+# Function to create a new recording file; names sort chronologically, and runs started in the same
+# microsecond (parallel runners, several queue runs in one worker) get a numbered suffix instead of sharing a file
+def create_recording_file(directory, tool):
+    now = time.time()
+    stem = os.path.join(directory, f"{tool}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1e6) % 1000000:06d}")
+    suffix = ""
+    attempt = 1
+    while True:
+        try:
+            return f"{stem}{suffix}.jsonl", open(f"{stem}{suffix}.jsonl", "x")
+        except FileExistsError:
+            attempt += 1
+            suffix = f"_{attempt}"  # "_" sorts after ".", so the numbered files list after the first
+
+# Append-only JSON Lines log of one run: a header with the tool and arguments, then one
+# record per host with the command, its timing and the raw stdout or JSON report
+class RunRecorder:
+    def __init__(self, tool, folder, extra=None, directory=RECORDINGS_FOLDER):
+        os.makedirs(directory, exist_ok=True)
+        self.path, self.file = create_recording_file(directory, tool)
+        self.lock = threading.Lock()
+        header = {"type": "run", "tool": tool, "folder": folder, "argv": sys.argv, "started": time.time()}
+        header.update(extra or {})
+        self._write(header)
+
+    def _write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def record(self, ip, command, started, finished, stdout=None, json_data=None):
+        entry = {"type": "host", "ip": ip, "command": command, "started": started, "finished": finished}
+        if stdout is not None:
+            entry["stdout"] = stdout
+        if json_data is not None:
+            entry["json"] = json_data
+        self._write(entry)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+# Function to read a recording back as (header, host records)
+def load_recording(path):
+    header = None
+    hosts = []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("type") == "run":
+                header = entry
+            else:
+                hosts.append(entry)
+    if header is None:
+        raise ValueError(f"{path} is not a run recording")
+    return header, hosts
@@ -0,0 +1,63 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+from recorder import load_recording
+from runners import load_runner
+
+_runner = None
+_header = None
+
+def init_worker(tool, header):
+    global _runner, _header
+    _runner = load_runner(tool)
+    _header = header
+
+# Function to rebuild the screenshots of one recorded host without rescanning it
+def replay_host(record, folder):
+    _runner.render_recording(record, folder, _header)
+    return record["ip"]
+
+def replay_recording(path, folder=None, workers=None):
+    header, hosts = load_recording(path)
+    folder = folder or header["folder"]
+    os.makedirs(folder, exist_ok=True)
+    failed = {}
+
+    with tqdm(total=len(hosts), desc=f"Replaying {os.path.basename(path)}", unit="IP") as pbar:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(header["tool"], header)) as executor:
+            futures = {executor.submit(replay_host, record, folder): record["ip"] for record in hosts}
+            for future in as_completed(futures):
+                pbar.update(1)
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[futures[future]] = f"Error: {e}"
+
+    return len(hosts), failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-render screenshots from recorded raw scanner output without rescanning")
+    parser.add_argument("recordings", nargs="+", help="Recording files from the recordings/ folder")
+    parser.add_argument("--folder", help="Output folder (default: the folder the original run used)")
+    parser.add_argument("--workers", type=int, help="Number of render processes (default: CPU count)")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    total_hosts = 0
+    failed = {}
+    for path in args.recordings:
+        count, recording_failed = replay_recording(path, args.folder, args.workers)
+        total_hosts += count
+        failed.update(recording_failed)
+    elapsed_time = time.time() - start_time
+
+    print("\nReplay Summary:")
+    print(f"Hosts replayed: {total_hosts - len(failed)} of {total_hosts}")
+    print(f"Time taken: {elapsed_time:.2f} seconds ({total_hosts / elapsed_time if elapsed_time else 0:.1f} hosts/s)")
+    for ip, status in failed.items():
+        print(f"IP: {ip} - Status: {status}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import re
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from nmap_output import PORT_LINE, split_port_blocks, split_script_blocks
+
+TLS_PROTOCOL = re.compile(r'^\s*(SSLv2|SSLv3|TLSv1\.[0-3])\s+(enabled|disabled)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, tool TEXT, started REAL, argv TEXT);
+CREATE TABLE IF NOT EXISTS ports (run_id INTEGER, host TEXT, port INTEGER, proto TEXT, state TEXT, service TEXT, observed REAL);
+CREATE TABLE IF NOT EXISTS script_results (run_id INTEGER, host TEXT, port TEXT, script_id TEXT, output TEXT, observed REAL);
+CREATE TABLE IF NOT EXISTS tls_protocols (run_id INTEGER, host TEXT, protocol TEXT, enabled INTEGER, observed REAL);
+CREATE TABLE IF NOT EXISTS http_paths (run_id INTEGER, host TEXT, url TEXT, status INTEGER, size INTEGER, observed REAL);
+CREATE TABLE IF NOT EXISTS findings (run_id INTEGER, host TEXT, plugin_id INTEGER, name TEXT, risk TEXT, port INTEGER, proto TEXT, observed REAL);
+CREATE TABLE IF NOT EXISTS compliance (run_id INTEGER, host TEXT, checklist TEXT, result TEXT, actual_value TEXT, observed REAL);
+CREATE INDEX IF NOT EXISTS ports_host ON ports (host, observed);
+CREATE INDEX IF NOT EXISTS ports_port ON ports (port, state);
+CREATE INDEX IF NOT EXISTS ports_latest ON ports (host, port, proto, observed);
+CREATE INDEX IF NOT EXISTS scripts_id ON script_results (script_id, host);
+CREATE INDEX IF NOT EXISTS tls_host ON tls_protocols (host, observed);
+CREATE INDEX IF NOT EXISTS tls_protocol ON tls_protocols (protocol, enabled);
+CREATE INDEX IF NOT EXISTS paths_url ON http_paths (host, url, observed);
+CREATE INDEX IF NOT EXISTS paths_status ON http_paths (status, observed);
+CREATE INDEX IF NOT EXISTS findings_host ON findings (host, observed);
+CREATE INDEX IF NOT EXISTS findings_plugin ON findings (plugin_id);
+CREATE INDEX IF NOT EXISTS findings_risk ON findings (risk);
+CREATE INDEX IF NOT EXISTS compliance_host ON compliance (host, checklist, observed);
+CREATE INDEX IF NOT EXISTS compliance_result ON compliance (result);
+"""
+
+# Structured results of every tool and run in one indexed SQLite file; each writer process opens
+# it once, starts a run and adds rows per host as results arrive
+class ResultsDB:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.executescript(SCHEMA)
+        self.run_id = None
+
+    def start_run(self, tool):
+        with self.lock:
+            cursor = self.db.execute("INSERT INTO runs (tool, started, argv) VALUES (?, ?, ?)",
+                                     (tool, time.time(), " ".join(sys.argv)))
+            self.db.commit()
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    # Each add_* call writes its rows in one transaction, so the write lock is only held for a single
+    # host and a crash loses at most the host being written
+    def _insert(self, *statements):
+        with self.lock:
+            for sql, rows in statements:
+                self.db.executemany(sql, rows)
+            self.db.commit()
+
+    # nmap normal output: port states plus NSE script output per port and host. Each scan of a host
+    # (e.g. the baseline and fragmented phases of a two-phase scan) is added separately, in scan order
+    def add_nmap(self, host, output, observed=None):
+        observed = observed or time.time()
+        port_rows = []
+        for line in output.splitlines():
+            match = PORT_LINE.match(line)
+            if match:
+                fields = line.split(None, 3)
+                service = fields[2] if len(fields) > 2 else ""
+                port_rows.append((self.run_id, host, int(match.group(1)), match.group(2), match.group(3), service, observed))
+
+        script_rows = []
+        port_blocks, host_script_lines = split_port_blocks(output)
+        for port, lines in list(port_blocks.items()) + [("host", host_script_lines)]:
+            for kind, script_id, block in split_script_blocks("\n".join(lines)):
+                if kind == "script":
+                    script_rows.append((self.run_id, host, port, script_id, "\n".join(block), observed))
+        self._insert(
+            ("INSERT INTO ports VALUES (?, ?, ?, ?, ?, ?, ?)", port_rows),
+            ("INSERT INTO script_results VALUES (?, ?, ?, ?, ?, ?)", script_rows),
+        )
+
+    # sslscan output: enabled/disabled state of each SSL/TLS protocol version
+    def add_sslscan(self, host, output):
+        observed = time.time()
+        rows = []
+        for line in output.splitlines():
+            match = TLS_PROTOCOL.match(line)
+            if match:
+                rows.append((self.run_id, host, match.group(1), int(match.group(2) == "enabled"), observed))
+        self._insert(("INSERT INTO tls_protocols VALUES (?, ?, ?, ?, ?)", rows))
+
+    # dirsearch JSON report: every path found with its status and size
+    def add_dirsearch(self, host, json_data):
+        observed = time.time()
+        rows = [
+            (self.run_id, host, result.get("url"), result.get("status"), result.get("content-length"), observed)
+            for result in json_data.get("results", [])
+        ]
+        self._insert(("INSERT INTO http_paths VALUES (?, ?, ?, ?, ?, ?)", rows))
+
+    # Nessus findings as (host, plugin ID, name, risk, port, protocol) tuples
+    def add_findings(self, findings):
+        observed = time.time()
+        self._insert((
+            "INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((self.run_id, *finding, observed) for finding in findings),
+        ))
+
+    # config_va.py compliance checks as (host, checklist, result, actual value) tuples
+    def add_compliance(self, checks):
+        observed = time.time()
+        self._insert((
+            "INSERT INTO compliance VALUES (?, ?, ?, ?, ?, ?)",
+            ((self.run_id, *check, observed) for check in checks),
+        ))
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+# Function to parse a --since value given as YYYY-MM-DD or as a number of days ago, e.g. 30d
+def parse_since(value):
+    if value.endswith("d") and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * 86400
+    return datetime.strptime(value, "%Y-%m-%d").timestamp()
+
+# Hosts whose most recent sslscan still offers the protocol
+def query_tls(db, args):
+    return db.execute(
+        "SELECT t.host, datetime(t.observed, 'unixepoch', 'localtime') FROM tls_protocols t "
+        "JOIN (SELECT host, MAX(observed) AS last FROM tls_protocols GROUP BY host) latest "
+        "ON latest.host = t.host AND latest.last = t.observed "
+        "WHERE t.protocol = ? AND t.enabled = 1 ORDER BY t.host",
+        (args.protocol,),
+    ).fetchall()
+
+# Paths with the given status that were first seen after the cut-off
+def query_new_paths(db, args):
+    return db.execute(
+        "SELECT host, url, datetime(MIN(observed), 'unixepoch', 'localtime') AS first_seen FROM http_paths "
+        "WHERE status = ? GROUP BY host, url HAVING MIN(observed) >= ? ORDER BY host, url",
+        (args.status, parse_since(args.since)),
+    ).fetchall()
+
+# Hosts whose most recent scan of the port reported it in the given state; the latest observation
+# is taken per port, so a later scan limited with -p does not hide the ports it did not cover
+def query_ports(db, args):
+    return db.execute(
+        "SELECT p.host, p.port || '/' || p.proto, p.state, p.service FROM ports p "
+        "JOIN (SELECT host, proto, MAX(observed) AS last FROM ports WHERE port = ? GROUP BY host, proto) latest "
+        "ON latest.host = p.host AND latest.proto = p.proto AND latest.last = p.observed "
+        "WHERE p.port = ? AND p.state = ? ORDER BY p.host",
+        (args.port, args.port, args.state),
+    ).fetchall()
+
+# Nessus findings in the most recent import of each host, by risk and optional plugin ID or name
+# fragment; a finding fixed in a later scan is no longer reported
+def query_findings(db, args):
+    sql = ("SELECT DISTINCT f.host, f.plugin_id, f.name, f.risk, f.port FROM findings f "
+           "JOIN (SELECT host, MAX(observed) AS last FROM findings GROUP BY host) latest "
+           "ON latest.host = f.host AND latest.last = f.observed WHERE 1 = 1")
+    params = []
+    if args.risk:
+        sql += " AND f.risk = ?"
+        params.append(args.risk)
+    if args.plugin_id:
+        sql += " AND f.plugin_id = ?"
+        params.append(args.plugin_id)
+    if args.name:
+        sql += " AND f.name LIKE ?"
+        params.append(f"%{args.name}%")
+    return db.execute(sql + " ORDER BY f.host", params).fetchall()
+
+# Compliance checks whose most recent result matches, optionally by checklist title fragment
+def query_compliance(db, args):
+    sql = ("SELECT c.host, c.checklist, c.result, c.actual_value FROM compliance c "
+           "JOIN (SELECT host, checklist, MAX(observed) AS last FROM compliance GROUP BY host, checklist) latest "
+           "ON latest.host = c.host AND latest.checklist = c.checklist AND latest.last = c.observed "
+           "WHERE c.result = ?")
+    params = [args.result]
+    if args.checklist:
+        sql += " AND c.checklist LIKE ?"
+        params.append(f"%{args.checklist}%")
+    return db.execute(sql + " ORDER BY c.host, c.checklist", params).fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query scan results stored by the runners with --db")
+    parser.add_argument("--db", default="results.db", help="Results database")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+
+    tls_parser = subparsers.add_parser("tls", help="Hosts that still offer a protocol, e.g. TLSv1.0")
+    tls_parser.add_argument("--protocol", default="TLSv1.0")
+    tls_parser.set_defaults(handler=query_tls)
+
+    paths_parser = subparsers.add_parser("new-paths", help="HTTP paths first seen since a date")
+    paths_parser.add_argument("--since", default="30d", help="YYYY-MM-DD or number of days, e.g. 30d")
+    paths_parser.add_argument("--status", type=int, default=200)
+    paths_parser.set_defaults(handler=query_new_paths)
+
+    ports_parser = subparsers.add_parser("ports", help="Hosts with a port in a given state")
+    ports_parser.add_argument("--port", type=int, required=True)
+    ports_parser.add_argument("--state", default="open")
+    ports_parser.set_defaults(handler=query_ports)
+
+    findings_parser = subparsers.add_parser("findings", help="Nessus findings by risk, plugin ID or name")
+    findings_parser.add_argument("--risk")
+    findings_parser.add_argument("--plugin-id", type=int)
+    findings_parser.add_argument("--name")
+    findings_parser.set_defaults(handler=query_findings)
+
+    compliance_parser = subparsers.add_parser("compliance", help="Compliance checks by latest result and checklist title")
+    compliance_parser.add_argument("--result", default="FAILED")
+    compliance_parser.add_argument("--checklist", help="Fragment of the checklist title")
+    compliance_parser.set_defaults(handler=query_compliance)
+
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    start_time = time.time()
+    rows = args.handler(db, args)
+    elapsed_time = time.time() - start_time
+    db.close()
+
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+    print(f"\n{len(rows)} rows in {elapsed_time * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
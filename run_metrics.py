@@ -0,0 +1,137 @@
+import os
+import math
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Function to pick the nearest-rank percentile from a sorted list of durations
+def percentile(sorted_values, quantile):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(quantile * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+# Collector of per-stage, per-host timing spans for one run
+class RunMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = []
+        self.started = time.time()
+        self.pid = os.getpid()
+
+    # Function to drop spans a forked worker inherited from its parent, so they are not sent back and counted twice
+    def _own_spans(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.spans = []
+        return self.spans
+
+    @contextmanager
+    def span(self, stage, host=None):
+        start = time.time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self._own_spans().append((stage, host, start, time.time() - start))
+
+    # Decorator recording a span per call; host_arg is the position of the argument naming the host
+    def timed(self, stage, host_arg=None):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                host = args[host_arg] if host_arg is not None and len(args) > host_arg else None
+                with self.span(stage, host):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # Spans recorded in a worker process are handed back to the parent with drain() and merge()
+    def drain(self):
+        with self.lock:
+            spans, self.spans = self._own_spans(), []
+        return spans
+
+    def merge(self, spans):
+        with self.lock:
+            self._own_spans().extend(tuple(span) for span in spans)
+
+    def summary(self):
+        stages = {}
+        with self.lock:
+            for stage, _, _, duration in self.spans:
+                stages.setdefault(stage, []).append(duration)
+        result = {}
+        for stage, durations in stages.items():
+            durations.sort()
+            result[stage] = {
+                "count": len(durations),
+                "sum": sum(durations),
+                "max": durations[-1],
+                **{f"p{int(quantile * 100)}": percentile(durations, quantile) for quantile in QUANTILES},
+            }
+        return result
+
+    def write_json(self, path, tool):
+        with self.lock:
+            spans = [{"stage": stage, "host": host, "start": start, "seconds": duration}
+                     for stage, host, start, duration in self.spans]
+        report = {"tool": tool, "started": self.started, "wall_seconds": time.time() - self.started,
+                  "stages": self.summary(), "spans": spans}
+        write_atomic(path, json.dumps(report, indent=2))
+
+    # Prometheus textfile collector format, one summary per stage
+    def write_prometheus(self, path, tool):
+        lines = [
+            "# HELP netscripts_stage_seconds Time spent per stage and host.",
+            "# TYPE netscripts_stage_seconds summary",
+        ]
+        for stage, stats in sorted(self.summary().items()):
+            labels = f'tool="{tool}",stage="{stage}"'
+            for quantile in QUANTILES:
+                lines.append(f'netscripts_stage_seconds{{{labels},quantile="{quantile}"}} {stats[f"p{int(quantile * 100)}"]:.6f}')
+            lines.append(f"netscripts_stage_seconds_sum{{{labels}}} {stats['sum']:.6f}")
+            lines.append(f"netscripts_stage_seconds_count{{{labels}}} {stats['count']}")
+        lines.append("# HELP netscripts_run_seconds Wall time of the run.")
+        lines.append("# TYPE netscripts_run_seconds gauge")
+        lines.append(f'netscripts_run_seconds{{tool="{tool}"}} {time.time() - self.started:.6f}')
+        write_atomic(path, "\n".join(lines) + "\n")
+
+    # Write <tool>-metrics.json and <tool>.prom into the metrics folder and print the stage table
+    def report(self, folder, tool):
+        os.makedirs(folder, exist_ok=True)
+        self.write_json(os.path.join(folder, f"{tool}-metrics.json"), tool)
+        self.write_prometheus(os.path.join(folder, f"{tool}.prom"), tool)
+        print("\nStage timings (seconds):")
+        for stage, stats in sorted(self.summary().items(), key=lambda item: -item[1]["sum"]):
+            print(f"  {stage:<24} n={stats['count']:<6} total={stats['sum']:.2f} p50={stats['p50']:.3f} "
+                  f"p90={stats['p90']:.3f} p99={stats['p99']:.3f} max={stats['max']:.3f}")
+
+# The textfile collector may read at any time, so write to a temporary file and rename it into place
+def write_atomic(path, content):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+METRICS = RunMetrics()
+
+def timed(stage, host_arg=None):
+    return METRICS.timed(stage, host_arg)
+
+# Function to run `func` under cProfile, saving the stats and printing the most expensive calls
+def run_profiled(path, func, *args, **kwargs):
+    import pstats
+    import cProfile  # Only loaded for --cprofile runs
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+        print(f"\ncProfile stats saved to {path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
@@ -0,0 +1,38 @@
+import os
+import sys
+import importlib.util
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tool name -> script file for the per-IP runners
+RUNNERS = {
+    "nmap_firewall": "2.nmap_firewall.py",
+    "nmap_nse": "3.nmap_nse.py",
+    "sslscan": "4.sslscan.py",
+    "dirsearch": "5.dirsearch.py",
+    "vuln_nse": "6.vuln_nse.py",
+}
+
+_loaded = {}
+
+# Function to import a script under a module name (the numbered file names are not importable directly).
+# The module is registered in sys.modules so classes defined in it survive pickling to worker processes.
+def load_script(name, filename):
+    if name not in _loaded:
+        path = os.path.join(SCRIPT_DIR, filename)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+        _loaded[name] = module
+    return _loaded[name]
+
+# Function to import a runner script by tool name
+def load_runner(tool):
+    if tool not in RUNNERS:
+        raise KeyError(f"Unknown tool '{tool}', expected one of: {', '.join(RUNNERS)}")
+    return load_script(f"runner_{tool}", RUNNERS[tool])
@@ -0,0 +1,126 @@
+import os
+import glob
+import json
+import time
+import heapq
+import asyncio
+import sqlite3
+import statistics
+from collections import Counter
+from recorder import RECORDINGS_FOLDER
+from preflight import split_target, sweep_async, max_concurrency
+
+# Assumed duration of a host nothing is known about, when no earlier run gives a better figure
+DEFAULT_HOST_SECONDS = 30.0
+
+# Ports the optional pre-probe connects to; the open count stands in for how much a scanner will find to do
+PROBE_PORTS = (21, 22, 23, 25, 53, 80, 110, 135, 139, 143, 443, 445, 993, 995, 1433, 1521, 3306, 3389,
+               5432, 5900, 6379, 8000, 8080, 8443, 9200, 27017)
+
+def add_arguments(parser):
+    parser.add_argument("--order", choices=("file", "cost"), default="file",
+                        help="Submit targets in ip.txt order, or longest expected first using earlier runs (cost)")
+    parser.add_argument("--cost-probe", action="store_true",
+                        help="With --order cost, connect-probe common ports of hosts no earlier run knows about")
+
+# Function to read per-target durations from earlier recordings of this tool; the newest recording wins
+def load_history(tool, directory=RECORDINGS_FOLDER):
+    durations = {}
+    for path in sorted(glob.glob(os.path.join(directory, f"{tool}-*.jsonl"))):
+        with open(path, "r") as file:
+            for line in file:
+                if '"type": "host"' not in line:
+                    continue  # Skip the header without decoding it
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Truncated last line of an interrupted run
+                if entry.get("started") and entry.get("finished"):
+                    durations[entry["ip"]] = entry["finished"] - entry["started"]
+    return durations
+
+# Function to count open ports per host from the results database of earlier runs
+def load_port_counts(db_path):
+    if not db_path or not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT host, COUNT(DISTINCT port || '/' || proto) FROM ports WHERE state = 'open' GROUP BY host").fetchall()
+    except sqlite3.OperationalError:
+        rows = []  # Not a results database
+    finally:
+        conn.close()
+    return dict(rows)
+
+# Function to count open common ports per host with a quick connect sweep
+def probe_port_counts(hosts, timeout=1.0, concurrency=2000):
+    endpoints = [(host, port) for host in hosts for port in PROBE_PORTS]
+    start_time = time.time()
+    results = asyncio.run(sweep_async(endpoints, timeout, max_concurrency(concurrency)))
+    counts = Counter(host for (host, _), reason in results.items() if reason is None)
+    print(f"Cost probe: {len(hosts)} hosts, {len(endpoints)} ports in {time.time() - start_time:.2f}s")
+    return {host: counts.get(host, 0) for host in hosts}
+
+# Function to estimate seconds per target: recorded duration, else open ports scaled by seconds per port, else a default
+def estimate_costs(targets, history, port_counts):
+    hosts = {target: split_target(target, None)[0] for target in targets}
+    calibration = [(history[target], port_counts[hosts[target]]) for target in targets
+                   if target in history and hosts[target] in port_counts]
+    if calibration:
+        seconds_per_port = sum(seconds for seconds, _ in calibration) / sum(ports + 1 for _, ports in calibration)
+    elif port_counts:
+        seconds_per_port = DEFAULT_HOST_SECONDS / (statistics.median(port_counts.values()) + 1)
+    else:
+        seconds_per_port = DEFAULT_HOST_SECONDS
+    fallback = statistics.median(history.values()) if history else DEFAULT_HOST_SECONDS
+
+    costs = {}
+    sources = Counter()
+    for target in targets:
+        if target in history:
+            costs[target], source = history[target], "recorded"
+        elif hosts[target] in port_counts:
+            costs[target], source = seconds_per_port * (port_counts[hosts[target]] + 1), "open ports"
+        else:
+            costs[target], source = fallback, "default"
+        sources[source] += 1
+    return costs, sources
+
+# Function to simulate the worker pool: each job goes to the first worker to become free
+def predict_makespan(costs, workers):
+    finish_times = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + cost)
+    return max(finish_times)
+
+# Function to order targets longest expected first when --order cost is given; returns (targets, plan or None)
+def plan(targets, tool, args, workers):
+    if args.order != "cost":
+        return targets, None
+
+    history = load_history(tool)
+    port_counts = load_port_counts(getattr(args, "db", None))
+    if args.cost_probe:
+        unknown = sorted({split_target(target, None)[0] for target in targets if target not in history} - set(port_counts))
+        if unknown:
+            port_counts.update(probe_port_counts(unknown))
+
+    costs, sources = estimate_costs(targets, history, port_counts)
+    ordered = sorted(targets, key=lambda target: -costs[target])  # Stable, so ties keep ip.txt order
+    return ordered, {
+        "workers": workers,
+        "sources": sources,
+        "predicted": predict_makespan([costs[target] for target in ordered], workers),
+        "file_order": predict_makespan([costs[target] for target in targets], workers),
+        "longest": max(costs.values(), default=0.0),
+        "started": time.time(),
+    }
+
+def report(schedule, end_time):
+    if not schedule:
+        return
+    sources = ", ".join(f"{source}={count}" for source, count in schedule["sources"].most_common())
+    print(f"Schedule (longest first, {schedule['workers']} workers):")
+    print(f"  Cost estimates: {sources}")
+    print(f"  Predicted makespan: {schedule['predicted']:.1f}s (ip.txt order: {schedule['file_order']:.1f}s, longest target: {schedule['longest']:.1f}s)")
+    print(f"  Actual makespan: {end_time - schedule['started']:.1f}s")
@@ -0,0 +1,29 @@
+import subprocess
+import launcher
+
+# Function to run a command and yield its stdout line by line while it is still running
+def stream_lines(command):
+    process = launcher.popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             stdin=subprocess.DEVNULL, text=True, bufsize=1)
+    try:
+        for line in process.stdout:
+            yield line.rstrip("\n")
+    finally:
+        process.stdout.close()
+        launcher.wait(process)
+
+# Function to group streamed lines into pages, yielding each page as soon as it is full
+def stream_pages(lines, lines_per_page):
+    page = []
+    for line in lines:
+        page.append(line)
+        if len(page) == lines_per_page:
+            yield page
+            page = []
+    if page:
+        yield page
+
+# Function to hand each completed page to the render pool and wait for all renders of this host
+def render_pages(pages, render_pool, render_page):
+    futures = [render_pool.submit(render_page, page, index) for index, page in enumerate(pages, start=1)]
+    return [future.result() for future in futures]
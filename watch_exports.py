@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import select
+import signal
+import struct
+import argparse
+import ctypes
+import ctypes.util
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from merge_exports import EXPORT_EXTENSIONS, read_export
+from run_metrics import METRICS, percentile
+from runners import load_script
+
+nessus = load_script("nessus", "1.nessus.py")
+
+# inotify event masks (linux/inotify.h): a file finished writing, or was renamed into the folder
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = os.O_CLOEXEC
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# Risk levels kept by the info filter, as in info.py
+VALID_RISKS = ['Critical', 'High', 'Medium', 'Low']
+UNKNOWN_TIME = "Unknown"
+
+# Watcher on inotify through libc; only completed files are reported, partial downloads never are
+class InotifyWatcher:
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {folder}")
+
+    # Function to wait up to `timeout` seconds and return the names of files completed meanwhile
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+# Fallback watcher for systems without inotify: a file counts as complete once its size and mtime hold still for one poll
+class PollingWatcher:
+    def __init__(self, folder, interval=2.0):
+        self.folder = folder
+        self.interval = interval
+        self.sizes = self.scan()
+        self.reported = set(self.sizes)
+
+    def scan(self):
+        sizes = {}
+        for entry in os.scandir(self.folder):
+            if entry.is_file():
+                stat = entry.stat()
+                sizes[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return sizes
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        sizes = self.scan()
+        names = [name for name, size in sizes.items() if name not in self.reported and self.sizes.get(name) == size]
+        self.reported.update(names)
+        self.reported &= set(sizes)  # A deleted and re-downloaded export is processed again
+        self.sizes = sizes
+        return names
+
+    def close(self):
+        pass
+
+def make_watcher(folder, poll=False):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling {folder} instead")
+    return PollingWatcher(folder)
+
+# Function to load, filter and parse one export in a worker; returns the host records to render
+def prepare_export(path, output_dir):
+    df = read_export(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    # Same filter as info.py: keep only Critical/High/Medium/Low findings in the cleaned CSV
+    cleaned_folder = os.path.join(output_dir, "cleaned")
+    os.makedirs(cleaned_folder, exist_ok=True)
+    cleaned_data = df[df['Risk'].isin(VALID_RISKS)]
+    cleaned_data.to_csv(os.path.join(cleaned_folder, f"{name}_cleaned.csv"), index=False)
+
+    store = nessus.parse_findings(df)
+    host_times = {}
+    if 'Host Start' in df.columns:  # Only .nessus exports carry per-host scan times
+        for host, start, end in df[['Host', 'Host Start', 'Host End']].drop_duplicates('Host').itertuples(index=False):
+            host_times[str(host).strip()] = (start or UNKNOWN_TIME, end or UNKNOWN_TIME)
+    return store, host_times, len(df), len(cleaned_data), METRICS.drain()
+
+# Function to render a chunk of hosts of one export; the title table travels once per chunk, not once per host
+def render_hosts(hosts, titles, output_folder, host_times):
+    nessus.init_worker(titles)
+    spans = []
+    for ip, record in hosts:
+        scan_start_time, scan_end_time = host_times.get(ip, (UNKNOWN_TIME, UNKNOWN_TIME))
+        _, host_spans = nessus.process_ip(ip, record, output_folder, scan_start_time, scan_end_time)
+        spans.extend(host_spans)
+    return len(hosts), spans
+
+# Function to leave Ctrl+C and SIGTERM to the parent, which cancels queued work and shuts the pool down
+def init_pool_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def chunked(items, size):
+    return [items[index:index + size] for index in range(0, len(items), size)]
+
+# One export from arrival to finished screenshots
+class ExportJob:
+    def __init__(self, path, arrived):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.arrived = arrived
+        self.prepared = None
+        self.remaining = 0
+        self.hosts = 0
+        self.rows = 0
+        self.kept = 0
+        self.error = None
+
+def is_export(name):
+    return name.endswith(EXPORT_EXTENSIONS) and not name.startswith(".")
+
+def watch(folder, output_dir, workers, poll=False, once=False):
+    watcher = make_watcher(folder, poll)
+    pending = {}
+    finished = []
+    failed = []
+    seen = {}
+
+    def submit_export(executor, path):
+        # IN_CLOSE_WRITE can fire more than once for the same download; only queue real changes. Browsers
+        # create an empty placeholder under the final name first, the export arrives with the rename
+        signature = (os.path.getsize(path), os.path.getmtime(path))
+        if not signature[0] or seen.get(path) == signature:
+            return
+        seen[path] = signature
+        job = ExportJob(path, time.time())
+        future = executor.submit(prepare_export, path, output_dir)
+        pending[future] = (job, "prepare")
+
+    def finish(job):
+        latency = time.time() - job.arrived
+        finished.append((job, latency))
+        METRICS.merge([("export_latency", job.name, job.arrived, latency)])
+        print(f"{job.name}: {job.hosts} hosts, {job.kept} of {job.rows} findings kept, ready in {latency:.2f}s"
+              f" (parse {job.prepared - job.arrived:.2f}s, render {time.time() - job.prepared:.2f}s)")
+
+    print(f"Watching {folder} ({type(watcher).__name__}), {workers} workers, output in {output_dir}")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_pool_worker) as executor:
+        try:
+            # Exports already in the folder are queued first
+            for name in sorted(os.listdir(folder)):
+                if is_export(name):
+                    submit_export(executor, os.path.join(folder, name))
+
+            while pending or not once:
+                for name in watcher.wait(0.2 if pending else 5.0):
+                    path = os.path.join(folder, name)
+                    if is_export(name) and os.path.exists(path):
+                        submit_export(executor, path)
+
+                done, _ = wait(list(pending), timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, stage = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The other chunks of a failed export still render; the export is reported failed once
+                        if stage == "render":
+                            job.remaining -= 1
+                        if job.error is None:
+                            job.error = str(e)
+                            failed.append((job, job.error))
+                            print(f"{job.name}: failed - {e}")
+                        continue
+
+                    if stage == "prepare":
+                        store, host_times, job.rows, job.kept, spans = result
+                        METRICS.merge(spans)
+                        job.prepared = time.time()
+                        job.hosts = len(store)
+                        output_folder = os.path.join(output_dir, job.name)
+                        os.makedirs(output_folder, exist_ok=True)
+                        hosts = list(store.hosts.items())
+                        for chunk in chunked(hosts, max(1, len(hosts) // (workers * 4) + 1)):
+                            future = executor.submit(render_hosts, chunk, store.titles, output_folder, host_times)
+                            pending[future] = (job, "render")
+                            job.remaining += 1
+                        if not job.remaining:
+                            finish(job)
+                    else:
+                        _, spans = result
+                        METRICS.merge(spans)
+                        job.remaining -= 1
+                        if not job.remaining and job.error is None:
+                            finish(job)
+        except KeyboardInterrupt:
+            print("\nStopping, unfinished exports are abandoned")
+            executor.shutdown(wait=False, cancel_futures=True)
+        finally:
+            watcher.close()
+    return finished, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a folder and filter, parse and render Nessus exports (CSV or .nessus) as they land")
+    parser.add_argument("folder", nargs="?", help="Exports folder to watch (prompted for when omitted)")
+    parser.add_argument("--output-dir", default="nessus_screenshots", help="Screenshots go to <output-dir>/<export name>/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes in the persistent worker pool")
+    parser.add_argument("--poll", action="store_true", help="Poll the folder instead of using inotify")
+    parser.add_argument("--once", action="store_true", help="Process the exports already in the folder and exit")
+    parser.add_argument("--metrics-dir", help="Write per-stage timings and export latencies as JSON and a Prometheus textfile to this folder")
+    args = parser.parse_args()
+
+    folder = args.folder or input("Enter the path to the folder Nessus exports are downloaded to: ")
+    # A service manager stops the watcher with SIGTERM; shut the pool down and report as for Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    start_time = time.time()
+    finished, failed = watch(folder, args.output_dir, max(1, args.workers), args.poll, args.once)
+    latencies = sorted(latency for _, latency in finished)
+
+    print("\nSummary Report:")
+    print(f"Exports processed: {len(finished)}, failed: {len(failed)}")
+    print(f"Hosts rendered: {sum(job.hosts for job, _ in finished)}")
+    if latencies:
+        print(f"Arrival to screenshots: p50 {percentile(latencies, 0.5):.2f}s, p90 {percentile(latencies, 0.9):.2f}s, max {latencies[-1]:.2f}s")
+    print(f"Time taken: {time.time() - start_time:.2f} seconds")
+    for job, error in failed:
+        print(f"Export: {job.path} - Error: {error}")
+
+    if args.metrics_dir:
+        METRICS.report(args.metrics_dir, "watch_exports")
+
+if __name__ == "__main__":
+    main()